@@ -0,0 +1,474 @@
+"""
+Project: PiracyTools
+File: fake_adb.py
+Author: hyugogirubato
+Date: 2026.10.18
+"""
+
+import os
+import re
+import socket
+import socketserver
+import sqlite3
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+""" Fake adb server
+Speaks the adb server protocol (host services, shell v2, exec:, sync:) for lib_adb, commands run in a local `sh`
+where the device commands are shell functions returning canned outputs: getprop, pm list packages -f, pm path,
+ps -A, ls -la, id, pidof, su, kill, setsid, monkey, wm, input. Other commands run on the computer.
+The device filesystem is ROOT/data (sync: files, `/data/` paths of the commands are mapped to it and back in the
+outputs): apks, sandbox and databases of com.example.app1, wifi networks, /data/local/tmp.
+Forwarded device ports are ports of the computer, CONTROL_PORT (frida) is mapped to a free port: `setsid
+/data/local/tmp/frida-server` starts a small HTTP server there, listed by ps and stopped by kill.
+
+LATENCY is added once per device service and once per shell request (stdin write), like the round trip of a
+wireless device. Counters: services opened per kind, shell requests, bytes sent and received.
+
+python benchmark/fake_adb.py [--port=$PORT] [--latency=$MS] [--devices=$N] [--packages=$N] (standalone, ctrl+c to stop)
+"""
+
+# resolved at import: processes of the fake device are not counted by a patched subprocess.Popen
+_POPEN = subprocess.Popen
+PROPERTIES = {'ro.build.version.sdk': '30', 'ro.product.cpu.abi': 'arm64-v8a', 'ro.product.model': 'Pixel 4'}
+PACKAGE = 'com.example.app1'
+FRIDA_SERVER = '/data/local/tmp/frida-server'
+CONTROL_PORT = 27042
+# installed as /data/local/tmp/frida-server, the ELF magic is checked by the frida server cache
+SERVER_BINARY = b'\x7fELF' + bytes(range(256)) * 4096
+WIFI = """<?xml version='1.0' encoding='utf-8' standalone='yes' ?>
+<WifiConfigStoreData>
+<int name="Version" value="3" />
+<NetworkList>
+<Network>
+<WifiConfiguration>
+<string name="ConfigKey">&quot;Home&quot;WPA_PSK</string>
+<string name="SSID">&quot;Home&quot;</string>
+<string name="PreSharedKey">&quot;password1&quot;</string>
+</WifiConfiguration>
+</Network>
+<Network>
+<WifiConfiguration>
+<string name="ConfigKey">&quot;Office&quot;WPA_PSK</string>
+<string name="SSID">&quot;Office&quot;</string>
+<string name="PreSharedKey">&quot;password2&quot;</string>
+</WifiConfiguration>
+</Network>
+</NetworkList>
+</WifiConfigStoreData>
+"""
+FRIDA = """import http.server
+import sys
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(b'frida')
+
+    def log_message(self, *args):
+        pass
+
+
+http.server.HTTPServer(('127.0.0.1', int(sys.argv[1])), Handler).serve_forever()
+"""
+
+
+def _packages(count):
+    lines = []
+    for i in range(count):
+        if i % 4 == 0:
+            lines.append(f"package:/system/priv-app/System{i}/System{i}.apk=com.android.system{i} versionCode:{30 + i} uid:{1000 + i}")
+        else:
+            lines.append(f"package:/data/app/~~Yb1Q{i}==/com.example.app{i}-Xx7_aQ==/base.apk=com.example.app{i} versionCode:{100 + i} uid:{10000 + i}")
+    return '\n'.join(lines) + '\n'
+
+
+def _processes(count):
+    lines = ['USER           PID  PPID     VSZ    RSS WCHAN            ADDR S NAME', 'root             1     0 2179364  12028 0                   0 S init']
+    for i in range(count):
+        user = 'system' if i % 4 == 0 else f"u0_a{i}"
+        name = f"com.android.system{i}" if i % 4 == 0 else f"com.example.app{i}"
+        lines.append(f"{user:<14} {2000 + i:>5}   600 15064348 125240 0                   0 S {name}")
+    return '\n'.join(lines) + '\n'
+
+
+def _listing():
+    return '\n'.join([
+        'total 24',
+        'drwxrwx--x  6 u0_a100 u0_a100       4096 2026-10-18 10:00 .',
+        'drwxrwx--x 90 system  system        4096 2026-10-18 10:00 ..',
+        'drwxrws--x  2 u0_a100 u0_a100_cache 4096 2026-10-18 10:00 cache',
+        'drwxrwx--x  2 u0_a100 u0_a100       4096 2026-10-18 10:00 databases',
+        'drwxrwx--x  2 u0_a100 u0_a100       4096 2026-10-18 10:00 files',
+        'drwxrwx--x  2 u0_a100 u0_a100       4096 2026-10-18 10:00 shared_prefs'
+    ]) + '\n'
+
+
+def _filesystem(root):
+    # /data of the fake device
+    files = {
+        f"data/app/{PACKAGE}/base.apk": os.urandom(2 * 1024 * 1024),
+        f"data/app/{PACKAGE}/split_config.arm64_v8a.apk": os.urandom(512 * 1024),
+        f"data/data/{PACKAGE}/shared_prefs/settings.xml": b"<?xml version='1.0' encoding='utf-8' standalone='yes' ?>\n<map>\n    <boolean name=\"first_run\" value=\"false\" />\n</map>\n",
+        f"data/data/{PACKAGE}/files/cache.bin": os.urandom(1024 * 1024),
+        'data/misc/wifi/WifiConfigStore.xml': WIFI.encode()
+    }
+    for path, content in files.items():
+        os.makedirs(os.path.dirname(os.path.join(root, path)), exist_ok=True)
+        with open(os.path.join(root, path), mode='wb') as f:
+            f.write(content)
+    for path in [f"data/data/{PACKAGE}/cache", f"data/data/{PACKAGE}/databases", 'data/local/tmp']:
+        os.makedirs(os.path.join(root, path), exist_ok=True)
+    connection = sqlite3.connect(os.path.join(root, f"data/data/{PACKAGE}/databases/app.db"))
+    with connection:
+        connection.execute('CREATE TABLE notes (id INTEGER PRIMARY KEY, title TEXT, body TEXT)')
+        connection.executemany('INSERT INTO notes (title, body) VALUES (?, ?)', [(f"note {i}", 'x' * 200) for i in range(1000)])
+    connection.close()
+
+
+def _prelude(root, packages, processes, port):
+    # device commands as shell functions, outputs are files written once per server
+    files = {'packages': _packages(packages), 'ps': _processes(processes), 'ls': _listing(), 'frida-server.py': FRIDA}
+    for name, content in files.items():
+        with open(os.path.join(root, f".{name}"), mode='w') as f:
+            f.write(content)
+    props = ' '.join(f"{k}) echo {v};;" for k, v in PROPERTIES.items())
+    pid = f"'{root}/.frida'"
+    return f"""getprop() {{ case "$1" in {props} *) echo;; esac; }}
+pm() {{ case "$1" in list) cat '{root}/.packages';; path) for f in '{root}'/data/app/"$2"/*.apk; do [ -f "$f" ] && echo "package:$f"; done;; *) return 1;; esac; }}
+frida_pid() {{ [ -f {pid} ] && command kill -0 "$(cat {pid})" 2>/dev/null && cat {pid}; }}
+ps() {{ cat '{root}/.ps'; p=$(frida_pid) && echo "root          $p     1 10920152  45060 0                   0 S frida-server"; }}
+ls() {{ if [ "$1" = -la ]; then cat '{root}/.ls'; else command ls "$@"; fi; }}
+pidof() {{ grep " $1$" '{root}/.ps' | awk '{{print $2}}'; }}
+su() {{ if [ "$1" = -c ]; then shift; (eval "$1"); else id() {{ echo 'uid=0(root) gid=0(root)'; }}; fi; }}
+kill() {{ for a in "$@"; do case "$a" in -*) ;; *) [ "$a" = "$(frida_pid)" ] && command kill -9 "$a" && rm -f {pid};; esac; done; return 0; }}
+setsid() {{ case "$1" in */frida-server) [ -x "$1" ] || return 126; '{sys.executable}' '{root}/.frida-server.py' {port} & echo $! > {pid};; *) command setsid "$@";; esac; }}
+monkey() {{ echo 'Events injected: 1'; }}
+wm() {{ echo 'Physical size: 1080x2340'; }}
+input() {{ return 0; }}
+"""
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _recv_exactly(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise EOFError
+        data += chunk
+    return data
+
+
+class _Handler(socketserver.BaseRequestHandler):
+
+    def _recv(self, size):
+        data = _recv_exactly(self.request, size)
+        self.server.count('received', len(data))
+        return data
+
+    def _send(self, data):
+        self.request.sendall(data)
+        self.server.count('sent', len(data))
+
+    def _read_request(self):
+        return self._recv(int(self._recv(4), 16)).decode()
+
+    def _okay(self, value=None):
+        self._send(b'OKAY' + (b'' if value is None else b'%04x' % len(value.encode()) + value.encode()))
+
+    def _fail(self, value):
+        self._send(b'FAIL' + b'%04x' % len(value.encode()) + value.encode())
+
+    def handle(self):
+        try:
+            service = self._read_request()
+            if not service.startswith('host:transport:'):
+                self.server.count('host')
+            if service == 'host:version':
+                self._okay('0029')
+            elif service == 'host:devices-l':
+                self._okay(''.join(f"{serial}\tdevice transport_id:{i + 1}\n" for i, serial in enumerate(self.server.devices)))
+            elif service == 'host:kill':
+                self._okay()
+            elif service.endswith(':features'):
+                self._okay('shell_v2,cmd')
+            elif ':forward:' in service:
+                local, remote = service.split(':forward:', 1)[1].split(';', 1)
+                port = self.server.forward(local, remote)
+                self._okay()
+                self._okay(str(port) if local == 'tcp:0' else None)
+            elif ':killforward:' in service:
+                self.server.remove_forward(service.split(':killforward:', 1)[1])
+                self._okay()
+            elif service.startswith('host:transport:'):
+                if service.split(':', 2)[2] not in self.server.devices:
+                    self._fail(f"device '{service.split(':', 2)[2]}' not found")
+                    return
+                self._okay()
+                service = self._read_request()
+                self.server.count(service.split(':', 1)[0].split(',', 1)[0])
+                time.sleep(self.server.latency)
+                if service.startswith('shell,v2,raw:'):
+                    self._okay()
+                    self._shell(service.split(':', 1)[1])
+                elif service.startswith('exec:'):
+                    self._okay()
+                    self._send(_POPEN(['sh', '-c', self.server.prelude + self.server.device_paths(service[5:])], stdout=subprocess.PIPE).communicate()[0])
+                elif service == 'sync:':
+                    self._okay()
+                    self._sync()
+                else:
+                    self._fail('unknown service')
+            else:
+                self._fail('unknown host service')
+        except (EOFError, OSError):
+            pass
+
+    def _shell(self, cmd):
+        interactive = cmd in ['', 'su']
+        p = _POPEN(['sh'] if interactive else ['sh', '-c', self.server.prelude + self.server.device_paths(cmd)], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if interactive:
+            p.stdin.write((self.server.prelude + ('su\n' if cmd == 'su' else '')).encode())
+            p.stdin.flush()
+        lock = threading.Lock()
+
+        def pump(stream, kind):
+            for chunk in iter(lambda: os.read(stream.fileno(), 65536), b''):
+                chunk = chunk.replace(f"{self.server.root}/data/".encode(), b'/data/')
+                with lock:
+                    self._send(struct.pack('<BI', kind, len(chunk)) + chunk)
+
+        def feed():
+            try:
+                while True:
+                    kind, size = struct.unpack('<BI', self._recv(5))
+                    data = self._recv(size)
+                    if kind == 0:
+                        self.server.count('requests')
+                        time.sleep(self.server.latency)
+                        p.stdin.write(self.server.device_paths(data.decode(errors="surrogateescape")).encode(errors="surrogateescape"))
+                        p.stdin.flush()
+                    elif kind == 4:
+                        p.stdin.close()
+            except (EOFError, OSError, ValueError):
+                if p.poll() is None:
+                    p.kill()
+
+        threads = [threading.Thread(target=pump, args=(p.stdout, 1)), threading.Thread(target=pump, args=(p.stderr, 2))]
+        for thread in threads:
+            thread.start()
+        threading.Thread(target=feed, daemon=True).start()
+        for thread in threads:
+            thread.join()
+        self._send(struct.pack('<BI', 3, 1) + bytes([p.wait() & 0xff]))
+
+    def _sync(self):
+        while True:
+            id = self._recv(4)
+            size = struct.unpack('<I', self._recv(4))[0]
+            if id == b'QUIT':
+                return
+            path = self.server.local(self._recv(size).decode())
+            if id == b'STAT':
+                try:
+                    st = os.stat(path)
+                    self._send(b'STAT' + struct.pack('<III', st.st_mode, st.st_size, int(st.st_mtime)))
+                except OSError:
+                    self._send(b'STAT' + struct.pack('<III', 0, 0, 0))
+            elif id == b'SEND':
+                path, mode = path.rsplit(',', 1)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, mode='wb') as f:
+                    while True:
+                        id = self._recv(4)
+                        size = struct.unpack('<I', self._recv(4))[0]
+                        if id == b'DONE':
+                            break
+                        f.write(self._recv(size))
+                os.chmod(path, int(mode) & 0o777)
+                self._send(b'OKAY' + struct.pack('<I', 0))
+            elif id == b'RECV':
+                try:
+                    with open(path, mode='rb') as f:
+                        for chunk in iter(lambda: f.read(65536), b''):
+                            self._send(b'DATA' + struct.pack('<I', len(chunk)) + chunk)
+                except OSError as e:
+                    self._send(b'FAIL' + struct.pack('<I', len(str(e))) + str(e).encode())
+                    return
+                self._send(b'DONE' + struct.pack('<I', 0))
+
+
+class FakeAdbServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.0, devices=1, packages=200, processes=100):
+        # latency in seconds, port 0 picks a free port
+        super().__init__(('127.0.0.1', port), _Handler)
+        self.port = self.server_address[1]
+        self.latency = latency
+        self.devices = [f"emulator-{5554 + i * 2}" for i in range(devices)]
+        self.root = tempfile.mkdtemp(prefix='ptools_adb_')
+        # device port -> port of the computer
+        self.ports = {CONTROL_PORT: _free_port()}
+        _filesystem(self.root)
+        self.prelude = _prelude(self.root, packages, processes, self.ports[CONTROL_PORT])
+        self._counters = {}
+        self._forwards = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._frida = None
+
+    def forward(self, local, remote):
+        # device ports are ports of the computer: connections are relayed to 127.0.0.1, closed when nothing listens
+        listener = socket.socket()
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind(('127.0.0.1', int(local.split(':')[1])))
+        listener.listen(8)
+        port = listener.getsockname()[1]
+        with self._lock:
+            self._forwards[f"tcp:{port}"] = listener
+
+        def relay(src, dst):
+            try:
+                for chunk in iter(lambda: src.recv(65536), b''):
+                    dst.sendall(chunk)
+            except OSError:
+                pass
+            finally:
+                for s in [src, dst]:
+                    try:
+                        s.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
+
+        def accept():
+            while True:
+                try:
+                    client = listener.accept()[0]
+                except OSError:
+                    return
+                try:
+                    target = socket.create_connection(('127.0.0.1', self.ports.get(int(remote.split(':')[1]), int(remote.split(':')[1]))))
+                except OSError:
+                    client.close()
+                    continue
+                threading.Thread(target=relay, args=(client, target), daemon=True).start()
+                threading.Thread(target=relay, args=(target, client), daemon=True).start()
+
+        threading.Thread(target=accept, daemon=True).start()
+        return port
+
+    def remove_forward(self, local):
+        with self._lock:
+            listener = self._forwards.pop(local, None)
+        if listener is not None:
+            listener.close()
+
+    def local(self, path):
+        return os.path.join(self.root, path.lstrip('/'))
+
+    def device_paths(self, cmd):
+        # /data/... of a device command -> ROOT/data/...
+        return re.sub(r'(?<![\w.])/data/', lambda m: f"{self.root}/data/", cmd)
+
+    def write(self, path, content, mode=0o644):
+        os.makedirs(os.path.dirname(self.local(path)), exist_ok=True)
+        with open(self.local(path), mode='wb') as f:
+            f.write(content)
+        os.chmod(self.local(path), mode)
+
+    def remove(self, path):
+        try:
+            os.remove(self.local(path))
+        except OSError:
+            pass
+
+    def start_frida(self, timeout=5):
+        # like `setsid /data/local/tmp/frida-server`, returns once the server answers
+        self.stop_frida()
+        self._frida = _POPEN([sys.executable, os.path.join(self.root, '.frida-server.py'), str(self.ports[CONTROL_PORT])], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+        with open(os.path.join(self.root, '.frida'), mode='w') as f:
+            f.write(str(self._frida.pid))
+        start = time.time()
+        while time.time() - start < timeout:
+            try:
+                socket.create_connection(('127.0.0.1', self.ports[CONTROL_PORT]), timeout=1).close()
+                return True
+            except OSError:
+                time.sleep(0.01)
+        return False
+
+    def stop_frida(self):
+        # the server started by start_frida or by the device shell
+        try:
+            with open(os.path.join(self.root, '.frida'), mode='r') as f:
+                pid = int(f.read().strip())
+            os.kill(pid, 9)
+        except (OSError, ValueError):
+            pass
+        if self._frida is not None:
+            self._frida.wait()
+            self._frida = None
+        try:
+            os.remove(os.path.join(self.root, '.frida'))
+        except OSError:
+            pass
+
+    def count(self, key, value=1):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def stats(self):
+        # {'services', 'requests', 'round_trips', 'bytes', $SERVICE: count}
+        with self._lock:
+            stats = dict(self._counters)
+        stats['bytes'] = stats.get('sent', 0) + stats.get('received', 0)
+        stats['services'] = sum(v for k, v in stats.items() if k not in ['sent', 'received', 'bytes', 'requests'])
+        stats['requests'] = stats.get('requests', 0)
+        stats['round_trips'] = stats['services'] + stats['requests']
+        return stats
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self.stop_frida()
+        for local in list(self._forwards):
+            self.remove_forward(local)
+
+
+if __name__ == '__main__':
+    options = {'port': '5037', 'latency': '0', 'devices': '1', 'packages': '200'}
+    for arg in sys.argv[1:]:
+        key, _, value = arg[2:].partition('=')
+        if key in options:
+            options[key] = value
+    server = FakeAdbServer(port=int(options['port']), latency=float(options['latency']) / 1000, devices=int(options['devices']), packages=int(options['packages']))
+    print(f"Fake adb server on 127.0.0.1:{server.port} ({', '.join(server.devices)}), ANDROID_ADB_SERVER_PORT={server.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+        server.stop_frida()
@@ -0,0 +1,218 @@
+"""
+Project: PiracyTools
+File: fake_frida.py
+Author: hyugogirubato
+Date: 2026.10.18
+"""
+
+import os
+import sys
+import threading
+import time
+
+""" Fake frida
+Stand-in of the frida Python bindings for the benchmark: devices spawn, attach, resume and kill without a process,
+scripts compile to their source and load without running. Every device call waits LATENCY and is passed to COUNT
+(fake_adb counter), like one round trip of the real bindings to frida-server.
+
+install($PATH) registers the module as `frida` and writes frida / frida-tools metadata under $PATH, so the
+installed version lookups (importlib.metadata) see the fake.
+"""
+
+__version__ = '16.5.9'
+TOOLS_VERSION = '13.6.0'
+LATENCY = 0.0
+COUNT = None
+FIRST_PID = 30000
+
+
+class ServerNotRunningError(Exception):
+    pass
+
+
+class ExecutableNotFoundError(Exception):
+    pass
+
+
+class ExecutableNotSupportedError(Exception):
+    pass
+
+
+class ProcessNotFoundError(Exception):
+    pass
+
+
+class ProcessNotRespondingError(Exception):
+    pass
+
+
+class InvalidArgumentError(Exception):
+    pass
+
+
+class InvalidOperationError(Exception):
+    pass
+
+
+class PermissionDeniedError(Exception):
+    pass
+
+
+class AddressInUseError(Exception):
+    pass
+
+
+class TimedOutError(Exception):
+    pass
+
+
+class NotSupportedError(Exception):
+    pass
+
+
+class ProtocolError(Exception):
+    pass
+
+
+class TransportError(Exception):
+    pass
+
+
+_PIDS = [FIRST_PID]
+_PIDS_LOCK = threading.Lock()
+
+
+def _call():
+    if COUNT is not None:
+        COUNT('frida')
+    time.sleep(LATENCY)
+
+
+class _Script:
+
+    def __init__(self, source):
+        self.source = source
+        self.loaded = False
+
+    def on(self, signal, callback):
+        pass
+
+    def set_log_handler(self, handler):
+        pass
+
+    def load(self):
+        _call()
+        self.loaded = True
+
+    def unload(self):
+        if not self.loaded:
+            raise InvalidOperationError('script is destroyed')
+        _call()
+        self.loaded = False
+
+
+class _Session:
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.detached = False
+
+    def on(self, signal, callback):
+        pass
+
+    def compile_script(self, source, name=None):
+        _call()
+        return source.encode('utf-8')
+
+    def create_script(self, source, name=None):
+        _call()
+        return _Script(source)
+
+    def create_script_from_bytes(self, data):
+        _call()
+        return _Script(data.decode('utf-8'))
+
+    def detach(self):
+        if self.detached:
+            raise InvalidOperationError('session is gone')
+        _call()
+        self.detached = True
+
+
+class _Process:
+
+    def __init__(self, pid, name):
+        self.pid = pid
+        self.name = name
+
+
+class _Application:
+
+    def __init__(self, identifier, pid):
+        self.identifier = identifier
+        self.name = identifier
+        self.pid = pid
+
+
+class _Device:
+
+    def __init__(self, id):
+        self.id = id
+        self.name = id
+        self.type = 'usb'
+        self._apps = {}
+
+    def spawn(self, program):
+        _call()
+        with _PIDS_LOCK:
+            _PIDS[0] += 1
+            pid = _PIDS[0]
+        self._apps[program[0]] = pid
+        return pid
+
+    def attach(self, pid):
+        _call()
+        return _Session(pid)
+
+    def resume(self, pid):
+        _call()
+
+    def kill(self, pid):
+        _call()
+        self._apps = {k: v for k, v in self._apps.items() if v != pid}
+
+    def get_process(self, name):
+        _call()
+        if name not in self._apps:
+            raise ProcessNotFoundError(f"unable to find process with name '{name}'")
+        return _Process(self._apps[name], name)
+
+    def enumerate_applications(self):
+        _call()
+        return [_Application(k, v) for k, v in self._apps.items()]
+
+
+_DEVICES = {}
+_DEVICES_LOCK = threading.Lock()
+
+
+def get_device(id, timeout=0):
+    with _DEVICES_LOCK:
+        if id not in _DEVICES:
+            _DEVICES[id] = _Device(id)
+        return _DEVICES[id]
+
+
+def get_local_device():
+    return get_device('local')
+
+
+def install(path):
+    # `import frida` and importlib.metadata.version('frida'|'frida-tools') resolve to the fake
+    for name, version in [('frida', __version__), ('frida_tools', TOOLS_VERSION)]:
+        info = os.path.join(path, f"{name}-{version}.dist-info")
+        os.makedirs(info, exist_ok=True)
+        with open(os.path.join(info, 'METADATA'), mode='w') as f:
+            f.write(f"Metadata-Version: 2.1\nName: {name.replace('_', '-')}\nVersion: {version}\n")
+    sys.path.insert(0, path)
+    sys.modules['frida'] = sys.modules[__name__]
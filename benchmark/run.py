@@ -0,0 +1,263 @@
+"""
+Project: PiracyTools
+File: run.py
+Author: hyugogirubato
+Date: 2026.10.18
+"""
+
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+""" Benchmark
+python benchmark/run.py [--latency=$MS] [--runs=$N] [--packages=$N] [--case=$NAME] [--budgets=$FILE]
+
+Every case runs in its own process against its own fake adb server (fake_adb.py) and the fake frida bindings
+(fake_frida.py), in a temporary working directory (empty tmp/). Shell sessions are closed between runs: the first run
+is cold (no cache in memory or on disk), the next ones are warm.
+CASES: root cases run as `--root`, the setup (device and computer state) is applied before every run and not
+measured, interactive commands read their input from a canned stdin.
+Measured per case: wall time (cold, warm median), round trips (adb host services, device services and shell
+requests, frida calls), processes spawned by the tool (subprocess.Popen) and bytes exchanged with the adb server.
+
+Budgets (budgets.json): {$CASE: {'ms', 'round_trips', 'spawns'}} are compared to the worst run, exit code 1 when a
+budget is exceeded or a case fails. ms budgets are set for the default latency (20 ms) and move by the latency
+difference for each round trip of the budget. Errors printed by a case are reported only.
+Not measured: `adv switch` (shell only) and `frida uninstall pip` (runs pip on the computer).
+"""
+
+OPTIONS = {'latency': '20', 'runs': '5', 'packages': '200', 'case': None, 'budgets': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'budgets.json'), 'worker': None}
+# $CASE: {'root', 'setup', 'input'}
+CASES = {
+    'devices': {},
+    'adv help': {},
+    'adv pkg': {},
+    'adv pkg app1': {},
+    'adv apk com.example.app1': {},
+    'adv wifi': {'root': True},
+    'adv db com.example.app1': {'root': True, 'input': 'app.db\n.tables\nSELECT count(*) FROM notes;\n.exit\n'},
+    'adv snapshot com.example.app1': {'root': True, 'setup': 'no snapshot'},
+    'adv snapshots com.example.app1': {'setup': 'snapshots'},
+    'adv diff com.example.app1': {'setup': 'snapshots'},
+    'adv root': {},
+    'frida help': {},
+    'frida status': {'setup': 'running'},
+    'frida install server': {'root': True, 'setup': 'cached'},
+    'frida install pip': {'root': True},
+    'frida uninstall server': {'root': True, 'setup': 'installed'},
+    'frida start': {'root': True, 'setup': 'installed'},
+    'frida stop': {'root': True, 'setup': 'running'},
+    'frida pinning com.example.app1': {'root': True, 'setup': 'running'},
+    'frida run bench.js com.example.app1': {'root': True, 'setup': 'running'},
+    'frida capture bench.js com.example.app1': {'root': True, 'setup': 'running'},
+    'frida attach bench.js com.example.app1': {'root': True, 'setup': 'running'},
+    'frida sessions': {},
+    'frida create': {'input': 'no\nMainActivity\nDisplay\n2\nString\nint\n'},
+    'frida create hooks.json': {},
+    'frida cache': {'setup': 'cached'}
+}
+# files of the working directory used by the cases
+FILES = {
+    'bench.js': "Java.perform(() => console.log('bench'));\n",
+    'hooks.json': json.dumps({
+        'output': 'console',
+        'java': [{'class': 'MainActivity', 'function': 'Display', 'args': ['String', 'int']}],
+        'native': [{'library': 'Crypto', 'module': 'Hash', 'args': 2}]
+    }),
+    # checked by `adv root` before downloading it
+    os.path.join('tmp', 'DirtyPipeRoot_2.2.apk'): 'apk'
+}
+_SPAWNS = [0]
+
+
+class _Popen(subprocess.Popen):
+
+    def __init__(self, *args, **kwargs):
+        _SPAWNS[0] += 1
+        super().__init__(*args, **kwargs)
+
+
+def _setup(server, device, setup):
+    # state expected by a case, the frida server and sessions of the previous run are stopped
+    import fake_adb
+    import fake_frida
+    from module import lib_artifact, lib_frida, lib_instrument, lib_snapshot, lib_supervisor
+    if setup in ['installed', 'running', 'cached']:
+        lib_instrument.close_manager()
+        lib_supervisor.close_supervisors()
+        server.stop_frida()
+        server.remove(fake_adb.FRIDA_SERVER)
+        if setup in ['installed', 'running']:
+            server.write(fake_adb.FRIDA_SERVER, fake_adb.SERVER_BINARY, mode=0o755)
+        if setup == 'running' and not server.start_frida():
+            raise RuntimeError('Fake frida server not started')
+        store = lib_artifact.ArtifactStore()
+        if setup == 'cached' and store.get('frida-server', fake_frida.__version__, lib_frida._getArch(device['abi'])) is None:
+            store.put_chunks('frida-server', fake_frida.__version__, lib_frida._getArch(device['abi']), [fake_adb.SERVER_BINARY], source='benchmark', mode=0o755)
+        # the device changed behind the tool
+        lib_frida.Frida(device)._invalidate()
+    elif setup == 'no snapshot':
+        shutil.rmtree(os.path.join(lib_snapshot.PATH_SNAPSHOTS, 'manifests'), ignore_errors=True)
+    elif setup == 'snapshots':
+        store = lib_snapshot.SnapshotStore(device, fake_adb.PACKAGE)
+        if len(store.snapshots()) < 2:
+            store.create(name='before')
+            server.write(f"/data/data/{fake_adb.PACKAGE}/shared_prefs/settings.xml", b"<?xml version='1.0' encoding='utf-8' standalone='yes' ?>\n<map />\n")
+            server.write(f"/data/data/{fake_adb.PACKAGE}/files/new.bin", os.urandom(4096))
+            store.create(name='after')
+
+
+def _run(case, device):
+    # returns the number of errors printed by the case
+    import main
+    import utils
+    from module import lib_device
+    errors = utils.ERRORS
+    output = io.StringIO()
+    stdin = sys.stdin
+    sys.stdin = io.StringIO(CASES[case].get('input', ''))
+    try:
+        with contextlib.redirect_stdout(output):
+            if case == 'devices':
+                lib_device.get_devices()
+            elif not main.run_ptools(device, CASES[case].get('root', False), ['ptools'] + case.split(' ')):
+                print(f"sh: ptools {case}: Invalid command")
+                return 1
+    finally:
+        sys.stdin = stdin
+    return utils.ERRORS - errors + output.getvalue().count(': Invalid command')
+
+
+def _measure(server, case, device, runs):
+    from module import lib_shell
+    results = []
+    for _ in range(runs):
+        if 'setup' in CASES[case]:
+            _setup(server, device, CASES[case]['setup'])
+        lib_shell.close_sessions()
+        server.reset()
+        spawns = _SPAWNS[0]
+        start = time.perf_counter()
+        errors = _run(case, device)
+        elapsed = (time.perf_counter() - start) * 1000
+        stats = server.stats()
+        results.append({'ms': elapsed, 'round_trips': stats['round_trips'], 'spawns': _SPAWNS[0] - spawns, 'bytes': stats['bytes'], 'errors': errors})
+    return {
+        'cold': results[0]['ms'],
+        'warm': statistics.median(r['ms'] for r in results[1:] or results),
+        'ms': max(r['ms'] for r in results),
+        'round_trips': max(r['round_trips'] for r in results),
+        'spawns': max(r['spawns'] for r in results),
+        'bytes': max(r['bytes'] for r in results),
+        'errors': sum(r['errors'] for r in results)
+    }
+
+
+def _worker(options):
+    # measures one case in this process, the result is printed as json on the last line
+    import fake_frida
+    from fake_adb import FakeAdbServer
+    server = FakeAdbServer(latency=float(options['latency']) / 1000, packages=int(options['packages'])).start()
+    os.environ['ANDROID_ADB_SERVER_PORT'] = str(server.port)
+    subprocess.Popen = _Popen
+    # relative paths of the tool (tmp/, module/frida_scripts) resolve in an empty working directory
+    work = tempfile.mkdtemp(prefix='ptools_bench_')
+    os.symlink(os.path.join(ROOT, 'module'), os.path.join(work, 'module'))
+    os.chdir(work)
+    for file, content in FILES.items():
+        os.makedirs(os.path.dirname(file) or '.', exist_ok=True)
+        with open(file, mode='w') as f:
+            f.write(content)
+    fake_frida.LATENCY = server.latency
+    fake_frida.COUNT = server.count
+    fake_frida.install(os.path.join(work, 'site'))
+    try:
+        from module import lib_adb, lib_instrument, lib_shell, lib_supervisor
+        device = {'name': server.devices[0], 'sdk': '30', 'abi': 'arm64-v8a'}
+        r = _measure(server, options['case'], device, max(int(options['runs']), 1))
+        lib_instrument.close_manager()
+        lib_supervisor.close_supervisors()
+        lib_shell.close_sessions()
+        lib_adb.get_client().close()
+    finally:
+        server.stop()
+        shutil.rmtree(work, ignore_errors=True)
+        shutil.rmtree(server.root, ignore_errors=True)
+    print(json.dumps(r))
+    return 0
+
+
+def main(args):
+    options = dict(OPTIONS)
+    for arg in args:
+        key, _, value = arg[2:].partition('=')
+        if not arg.startswith('--') or key not in options:
+            print(f"Invalid option: {arg}")
+            return 2
+        options[key] = value
+    if options['worker'] is not None:
+        return _worker(options)
+    cases = [c for c in CASES if options['case'] is None or c == options['case']]
+    if len(cases) == 0:
+        print(f"Unknown case: {options['case']}")
+        return 2
+    with open(os.path.join(ROOT, 'requirements.txt'), mode='r') as f:
+        missing = [r.strip() for r in f if r.strip() != '' and importlib.util.find_spec(r.strip()) is None]
+    if len(missing) > 0:
+        print(f"Missing dependencies: {', '.join(missing)} (pip install -r requirements.txt)")
+        return 2
+    budgets = {}
+    if os.path.exists(options['budgets']):
+        with open(options['budgets'], mode='r') as f:
+            budgets = json.load(f)
+
+    print(f"Fake device, latency {options['latency']} ms, {options['packages']} packages, {options['runs']} runs")
+    print('{0:<40} {1:>9} {2:>9} {3:>12} {4:>7} {5:>10} {6:<10}'.format('Case', 'Cold (ms)', 'Warm (ms)', 'Round trips', 'Spawns', 'Bytes', 'Status'))
+    failures = []
+    over = []
+    for case in cases:
+        p = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--worker=1', f"--case={case}"] + [f"--{k}={options[k]}" for k in ['latency', 'runs', 'packages']],
+            capture_output=True, text=True
+        )
+        try:
+            r = json.loads(p.stdout.strip().split('\n')[-1])
+        except (ValueError, IndexError):
+            print(p.stdout + p.stderr)
+            print(f"Case failed: {case}")
+            failures.append(case)
+            continue
+        budget = dict(budgets.get(case, {}))
+        if 'ms' in budget:
+            budget['ms'] += (float(options['latency']) - float(OPTIONS['latency'])) * budget.get('round_trips', 0)
+        status = []
+        for key in ['ms', 'round_trips', 'spawns']:
+            if key in budget and r[key] > budget[key]:
+                status.append(f"{key}>{budget[key]:g}")
+        if len(status) > 0:
+            over.append(case)
+        if r['errors'] > 0:
+            status.append(f"{r['errors']} errors")
+        print('{0:<40} {1:>9.1f} {2:>9.1f} {3:>12} {4:>7} {5:>10} {6:<10}'.format(case, r['cold'], r['warm'], r['round_trips'], r['spawns'], r['bytes'], ', '.join(status) or 'ok'))
+
+    if len(failures) > 0:
+        print(f"Failed: {', '.join(failures)}")
+    if len(over) > 0:
+        print(f"Over budget: {', '.join(over)}")
+    return 1 if len(failures) > 0 or len(over) > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,75 @@
+"""
+Project: PiracyTools
+File: startup.py
+Author: hyugogirubato
+Date: 2026.10.18
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+""" Startup
+python benchmark/startup.py [--runs=$N] [--serial=$SERIAL] [--budget=$MS] [--command="$MODULE $COMMAND"]
+Runs a one-shot command N times (median wall time), then once with -X importtime to list the slowest imports.
+Exit code 1 when the median is over the budget.
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OPTIONS = {'runs': '10', 'serial': None, 'budget': None, 'command': 'adv help'}
+TOP = 10
+
+
+def _command(options, flags=None):
+    cmd = [sys.executable] + (flags or []) + [os.path.join(ROOT, 'main.py')]
+    if options['serial']:
+        cmd += ['-s', options['serial']]
+    return cmd + options['command'].split(' ')
+
+
+def _imports(options):
+    # [(cumulative us, module)] of the top level imports, slowest first
+    r = subprocess.run(_command(options, flags=['-X', 'importtime']), cwd=ROOT, capture_output=True, text=True)
+    result = []
+    for line in r.stderr.split('\n'):
+        items = line.split('|')
+        if len(items) == 3 and items[1].strip().isdigit():
+            result.append((int(items[1]), items[2].rstrip()))
+    return sorted(result, reverse=True)[:TOP]
+
+
+def main(args):
+    options = dict(OPTIONS)
+    for arg in args:
+        key, _, value = arg[2:].partition('=')
+        if not arg.startswith('--') or key not in options:
+            print(f"Invalid option: {arg}")
+            return 2
+        options[key] = value
+
+    times = []
+    for _ in range(int(options['runs'])):
+        start = time.perf_counter()
+        r = subprocess.run(_command(options), cwd=ROOT, capture_output=True)
+        times.append((time.perf_counter() - start) * 1000)
+        if r.returncode != 0:
+            print(r.stdout.decode(errors='replace') + r.stderr.decode(errors='replace'))
+            print(f"Command failed: {' '.join(_command(options))}")
+            return 1
+
+    median = statistics.median(times)
+    print(f"{options['command']}: median {median:.0f} ms, min {min(times):.0f} ms, max {max(times):.0f} ms ({len(times)} runs)")
+    print('{0:<12} {1:<40}'.format('Import (ms)', 'Module'))
+    for us, module in _imports(options):
+        print('{0:<12} {1:<40}'.format(f"{us / 1000:.1f}", module))
+
+    if options['budget'] is not None and median > float(options['budget']):
+        print(f"Over budget: {median:.0f} ms > {options['budget']} ms")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -7,31 +7,147 @@ Date: 2022.12.16
 
 import json
 import os
-import re
-import subprocess
 import sys
-from termcolor import colored
+import time
 import utils
-from module import lib_frida, lib_adv
+from module import lib_adb, lib_device, lib_shell, lib_trace
+
+""" Usage
+python main.py                                      interactive shell (device selection)
+python main.py [-s $SERIAL] [--root] $MODULE $COMMAND  one-shot command, exit code 1 on error
+Modules are imported by the commands using them.
+"""
 
 HELPS = [
     {'command': 'adv', 'description': 'Advanced commands'},
-    {'command': 'frida', 'description': 'Dynamic instrumentation'}
+    {'command': 'frida', 'description': 'Dynamic instrumentation'},
+    {'command': 'fanout', 'description': 'Run a command on several devices'},
+    {'command': 'trace', 'description': 'Device operations timing'}
 ]
 
 
 def get_root(device, exit=True):
-    r = subprocess.getoutput(f"adb -s {device['name']} shell su -c \\\"id\\\"").strip()
-    status = '(root)' in r
+    status = lib_shell.get_session(device).check_root()
     if not status:
         utils.printError('Root access unavailable', exit=exit)
     return status
 
 
+def run_ptools(device, root, cmd):
+    # ptools $MODULE $COMMAND, shared by the shell and one-shot mode; returns False for unknown modules
+    with lib_trace.scope(' '.join(cmd[1:3])):
+        if cmd[1] == 'frida' and len(cmd) >= 3:
+            from module import lib_frida
+            lib_frida.Frida(device, root=root).args(cmd)
+        elif cmd[1] == 'adv' and len(cmd) >= 3:
+            from module import lib_adv
+            lib_adv.ADV(device, root=root).args(cmd)
+        elif cmd[1] == 'fanout' and len(cmd) >= 3:
+            from module import lib_fanout
+            lib_fanout.FanOut(root=root).args(cmd)
+        elif cmd[1] == 'trace':
+            lib_trace.Trace().args(cmd)
+        else:
+            return False
+    return True
+
+
+def reconnect(device, root):
+    # after a lost transport: waits for the device then restores the root shell, the frida supervision and sessions
+    # returns the root state, None when the device is not back
+    utils.printWarning(f"Connection to {device['name']} lost, reconnecting")
+    start = time.time()
+    lib_shell.get_session(device).close()
+    supervisor = None
+    if 'module.lib_supervisor' in sys.modules:
+        supervisor = sys.modules['module.lib_supervisor'].get_supervisor(device, create=False)
+    watched = supervisor is not None and supervisor.status()['watched']
+    if watched:
+        supervisor.unwatch()
+    with lib_trace.scope('reconnect'):
+        if lib_device.wait_device(device) is None:
+            utils.printError(f"Device not reconnected: {device['name']}", exit=False)
+            return None
+        if root:
+            root = get_root(device, exit=False)
+        if supervisor is not None:
+            supervisor.reset()
+            if watched:
+                supervisor.watch()
+        if 'module.lib_instrument' in sys.modules:
+            for id, e in sys.modules['module.lib_instrument'].get_manager().resume(device['name']):
+                utils.printSuccess(f"Session {id} resumed") if e is None else utils.printError(e, exit=False)
+    utils.printSuccess(f"Reconnected in {time.time() - start:.2f}s")
+    return root
+
+
+def close():
+    if 'module.lib_instrument' in sys.modules:
+        sys.modules['module.lib_instrument'].close_manager()
+    if 'module.lib_supervisor' in sys.modules:
+        sys.modules['module.lib_supervisor'].close_supervisors()
+    lib_shell.close_sessions()
+    try:
+        lib_trace.save()
+    except OSError:
+        pass
+
+
+def one_shot(argv):
+    serial = None
+    root = False
+    while len(argv) > 0 and argv[0].startswith('-'):
+        if argv[0] in ['-s', '--serial'] and len(argv) > 1:
+            serial = argv[1]
+            argv = argv[2:]
+        elif argv[0] == '--root':
+            root = True
+            argv = argv[1:]
+        else:
+            print('''Usage: python main.py [-s $SERIAL] [--root] $MODULE $COMMAND
+       python main.py (interactive shell)''')
+            return 0 if argv[0] in ['-h', '--help'] else 1
+
+    try:
+        if serial is None:
+            devices = lib_device.get_devices()
+            if len(devices) != 1:
+                utils.printError('No device available' if len(devices) == 0 else 'Several devices attached, use -s $SERIAL', exit=False)
+                return 1
+            device = devices[0]
+        else:
+            device = lib_device.get_device(serial)
+            if device is None:
+                utils.printError(f"Device not found: {serial}", exit=False)
+                return 1
+        if root:
+            with lib_trace.scope(' '.join(argv[:2])):
+                if not get_root(device, exit=False):
+                    return 1
+        if len(argv) == 0 or not run_ptools(device, root, ['ptools'] + argv):
+            print(f"sh: ptools {' '.join(argv)}: Invalid command")
+            return 1
+        # background frida sessions (run, capture) live as long as the process
+        if 'module.lib_instrument' in sys.modules:
+            manager = sys.modules['module.lib_instrument'].get_manager()
+            if len(manager.get_sessions()) > 0:
+                utils.printInfo('Sessions running, ctrl+c to detach')
+                while any(s['status'] == 'attached' for s in manager.get_sessions()):
+                    time.sleep(0.5)
+    except KeyboardInterrupt:
+        print('')
+    except lib_adb.AdbConnectionError as e:
+        utils.printError(e.message, exit=False)
+    finally:
+        close()
+    return 1 if utils.ERRORS > 0 else 0
+
+
 def get_devices(exit=True):
     # check exist
-    r = subprocess.getoutput(f"adb --version").strip()
-    if not 'Android Debug Bridge' in r:
+    try:
+        lib_adb.get_client()
+    except lib_adb.AdbConnectionError as e:
         file = 'platform-tools.zip'
         if not os.path.exists(os.path.join('tmp', file)):
             utils.downloadFile('tmp', file, 'https://dl.google.com/android/repository/platform-tools-latest-windows.zip')
@@ -40,16 +156,7 @@ def get_devices(exit=True):
         elif not utils.getInput('Automatic detection failed, continue?', type='boolean', default='no'):
             sys.exit(0)
 
-    devices = []
-    for l in subprocess.getoutput("adb devices").strip().split('\n')[1:]:
-        if '\t' in l and l.split('\t')[1] == 'device':
-            name = l.split('\t')[0]
-            properties = {}
-            for p in subprocess.getoutput(f"adb -s {name} shell \"getprop\"").strip().split('\n'):
-                m = re.match("^\[([\s\S]*?)\]: \[([\s\S]*?)\]\r?$", p)
-                if m:
-                    properties[m.group(1)] = m.group(2)
-            devices.append({'name': name, 'sdk': properties['ro.build.version.sdk'], 'abi': properties['ro.product.cpu.abi']})
+    devices = lib_device.get_devices()
 
     if len(devices) == 0:
         utils.printWarning('No device available')
@@ -70,7 +177,12 @@ def get_devices(exit=True):
 
 
 if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        sys.exit(one_shot(sys.argv[1:]))
+    from module import lib_complete
+    colored = utils.colored
     device = get_devices(exit=True)
+    completer = lib_complete.install(device)
     root = False
     hostname = colored(device['name'], 'magenta')
     user = colored('piracytools', 'yellow')
@@ -80,24 +192,24 @@ if __name__ == '__main__':
 
     try:
         while True:
-            print(f"{hostname}{separator[0]}{user}{separator[1]}{colored(path, 'red')}{colored('#' if root else '$', 'white')} ", end='')
-            cmd = str(input())
-            if cmd == 'clear':
-                os.system('clear') if os.name == 'posix' else os.system('cls')
-            elif cmd == 'exit':
-                if root:
-                    root = False
-                else:
-                    break
-            elif cmd in ['su', 'su -']:
-                root = get_root(device, exit=False)
-            elif cmd.startswith('ptools'):
-                tmp_cmd = cmd.split(' ')
-                if len(tmp_cmd) >= 3:
-                    if tmp_cmd[1] == 'frida':
-                        lib_frida.Frida(device, root=root).args(tmp_cmd)
-                    elif tmp_cmd[1] == 'adv':
-                        if len(tmp_cmd) == 3 and tmp_cmd[2] == 'switch':
+            cmd = str(input(completer.prompt(f"{hostname}{separator[0]}{user}{separator[1]}{colored(path, 'red')}{colored('#' if root else '$', 'white')} ")))
+            try:
+                if cmd == 'clear':
+                    os.system('clear') if os.name == 'posix' else os.system('cls')
+                elif cmd == 'exit':
+                    if root:
+                        root = False
+                        completer.update(path, root=root)
+                    else:
+                        break
+                elif cmd in ['su', 'su -']:
+                    with lib_trace.scope('su'):
+                        root = get_root(device, exit=False)
+                    completer.update(path, root=root)
+                elif cmd.startswith('ptools'):
+                    tmp_cmd = cmd.split(' ')
+                    if len(tmp_cmd) >= 3 or (len(tmp_cmd) == 2 and tmp_cmd[1] == 'trace'):
+                        if tmp_cmd[1] == 'adv' and len(tmp_cmd) == 3 and tmp_cmd[2] == 'switch':
                             tmp_device = get_devices(exit=False)
                             if tmp_device is None:
                                 utils.printError('Device not updated', exit=False)
@@ -107,53 +219,61 @@ if __name__ == '__main__':
                                 device = tmp_device
                                 path = '/'
                                 root = False
+                                completer.close()
+                                completer = lib_complete.install(device)
                                 hostname = colored(device['name'], 'magenta')
                                 utils.printSuccess('Updated device')
-                        else:
-                            lib_adv.ADV(device, root=root).args(tmp_cmd)
+                        elif not run_ptools(device, root, tmp_cmd):
+                            print(f"sh: {cmd}: Invalid command")
+                    elif len(tmp_cmd) == 2 and tmp_cmd[1] == 'help':
+                        print('Available commands:')
+                        print('{0:<26} {1:<40}'.format('Command', 'Description'))
+                        for h in HELPS:
+                            print('{0:<26} {1:<40}'.format(
+                                h['command'],
+                                h['description']
+                            ))
                     else:
                         print(f"sh: {cmd}: Invalid command")
-                elif len(tmp_cmd) == 2 and tmp_cmd[1] == 'help':
-                    print('Available commands:')
-                    print('{0:<26} {1:<40}'.format('Command', 'Description'))
-                    for h in HELPS:
-                        print('{0:<26} {1:<40}'.format(
-                            h['command'],
-                            h['description']
-                        ))
-                else:
-                    print(f"sh: {cmd}: Invalid command")
-            elif cmd == 'logcat' or cmd.startswith('logcat '):
-                try:
-                    os.system(f"adb -s {device['name']} shell \"{cmd}\"")
-                except KeyboardInterrupt as e:
-                    print('')
-            elif cmd != '':
-                is_cd = cmd.startswith('cd ') or cmd == 'cd'
-                cmd = f"cd '{path}'; {cmd}"
-                if is_cd:
-                    cmd = f"{cmd}; pwd"
-
-                cmd = f"adb -s {device['name']} shell su -c \\\"{cmd}\\\"" if root else f"adb -s {device['name']} shell \"{cmd}\""
-                r = subprocess.getoutput(cmd).strip()
-                if is_cd:
-                    items = r.split('\n')
-                    if len(items) == 1:
-                        path = items[0]
-                    r = '\n'.join(items[1:])
-
-                if r != '':
-                    if r in ['error: closed', f"adb.exe: device '{device['name']}' not found"]:
-                        raise Exception('error: closed')
-                    else:
+                elif cmd == 'logcat' or cmd.startswith('logcat '):
+                    from module import lib_logcat
+                    with lib_trace.scope('logcat'):
+                        lib_logcat.run(device, cmd.split(' ')[1:])
+                elif cmd != '':
+                    try:
+                        with lib_trace.scope('shell'):
+                            r = lib_shell.get_session(device).execute(cmd, root=root, cwd=path)
+                    except KeyboardInterrupt as e:
+                        print('')
+                        continue
+                    path = r['cwd']
+                    completer.update(path, root=root, cmd=cmd)
+                    r = r['output'].strip()
+                    if r != '':
                         print(r)
+            except (lib_shell.ShellError, lib_adb.AdbError) as e:
+                if lib_device.wait_device(device, timeout=0) is not None:
+                    utils.printError(e.message if isinstance(e, lib_adb.AdbError) else e, exit=False)
+                    continue
+                # lost transport: same device, path and root state on the new one
+                root = reconnect(device, root)
+                if root is None:
+                    break
+                completer.close()
+                completer = lib_complete.install(device)
+                completer.update(path, root=root)
     except KeyboardInterrupt as e:
         print('')
     except Exception as e:
         utils.printError('Connection to terminal lost')
+    completer.close()
+    close()
     utils.printSuccess('Shell stopped')
     r = utils.getInput('Stop ADB?', default='no', type='boolean')
     if r:
-        os.system(f"adb kill-server")
+        try:
+            lib_adb.get_client(start=False).kill()
+        except lib_adb.AdbError as e:
+            pass
         utils.printSuccess('ADB stopped')
     sys.exit(0)
@@ -0,0 +1,275 @@
+/*
+ * File: frida_agent.js
+ * Author: PiracyTools
+ */
+
+/*
+ * Generated by: ptools frida create $SPEC
+ * Use: ptools frida run $SCRIPT $PACKAGE
+ */
+
+const HOOKS = {HOOKS};
+// "send": events are batched to the host sink (ptools frida capture) instead of console.log
+// "trace": counters, latency histograms and sampled arguments per hook, sent every interval
+const OUTPUT = HOOKS["output"] || "console";
+const TRACE = Object.assign({"interval": 1000, "every": 1, "reservoir": 8}, HOOKS["trace"] || {});
+const BATCH_SIZE = 256;
+const BATCH_INTERVAL = 50;
+
+let batch = [];
+let buffers = [];
+let offset = 0;
+let timer = null;
+let traces = {};
+let clock = null;
+
+
+try {
+    // monotonic clock in microseconds, Date.now() (milliseconds) when clock_gettime is not reachable
+    const address = Module.findGlobalExportByName ? Module.findGlobalExportByName("clock_gettime") : Module.findExportByName(null, "clock_gettime");
+    const clock_gettime = new NativeFunction(address, "int", ["int", "pointer"]);
+    const timespec = Memory.alloc(2 * Process.pointerSize);
+    clock = function () {
+        clock_gettime(1, timespec);
+        return Number(timespec.readLong()) * 1e6 + Number(timespec.add(Process.pointerSize).readLong()) / 1e3;
+    };
+} catch (e) {
+}
+
+
+function now() {
+    return clock === null ? Date.now() * 1e3 : clock();
+}
+
+
+function begin(name) {
+    // returns the stats of the current interval and the sample slot of this call (-1: not sampled)
+    const stats = traces[name] = traces[name] || {"count": 0, "time": 0, "min": null, "max": 0, "histogram": {}, "seen": 0, "samples": []};
+    stats["count"]++;
+    let slot = -1;
+    if (TRACE["reservoir"] > 0 && stats["count"] % TRACE["every"] === 0) {
+        stats["seen"]++;
+        if (stats["samples"].length < TRACE["reservoir"]) {
+            slot = stats["samples"].length;
+        } else {
+            const j = Math.floor(Math.random() * stats["seen"]);
+            slot = j < TRACE["reservoir"] ? j : -1;
+        }
+    }
+    return [stats, slot];
+}
+
+
+function end(call, start, values) {
+    // histogram bucket b: duration < 2^b microseconds
+    const [stats, slot] = call;
+    const duration = now() - start;
+    const bucket = duration < 1 ? 0 : Math.floor(Math.log2(duration)) + 1;
+    stats["time"] += duration;
+    stats["min"] = stats["min"] === null ? duration : Math.min(stats["min"], duration);
+    stats["max"] = Math.max(stats["max"], duration);
+    stats["histogram"][bucket] = (stats["histogram"][bucket] || 0) + 1;
+    if (slot >= 0) {
+        stats["samples"][slot] = values;
+    }
+}
+
+
+function flushTrace() {
+    const summary = [];
+    for (const [name, stats] of Object.entries(traces)) {
+        summary.push({
+            "hook": name,
+            "count": stats["count"],
+            "time": Math.round(stats["time"]),
+            "min": Math.round(stats["min"] || 0),
+            "max": Math.round(stats["max"]),
+            "histogram": stats["histogram"],
+            "samples": stats["samples"]
+        });
+    }
+    traces = {};
+    if (summary.length > 0) {
+        send({"trace": summary, "interval": TRACE["interval"]});
+    }
+}
+
+
+function flush() {
+    timer = null;
+    if (batch.length === 0) {
+        return;
+    }
+    let data = null;
+    if (offset > 0) {
+        data = new Uint8Array(offset);
+        let position = 0;
+        for (const buffer of buffers) {
+            data.set(buffer, position);
+            position += buffer.length;
+        }
+    }
+    send({"batch": batch}, data === null ? null : data.buffer);
+    batch = [];
+    buffers = [];
+    offset = 0;
+}
+
+
+function emit(event, bytes) {
+    if (bytes) {
+        event["data"] = [offset, bytes.length];
+        buffers.push(bytes);
+        offset += bytes.length;
+    }
+    batch.push(event);
+    if (batch.length >= BATCH_SIZE) {
+        flush();
+    } else if (timer === null) {
+        timer = setTimeout(flush, BATCH_INTERVAL);
+    }
+}
+
+
+function hookJava(hooks) {
+    // one method enumeration per class pattern, shared by all of its hooks
+    const groups = {};
+    for (const hook of hooks) {
+        (groups[hook["class"]] = groups[hook["class"]] || []).push(hook);
+    }
+    for (const [pattern, items] of Object.entries(groups)) {
+        const classes = {};
+        for (const loader of Java.enumerateMethods(`*${pattern}*!*`)) {
+            for (const item of loader["classes"]) {
+                classes[item["name"]] = {"loader": loader["loader"], "methods": item["methods"]};
+            }
+        }
+        for (const hook of items) {
+            const group = Object.keys(classes).find(name => classes[name]["methods"].includes(hook["function"]));
+            if (!group) {
+                console.log(`[!] Group not found: ${pattern}.${hook["function"]}`);
+                continue;
+            }
+            const factory = classes[group]["loader"] ? Java.ClassFactory.get(classes[group]["loader"]) : Java;
+            const method = factory.use(group)[hook["function"]];
+            const overloads = hook["args"] === null ? method.overloads : [method.overload(...hook["args"])];
+            for (const overload of overloads) {
+                const types = overload.argumentTypes.map(type => type.className);
+                const name = `${group}.${hook["function"]}`;
+                overload.implementation = function (...args) {
+                    if (OUTPUT === "trace") {
+                        const call = begin(name);
+                        const values = call[1] >= 0 ? args.map(arg => `${arg}`) : null;
+                        const start = now();
+                        const result = overload.apply(this, args);
+                        end(call, start, values);
+                        return result;
+                    } else if (OUTPUT === "send") {
+                        emit({"hook": name, "args": args.map((arg, i) => types[i] === "[B" ? null : `${arg}`)});
+                        args.forEach((arg, i) => {
+                            if (types[i] === "[B" && arg !== null) {
+                                emit({"hook": name, "arg": i}, Uint8Array.from(arg, b => b & 0xff));
+                            }
+                        });
+                    } else {
+                        console.log(`[+] ${group}.${hook["function"]} called`);
+                        args.forEach((arg, i) => console.log(`  --> arg${i}:  ${arg}`));
+                    }
+                    return overload.apply(this, args);
+                };
+            }
+            console.log(`[+] Hooked: ${group}.${hook["function"]} (${overloads.length})`);
+        }
+    }
+}
+
+
+function hookNative(hooks) {
+    // modules and exports are enumerated once, an address matched by several hooks is attached once
+    const modules = Process.enumerateModules();
+    const exports = {};
+    const attached = new Set();
+    for (const hook of hooks) {
+        const library = modules.find(module => module["path"].includes(hook["library"]));
+        if (!library) {
+            console.log(`[!] Native library not found: ${hook["library"]}`);
+            continue;
+        }
+        exports[library["path"]] = exports[library["path"]] || library.enumerateExports();
+        let exist = false;
+        for (const symbol of exports[library["path"]]) {
+            if (symbol["type"] !== "function" || !symbol["name"].includes(hook["module"])) {
+                continue;
+            }
+            exist = true;
+            if (attached.has(symbol["address"].toString())) {
+                continue;
+            }
+            attached.add(symbol["address"].toString());
+            const count = hook["args"];
+            Interceptor.attach(symbol["address"], {
+                onEnter: function (args) {
+                    if (OUTPUT === "trace") {
+                        this.call = begin(symbol["name"]);
+                        if (this.call[1] >= 0) {
+                            this.values = [];
+                            for (let i = 0; i < count; i++) {
+                                this.values.push(`${args[i]}`);
+                            }
+                        }
+                        this.start = now();
+                        return;
+                    } else if (OUTPUT === "send") {
+                        const values = [];
+                        for (let i = 0; i < count; i++) {
+                            values.push(`${args[i]}`);
+                        }
+                        emit({"hook": symbol["name"], "args": values});
+                        return;
+                    }
+                    console.log(`[+] ${symbol["name"]} called - onEnter`);
+                    for (let i = 0; i < count; i++) {
+                        console.log(`  --> [${i}] Raw value: ${args[i]}`);
+                        try {
+                            console.log(`  --> [${i}] String value: ${args[i].readCString()}`);
+                        } catch (e) {
+                        }
+                    }
+                },
+                onLeave: function (retval) {
+                    if (OUTPUT === "trace") {
+                        end(this.call, this.start, this.values || null);
+                    } else if (OUTPUT === "send") {
+                        emit({"hook": symbol["name"], "retval": `${retval}`});
+                    } else {
+                        console.log(`[-] ${symbol["name"]} called - onLeave`);
+                    }
+                }
+            });
+            console.log(`[+] Hooked: ${library["name"]}!${symbol["name"]}`);
+        }
+        if (!exist) {
+            console.log(`[!] Native module not found: ${hook["library"]}!${hook["module"]}`);
+        }
+    }
+}
+
+
+setTimeout(function () {
+    if (OUTPUT === "trace") {
+        setInterval(flushTrace, TRACE["interval"]);
+    }
+    console.log("---");
+    console.log("Capturing Android app...");
+    hookNative(HOOKS["native"]);
+    if (Java.available) {
+        console.log("[+] Java available");
+        Java.perform(function () {
+            hookJava(HOOKS["java"]);
+        });
+    } else if (HOOKS["java"].length > 0) {
+        console.log("[!] Java unavailable");
+    }
+    console.log("Capturing setup completed");
+    console.log("---");
+}, 0);
@@ -0,0 +1,510 @@
+"""
+Project: PiracyTools
+File: lib_adb.py
+Author: hyugogirubato
+Date: 2026.10.18
+"""
+
+import io
+import os
+import socket
+import stat
+import struct
+import subprocess
+import threading
+import time
+from module import lib_trace
+
+""" Protocol
+https://android.googlesource.com/platform/packages/modules/adb/+/refs/heads/main/protocol.txt
+https://android.googlesource.com/platform/packages/modules/adb/+/refs/heads/main/SERVICES.TXT
+https://android.googlesource.com/platform/packages/modules/adb/+/refs/heads/main/SYNC.TXT
+
+host -> server: 4 hex digits length + service name
+server -> host: OKAY | FAIL + 4 hex digits length + message
+host:transport:<serial> switches the socket to the device, the next request opens a device service on it.
+"""
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 5037
+SYNC_DATA_MAX = 64 * 1024
+# a device silent for this long in the middle of a response is lost, long-lived streams (shells, logcat) have no limit
+READ_TIMEOUT = 60
+
+# shell protocol v2 packet ids
+SHELL_STDIN = 0
+SHELL_STDOUT = 1
+SHELL_STDERR = 2
+SHELL_EXIT = 3
+SHELL_CLOSE_STDIN = 4
+
+_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+
+
+class AdbError(Exception):
+
+    def __init__(self, message, service=None, serial=None):
+        super().__init__(message)
+        self.message = message
+        self.service = service
+        self.serial = serial
+
+
+class AdbConnectionError(AdbError):
+    pass
+
+
+class DeviceError(AdbError):
+    pass
+
+
+def _recv_exactly(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise AdbConnectionError('error: closed')
+        data += chunk
+    return bytes(data)
+
+
+def _recv_all(sock):
+    data = bytearray()
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            return bytes(data)
+        data += chunk
+
+
+class _SocketReader(io.RawIOBase):
+
+    def __init__(self, sock):
+        self.sock = sock
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        return self.sock.recv_into(buffer)
+
+
+class _CountedSocket:
+    # socket of an exec: stream, counts the bytes read by the caller for lib_trace
+
+    def __init__(self, sock):
+        self._sock = sock
+        self.received = 0
+
+    def recv(self, size, *args):
+        data = self._sock.recv(size, *args)
+        self.received += len(data)
+        return data
+
+    def recv_into(self, buffer, size=0, *args):
+        count = self._sock.recv_into(buffer, size, *args)
+        self.received += count
+        return count
+
+    def makefile(self, mode='rb', buffering=-1):
+        # binary reads only
+        return io.BufferedReader(_SocketReader(self), buffer_size=buffering if buffering > 0 else io.DEFAULT_BUFFER_SIZE)
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+
+class Connection:
+
+    def __init__(self, host, port, timeout=None, read_timeout=READ_TIMEOUT):
+        try:
+            self.sock = socket.create_connection((host, port), timeout=timeout)
+        except OSError as e:
+            raise AdbConnectionError(f'Unable to connect to adb server on {host}:{port}: {e}')
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        self.sock.settimeout(read_timeout)
+        self.trace = None  # (serial, command, start) of an exec: stream, recorded on close
+
+    def _status(self, service, serial=None):
+        status = _recv_exactly(self.sock, 4)
+        if status == b'OKAY':
+            return
+        if status == b'FAIL':
+            message = self.read_string()
+            error = DeviceError if 'device' in message or 'closed' in message else AdbError
+            raise error(message, service=service, serial=serial)
+        raise AdbError(f'Unexpected adb response: {status!r}', service=service, serial=serial)
+
+    def request(self, service, serial=None):
+        payload = service.encode('utf-8')
+        try:
+            self.sock.sendall(b'%04x' % len(payload) + payload)
+            self._status(service, serial=serial)
+        except OSError as e:
+            self.close()
+            raise AdbConnectionError(f'error: closed ({e})', service=service, serial=serial)
+        except AdbError:
+            self.close()
+            raise
+
+    def read_string(self):
+        size = int(_recv_exactly(self.sock, 4), 16)
+        return _recv_exactly(self.sock, size).decode('utf-8', errors='replace')
+
+    def read_all(self):
+        return _recv_all(self.sock)
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+        if self.trace is not None:
+            serial, cmd, start = self.trace
+            self.trace = None
+            lib_trace.record(serial, 'exec', cmd, start, size=getattr(self.sock, 'received', None), root=cmd.startswith('su '))
+
+
+class ShellStream:
+
+    def __init__(self, connection, protocol):
+        self.connection = connection
+        self.protocol = protocol
+        self.exit_code = None
+        self._closed = False
+
+    def write(self, data):
+        if self.protocol:
+            data = struct.pack('<BI', SHELL_STDIN, len(data)) + data
+        self.connection.sock.sendall(data)
+
+    def read_packet(self):
+        # returns (packet id, data), (SHELL_EXIT, b'') once the remote side is done
+        if not self.protocol:
+            data = self.connection.sock.recv(65536)
+            return (SHELL_STDOUT, data) if data else (SHELL_EXIT, b'')
+        try:
+            header = _recv_exactly(self.connection.sock, 5)
+        except AdbConnectionError:
+            return SHELL_EXIT, b''
+        kind, size = struct.unpack('<BI', header)
+        data = _recv_exactly(self.connection.sock, size)
+        if kind == SHELL_EXIT:
+            self.exit_code = data[0] if data else None
+        return kind, data
+
+    def read(self):
+        # stdout and stderr merged, b'' at the end of the stream
+        while True:
+            kind, data = self.read_packet()
+            if kind == SHELL_EXIT:
+                return b''
+            if kind in [SHELL_STDOUT, SHELL_STDERR] and data:
+                return data
+
+    def close_stdin(self):
+        if self.protocol:
+            self.connection.sock.sendall(struct.pack('<BI', SHELL_CLOSE_STDIN, 0))
+        else:
+            self.connection.sock.shutdown(socket.SHUT_WR)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self.connection.close()
+
+
+class SyncConnection:
+
+    def __init__(self, connection, serial):
+        self.connection = connection
+        self.serial = serial
+
+    def _send(self, id, data=b''):
+        self.connection.sock.sendall(id + struct.pack('<I', len(data)) + data)
+
+    def _recv(self):
+        header = _recv_exactly(self.connection.sock, 8)
+        return header[:4], struct.unpack('<I', header[4:])[0]
+
+    def _fail(self, size, service):
+        message = _recv_exactly(self.connection.sock, size).decode('utf-8', errors='replace')
+        raise AdbError(message, service=service, serial=self.serial)
+
+    def stat(self, path):
+        # returns {'mode', 'size', 'mtime'}, mode 0 when the path does not exist
+        self._send(b'STAT', path.encode('utf-8'))
+        id, mode = self._recv()
+        size, mtime = struct.unpack('<II', _recv_exactly(self.connection.sock, 8))
+        if id != b'STAT':
+            raise AdbError(f'Unexpected sync response: {id!r}', service='sync:STAT', serial=self.serial)
+        return {'mode': mode, 'size': size, 'mtime': mtime}
+
+    def push(self, stream, remote, mode=0o644, mtime=None, callback=None):
+        self._send(b'SEND', f"{remote},{stat.S_IFREG | mode}".encode('utf-8'))
+        total = 0
+        while True:
+            chunk = stream.read(SYNC_DATA_MAX)
+            if not chunk:
+                break
+            self._send(b'DATA', chunk)
+            total += len(chunk)
+            if callback is not None:
+                callback(len(chunk))
+        self.connection.sock.sendall(b'DONE' + struct.pack('<I', int(time.time() if mtime is None else mtime)))
+        id, size = self._recv()
+        if id == b'FAIL':
+            self._fail(size, 'sync:SEND')
+        if id != b'OKAY':
+            raise AdbError(f'Unexpected sync response: {id!r}', service='sync:SEND', serial=self.serial)
+        return total
+
+    def pull(self, remote, stream, callback=None):
+        self._send(b'RECV', remote.encode('utf-8'))
+        total = 0
+        while True:
+            id, size = self._recv()
+            if id == b'DONE':
+                return total
+            if id == b'FAIL':
+                self._fail(size, 'sync:RECV')
+            if id != b'DATA':
+                raise AdbError(f'Unexpected sync response: {id!r}', service='sync:RECV', serial=self.serial)
+            chunk = _recv_exactly(self.connection.sock, size)
+            stream.write(chunk)
+            total += size
+            if callback is not None:
+                callback(size)
+
+    def close(self):
+        try:
+            self._send(b'QUIT')
+        except OSError:
+            pass
+        self.connection.close()
+
+
+class AdbClient:
+
+    def __init__(self, host=None, port=None, timeout=None):
+        self.host = host or os.environ.get('ANDROID_ADB_SERVER_ADDRESS', DEFAULT_HOST)
+        self.port = int(port or os.environ.get('ANDROID_ADB_SERVER_PORT', DEFAULT_PORT))
+        self.timeout = timeout
+        self._features = {}
+        self._syncs = {}
+        self._lock = threading.Lock()
+
+    def connect(self):
+        return Connection(self.host, self.port, timeout=self.timeout)
+
+    def _host(self, service, serial=None):
+        start = time.time()
+        code = -1
+        connection = self.connect()
+        try:
+            connection.request(service, serial=serial)
+            result = connection.read_string()
+            code = 0
+            return result
+        except OSError as e:
+            raise AdbConnectionError(f'error: closed ({e})', service=service, serial=serial)
+        finally:
+            connection.close()
+            lib_trace.record(serial, 'host', service, start, code=code)
+
+    def transport(self, serial, service):
+        connection = self.connect()
+        connection.request(f"host:transport:{serial}", serial=serial)
+        connection.request(service, serial=serial)
+        return connection
+
+    def version(self):
+        return int(self._host('host:version'), 16)
+
+    def devices(self):
+        # [{'name', 'state', 'transport_id', ...}] from host:devices-l
+        devices = []
+        for l in self._host('host:devices-l').strip().split('\n'):
+            items = l.split()
+            if len(items) >= 2:
+                device = {'name': items[0], 'state': items[1], 'transport_id': None}
+                for item in items[2:]:
+                    if ':' in item:
+                        key, value = item.split(':', 1)
+                        device[key] = value
+                devices.append(device)
+        return devices
+
+    def features(self, serial):
+        with self._lock:
+            if serial not in self._features:
+                self._features[serial] = self._host(f"host-serial:{serial}:features", serial=serial).split(',')
+            return self._features[serial]
+
+    def open_shell(self, serial, cmd=''):
+        # interactive when cmd is empty, uses the shell v2 protocol (no pty, exit code) when supported
+        protocol = 'shell_v2' in self.features(serial)
+        service = f"shell,v2,raw:{cmd}" if protocol else f"exec:{cmd or 'sh'}"
+        connection = self.transport(serial, service)
+        if cmd in ['', 'su']:
+            # long-lived shell, idle between requests
+            connection.sock.settimeout(None)
+        return ShellStream(connection, protocol)
+
+    def shell(self, serial, cmd):
+        # returns {'stdout', 'stderr', 'code'}, code is None without shell v2
+        start = time.time()
+        stream = self.open_shell(serial, cmd)
+        stdout = bytearray()
+        stderr = bytearray()
+        try:
+            while True:
+                kind, data = stream.read_packet()
+                if kind == SHELL_EXIT:
+                    break
+                if kind == SHELL_STDOUT:
+                    stdout += data
+                elif kind == SHELL_STDERR:
+                    stderr += data
+        finally:
+            stream.close()
+            lib_trace.record(serial, 'shell', cmd, start, code=stream.exit_code, size=len(stdout) + len(stderr), root=cmd.startswith('su '))
+        return {
+            'stdout': stdout.decode('utf-8', errors='replace'),
+            'stderr': stderr.decode('utf-8', errors='replace'),
+            'code': stream.exit_code
+        }
+
+    def exec_out(self, serial, cmd, timeout=READ_TIMEOUT):
+        # raw binary stdout stream (the caller reads connection.sock and closes it), timeout None for endless streams
+        # exec: has no separate stderr, a warning would be written in the middle of the binary data
+        start = time.time()
+        connection = self.transport(serial, f"exec:{{ {cmd}; }} 2>/dev/null")
+        connection.sock.settimeout(timeout)
+        connection.sock = _CountedSocket(connection.sock)
+        connection.trace = (serial, cmd, start)
+        return connection
+
+    def sync(self, serial):
+        # one sync connection is kept per device and reused between transfers
+        with self._lock:
+            sync = self._syncs.pop(serial, None)
+        if sync is None:
+            sync = SyncConnection(self.transport(serial, 'sync:'), serial)
+        return sync
+
+    def release_sync(self, sync, broken=False):
+        with self._lock:
+            if broken or sync.serial in self._syncs:
+                sync.close()
+            else:
+                self._syncs[sync.serial] = sync
+
+    def _transfer(self, serial, action, kind, remote):
+        start = time.time()
+        sync = self.sync(serial)
+        try:
+            result = action(sync)
+        except BaseException:
+            # the device ends the sync service after a failure, never reuse the connection
+            self.release_sync(sync, broken=True)
+            lib_trace.record(serial, kind, remote, start, code=-1)
+            raise
+        self.release_sync(sync)
+        lib_trace.record(serial, kind, remote, start, code=0, size=result if isinstance(result, int) else None)
+        return result
+
+    def stat(self, serial, remote):
+        return self._transfer(serial, lambda s: s.stat(remote), 'stat', remote)
+
+    def push(self, serial, local, remote, mode=None, callback=None):
+        if mode is None:
+            mode = stat.S_IMODE(os.stat(local).st_mode)
+        with open(local, mode='rb') as f:
+            return self._transfer(serial, lambda s: s.push(f, remote, mode=mode, mtime=os.path.getmtime(local), callback=callback), 'push', remote)
+
+    def pull(self, serial, remote, local, callback=None):
+        tmp = f"{local}.part"
+        try:
+            with open(tmp, mode='wb') as f:
+                size = self._transfer(serial, lambda s: s.pull(remote, f, callback=callback), 'pull', remote)
+            os.replace(tmp, local)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return size
+
+    def forward(self, serial, local, remote):
+        # returns the local port, local may be tcp:0 to let the server pick a free one
+        start = time.time()
+        connection = self.connect()
+        try:
+            connection.request(f"host-serial:{serial}:forward:{local};{remote}", serial=serial)
+            # the server answers a second OKAY once the forward is in place
+            connection._status('forward', serial=serial)
+            return int(connection.read_string()) if local == 'tcp:0' else int(local.split(':')[1])
+        finally:
+            connection.close()
+            lib_trace.record(serial, 'forward', f"{local} {remote}", start)
+
+    def remove_forward(self, serial, local):
+        connection = self.connect()
+        try:
+            connection.request(f"host-serial:{serial}:killforward:{local}", serial=serial)
+        finally:
+            connection.close()
+
+    def connect_device(self, address):
+        # adb connect $HOST:$PORT (network devices), returns the server message
+        return self._host(f"host:connect:{address}")
+
+    def forget(self, serial):
+        # state of a lost transport: features may change and the kept sync connection is dead
+        with self._lock:
+            self._features.pop(serial, None)
+            sync = self._syncs.pop(serial, None)
+        if sync is not None:
+            sync.close()
+
+    def kill(self):
+        connection = self.connect()
+        try:
+            connection.request('host:kill')
+        finally:
+            connection.close()
+
+    def close(self):
+        with self._lock:
+            for sync in self._syncs.values():
+                sync.close()
+            self._syncs = {}
+
+
+def reset_client():
+    # the next get_client() checks the server again (and starts it)
+    global _CLIENT
+    with _CLIENT_LOCK:
+        client, _CLIENT = _CLIENT, None
+    if client is not None:
+        client.close()
+
+
+def get_client(start=True):
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            client = AdbClient()
+            try:
+                client.version()
+            except AdbConnectionError:
+                if not start:
+                    raise
+                # the adb binary spawns the server in the background, this is the only fork needed
+                started = time.time()
+                subprocess.getoutput('adb start-server')
+                lib_trace.record(None, 'process', 'adb start-server', started)
+                client.version()
+            _CLIENT = client
+        return _CLIENT
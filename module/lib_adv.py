@@ -7,17 +7,21 @@ Date: 2022.12.07
 
 import json
 import os
-import re
-import subprocess
+import sqlite3
+import time
 import urllib.parse
-import xmltodict
 import utils
+from module import lib_apk, lib_db, lib_packages, lib_shell, lib_snapshot
 
 """ Commands
 ptools adv pkg
 ptools adv pkg $NAME
+ptools adv apk $PACKAGE [$PACKAGE ...]
 ptools adv wifi
 ptools adv db $PACKAGE
+ptools adv snapshot $PACKAGE [$NAME]
+ptools adv snapshots $PACKAGE
+ptools adv diff $PACKAGE [$OLD $NEW]
 ptools adv switch
 ptools adv root
 """
@@ -25,8 +29,12 @@ ptools adv root
 HELPS = [
     {'command': 'pkg', 'root': False, 'description': 'Application lists'},
     {'command': 'pkg $NAME', 'root': False, 'description': 'Lists apps by name'},
+    {'command': 'apk $PACKAGE [...]', 'root': False, 'description': 'Pull the APKs (base and splits) of applications'},
     {'command': 'wifi', 'root': True, 'description': 'Wifi networks already connected with password'},
-    {'command': 'db $PACKAGE', 'root': True, 'description': 'SQLite3 database of an application'},
+    {'command': 'db $PACKAGE', 'root': True, 'description': 'SQLite3 database of an application (local copy)'},
+    {'command': 'snapshot $PACKAGE [$NAME]', 'root': True, 'description': 'Save the files of an application'},
+    {'command': 'snapshots $PACKAGE', 'root': False, 'description': 'List application snapshots'},
+    {'command': 'diff $PACKAGE [$OLD $NEW]', 'root': False, 'description': 'Changes between two snapshots (last two by default)'},
     {'command': 'switch', 'root': False, 'description': 'Change device without exit'},
     {'command': 'root', 'root': False, 'description': 'Check root compatibility (CVE-2022-0847)'}
 ]
@@ -55,41 +63,68 @@ def _get_network(data, mode='xml'):
     return {'ssid': network[0], 'security': network[1], 'password': network[2]}
 
 
+def _sqlite(connection):
+    # local sqlite shell on the pulled copy: statements end with ';', .tables, .schema [$TABLE], .exit
+    statement = ''
+    try:
+        while True:
+            line = input('sqlite> ' if statement == '' else '   ...> ')
+            if statement == '' and line.strip() in ['.exit', '.quit']:
+                break
+            elif statement == '' and line.strip() == '.tables':
+                line = "SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name;"
+            elif statement == '' and line.strip().startswith('.schema'):
+                table = line.strip()[7:].strip()
+                line = "SELECT sql FROM sqlite_master WHERE sql IS NOT NULL" + (f" AND tbl_name = '{table}'" if table else '') + ';'
+            statement += line + '\n'
+            if not sqlite3.complete_statement(statement):
+                continue
+            try:
+                cursor = connection.execute(statement)
+                if cursor.description is not None:
+                    print('|'.join(c[0] for c in cursor.description))
+                    for row in cursor:
+                        print('|'.join('' if v is None else str(v) for v in row))
+            except sqlite3.Error as e:
+                utils.printError(e, exit=False)
+            statement = ''
+    except (KeyboardInterrupt, EOFError):
+        print('')
+    finally:
+        connection.close()
+
+
 class ADV:
 
     def __init__(self, device, root=False):
         self.root = root
         self.device = device
+        self.session = lib_shell.get_session(device)
 
     def _get_packages(self):
-        packages = []
-        for p in subprocess.getoutput(f"adb -s {self.device['name']} shell \"pm list packages -f 2>/dev/null\"").strip().split('\n'):
-            m = re.match(r"^package\:/(.*?)/.*/(.*?).apk=(.*?)$", p)
-            if m:
-                mode = m.group(1).strip()
-                name = m.group(2).strip()
-                pkg = m.group(3).strip()
-                if mode != '' and name != '' and pkg != '':
-                    packages.append({'mode': mode, 'name': name, 'pkg': pkg})
-        return packages
+        return lib_packages.get_index(self.device).packages()
 
     def args(self, cmd):
-        if cmd[2] in ['wifi', 'db']:  # require root auth
+        if cmd[2] in ['wifi', 'db', 'snapshot']:  # require root auth
             if self.root:
                 if len(cmd) == 3 and cmd[2] == 'wifi':
                     PATH = '/data/misc/wifi'
                     networks = []
-                    r = subprocess.getoutput(f"adb -s {self.device['name']} shell su -c \\\"ls -la '{PATH}'\\\"").strip()
-                    if 'WifiConfigStore.xml' in r:
-                        r = subprocess.getoutput(f"adb -s {self.device['name']} shell su -c \\\"cat '{PATH}/WifiConfigStore.xml'\\\"").strip()
+                    probes = self.session.batch({
+                        'xml': f"cat '{PATH}/WifiConfigStore.xml'",
+                        'conf': f"cat '{PATH}/wpa_supplicant.conf'"
+                    }, root=True)
+                    if probes['xml']['code'] == 0:
+                        import xmltodict
+                        r = probes['xml']['stdout'].strip()
                         r = xmltodict.parse(r)['WifiConfigStoreData']['NetworkList']['Network']
                         if type(r) == list:
                             for data in r:
                                 networks.append(_get_network(data, mode='xml'))
                         else:
                             networks.append(_get_network(r, mode='xml'))
-                    elif 'wpa_supplicant.conf' in r:
-                        r = subprocess.getoutput(f"adb -s {self.device['name']} shell su -c \\\"cat '{PATH}/wpa_supplicant.conf'\\\"").strip()
+                    elif probes['conf']['code'] == 0:
+                        r = probes['conf']['stdout'].strip()
                         for item in r.split('network=')[1:]:
                             data = {}
                             for r in item.strip()[1:-1].strip().split('\n'):
@@ -109,46 +144,44 @@ class ADV:
                         for network in networks:
                             print('{0:<24} {1:<14} {2:<30}'.format(network['ssid'], network['security'], network['password']))
                 elif len(cmd) == 4 and cmd[2] == 'db':
-                    PATH = f"/data/data/{cmd[3]}/databases/"
-                    tmp_p = self._get_packages()
-                    exist = False
-                    for p in tmp_p:
-                        if cmd[3] == p['pkg']:
-                            exist = True
-                            break
-
-                    if exist:
-                        r = subprocess.getoutput(f"adb -s {self.device['name']} shell su -c \\\"ls -la '{PATH}'\\\"").strip()
-                        if 'No such file or directory' in r:
-                            utils.printError('No database available', exit=False)
+                    if lib_packages.get_index(self.device).get(cmd[3]) is not None:
+                        mirror = lib_db.DatabaseMirror(self.device, cmd[3])
+                        try:
+                            r = mirror.sync()
+                        except lib_db.DatabaseError as e:
+                            utils.printError(e, exit=False)
+                            return
+                        if r['pulled'] > 0:
+                            utils.printSuccess(f"Databases updated: {r['pulled']} files ({r['size'] / 1048576:.1f} MB in {r['time']:.1f}s)")
+                        databases = mirror.databases()
+                        if len(databases) == 0:
+                            utils.printWarning('No database found')
                         else:
-                            databases = []
-                            for item in r.split('\n'):
-                                if item.startswith('-r'):
-                                    r = item.split(' ')
-                                    databases.append({'size': r[-4], 'date': f"{r[-3]}T{r[-2]}Z", 'file': r[-1].strip()})
-                            if len(databases) == 0:
-                                utils.printWarning('No database found')
+                            utils.printInfo('Database available:')
+                            print('{0:<22} {1:<10} {2:<30}'.format('Date', 'Size', 'File'))
+                            for database in databases:
+                                print('{0:<22} {1:<10} {2:<30}'.format(database['date'], database['size'], database['file']))
+
+                            file = None
+                            r = utils.getInput('\nSelect database?', default=databases[0]['file'], type=str)
+                            for i in range(len(databases)):
+                                if r == str(i) or databases[i]['file'] == r:
+                                    file = databases[i]['file']
+                                    break
+
+                            if file is None:
+                                utils.printError('Invalid database', exit=False)
                             else:
-                                utils.printInfo('Database available:')
-                                print('{0:<22} {1:<10} {2:<30}'.format('Date', 'Size', 'File'))
-                                for database in databases:
-                                    print('{0:<22} {1:<10} {2:<30}'.format(database['date'], database['size'], database['file']))
-
-                                file = None
-                                r = utils.getInput('\nSelect database?', default=databases[0]['file'], type=str)
-                                for i in range(len(databases)):
-                                    if r == str(i) or databases[i]['file'] == r:
-                                        file = databases[i]['file']
-                                        break
-
-                                if file is None:
-                                    utils.printError('Invalid database', exit=False)
-                                else:
-                                    try:
-                                        os.system(f"adb -s {self.device['name']} shell su -c \\\"sqlite3 '{PATH}/{file}'\\\"")
-                                    except KeyboardInterrupt as e:
-                                        print('')
+                                _sqlite(mirror.connect(file))
+                    else:
+                        utils.printError('No app matches', exit=False)
+                elif len(cmd) in [4, 5] and cmd[2] == 'snapshot':
+                    if lib_packages.get_index(self.device).get(cmd[3]) is not None:
+                        try:
+                            r = lib_snapshot.SnapshotStore(self.device, cmd[3]).create(name=cmd[4] if len(cmd) == 5 else None)
+                            utils.printSuccess(f"Snapshot {r['name']} saved: {r['files']} files, {r['size'] / 1048576:.1f} MB read, {r['stored'] / 1048576:.1f} MB new ({r['time']:.1f}s)")
+                        except lib_snapshot.SnapshotError as e:
+                            utils.printError(e, exit=False)
                     else:
                         utils.printError('No app matches', exit=False)
                 else:
@@ -164,29 +197,75 @@ class ADV:
                     if len(cmd) == 3:
                         packages = tmp_p
                     else:
-                        packages = []
-                        for p in tmp_p:
-                            if cmd[3] in p['name'] or cmd[3] in p['pkg']:
-                                packages.append(p)
+                        packages = lib_packages.get_index(self.device).search(cmd[3])
 
                     if len(packages) == 0:
                         utils.printError('No app matches', exit=False)
                     else:
                         utils.printInfo('list of installed applications:')
-                        print('{0:<20} {1:50} {2:<50}'.format('Mode', 'Name', 'Package'))
+                        print('{0:<20} {1:50} {2:<50} {3:<12}'.format('Mode', 'Name', 'Package', 'Version'))
                         for p in packages:
-                            print('{0:<20} {1:50} {2:<50}'.format(p['mode'], p['name'], p['pkg']))
+                            print('{0:<20} {1:50} {2:<50} {3:<12}'.format(p['mode'], p['name'], p['pkg'], p['version'] or ''))
+            elif len(cmd) >= 4 and cmd[2] == 'apk':
+                packages = [p for p in dict.fromkeys(','.join(cmd[3:]).split(',')) if p != '']
+                start = time.time()
+                try:
+                    results = lib_apk.ApkCache(self.device).pull(packages)
+                except lib_shell.ShellError as e:
+                    utils.printError(e, exit=False)
+                    return
+                elapsed = time.time() - start
+                print('{0:<40} {1:<12} {2:<7} {3:<10} {4:<10} {5:<50}'.format('Package', 'Version', 'Files', 'Size', 'Pulled', 'Path'))
+                for pkg, r in results.items():
+                    print('{0:<40} {1:<12} {2:<7} {3:<10} {4:<10} {5:<50}'.format(pkg, r['version'] or '', r['files'], f"{r['size'] / 1048576:.1f} MB", f"{r['pulled']}/{r['files']}", r['path'] or ''))
+                    for error in r['errors']:
+                        utils.printError(f"{pkg}: {error}", exit=False)
+                total = sum(r['bytes'] for r in results.values())
+                utils.printSuccess(f"APKs pulled: {sum(r['pulled'] for r in results.values())} files, {total / 1048576:.1f} MB in {elapsed:.1f}s ({total / 1048576 / max(elapsed, 0.001):.1f} MB/s), {sum(r['skipped'] for r in results.values())} up to date")
+            elif len(cmd) == 4 and cmd[2] == 'snapshots':
+                snapshots = lib_snapshot.SnapshotStore(self.device, cmd[3]).snapshots()
+                if len(snapshots) == 0:
+                    utils.printWarning('No snapshot found')
+                else:
+                    print('{0:<30} {1:<22} {2:<10}'.format('Name', 'Date', 'Files'))
+                    for snapshot in snapshots:
+                        print('{0:<30} {1:<22} {2:<10}'.format(snapshot['name'], time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(snapshot['time'])), snapshot['files']))
+            elif len(cmd) in [4, 6] and cmd[2] == 'diff':
+                store = lib_snapshot.SnapshotStore(self.device, cmd[3])
+                if len(cmd) == 6:
+                    old, new = cmd[4], cmd[5]
+                else:
+                    snapshots = store.snapshots()
+                    old, new = (snapshots[-2]['name'], snapshots[-1]['name']) if len(snapshots) >= 2 else (None, None)
+                if old is None:
+                    utils.printError('Two snapshots are required', exit=False)
+                else:
+                    try:
+                        changes = store.diff(old, new)
+                    except lib_snapshot.SnapshotError as e:
+                        utils.printError(e, exit=False)
+                    else:
+                        if len(changes) == 0:
+                            utils.printWarning(f"No change between {old} and {new}")
+                        else:
+                            utils.printInfo(f"Changes between {old} and {new}:")
+                            print('{0:<10} {1:<12} {2:<60}'.format('Status', 'Size', 'Path'))
+                            for status, path, a, b in changes:
+                                size = f"{a['size']} -> {b['size']}" if status == 'modified' and a['type'] == 'file' else (b or a)['size']
+                                print('{0:<10} {1:<12} {2:<60}'.format(status, size, path))
             elif len(cmd) == 3 and cmd[2] == 'root':
                 # https://github.com/polygraphene/DirtyPipe-Android (CVE-2022-0847)
                 file = 'DirtyPipeRoot_2.2.apk'
                 if not os.path.exists(os.path.join('tmp', file)):
                     utils.downloadFile('tmp', file, 'https://github.com/tiann/DirtyPipeRoot/releases/download/v2.2/DirtyPipeRoot_2.2.apk')
 
-                subprocess.getoutput(f"adb -s {self.device['name']} shell monkey -p me.weishu.dirtypipecheck -c android.intent.category.LAUNCHER 1").strip()
-                size = subprocess.getoutput(f"adb -s {self.device['name']} shell wm size").strip().split(':')[1].strip()
-                height = int(size.split('x')[0]) / 2
-                width = int(size.split('x')[1]) / 2
-                os.system(f"adb -s {self.device['name']} shell input tap {height} {width}")
+                # launch, read the screen size and tap its center in a single round trip
+                probes = self.session.batch({
+                    'launch': 'monkey -p me.weishu.dirtypipecheck -c android.intent.category.LAUNCHER 1',
+                    'tap': 's=$(wm size | tail -n 1 | sed "s/.*: *//"); echo "$s"; w=${s%x*}; h=${s#*x}; input tap $((w / 2)) $((h / 2))'
+                })
+                if probes['launch']['code'] != 0 or probes['tap']['code'] != 0:
+                    utils.printError('Unable to start the root compatibility check', exit=False)
             elif len(cmd) == 3 and cmd[2] == 'help':
                 print('Available commands:')
                 print('{0:<26} {1:<14} {2:<40}'.format('Command', 'Permission', 'Description'))
@@ -0,0 +1,144 @@
+"""
+Project: PiracyTools
+File: lib_apk.py
+Author: hyugogirubato
+Date: 2026.10.18
+"""
+
+import json
+import os
+import re
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from module import lib_adb, lib_artifact, lib_packages, lib_shell
+
+""" APKs
+The APKs of a package (base + splits, `pm path`) are kept in tmp/apks/$PACKAGE/$VERSION/, with a manifest.json
+{file: {'path', 'size', 'mtime', 'sha256'}}.
+1 round trip resolves the paths of every requested package with their size and mtime. A local file with the same
+size and mtime is up to date; with the same size but another mtime, the device sha256 is compared (1 more round
+trip for all of them). The other files are pulled concurrently (MAX_WORKERS sync connections).
+"""
+
+PATH_APKS = os.path.join('tmp', 'apks')
+MAX_WORKERS = 4
+
+
+def _safe(value):
+    return re.sub(r'[^A-Za-z0-9._-]', '_', value)
+
+
+class ApkCache:
+
+    def __init__(self, device):
+        self.device = device
+        self.session = lib_shell.get_session(device)
+
+    def _resolve(self, packages):
+        # {package: [{'path', 'size', 'mtime'}]}, in one round trip
+        marker = f"__PTOOLS_{uuid.uuid4().hex}__"
+        cmd = (
+            f"for p in {' '.join(lib_shell.quote(p) for p in packages)}; do echo \"{marker} $p\"; "
+            f"pm path \"$p\" 2>/dev/null | while read -r l; do stat -c '%s %Y %n' \"${{l#package:}}\" 2>/dev/null; done; done"
+        )
+        result = {}
+        current = None
+        for line in self.session.run(cmd).split('\n'):
+            if line.startswith(f"{marker} "):
+                current = line[len(marker) + 1:]
+                result[current] = []
+                continue
+            items = line.strip().split(' ', 2)
+            if current is not None and len(items) == 3 and items[0].isdigit() and items[1].isdigit() and items[2].endswith('.apk'):
+                result[current].append({'path': items[2], 'size': int(items[0]), 'mtime': int(items[1])})
+        return result
+
+    def _checksums(self, paths):
+        # {path: sha256} computed on the device, in one round trip
+        r = self.session.run(f"sha256sum {' '.join(lib_shell.quote(p) for p in paths)} 2>/dev/null")
+        checksums = {}
+        for line in r.split('\n'):
+            items = line.strip().split(None, 1)
+            if len(items) == 2 and len(items[0]) == 64:
+                checksums[items[1]] = items[0]
+        return checksums
+
+    def _pull(self, task):
+        start = time.time()
+        try:
+            lib_adb.get_client().pull(self.device['name'], task['apk']['path'], task['local'])
+        except (lib_adb.AdbError, OSError) as e:
+            return dict(task, error=str(e.message if isinstance(e, lib_adb.AdbError) else e), time=time.time() - start)
+        return dict(task, sha256=lib_artifact.sha256sum(task['local']), error=None, time=time.time() - start)
+
+    def pull(self, packages, workers=MAX_WORKERS):
+        # returns {package: {'version', 'path', 'files', 'size', 'pulled', 'bytes', 'skipped', 'errors'}}
+        index = lib_packages.get_index(self.device)
+        resolved = self._resolve(packages)
+        results = {}
+        tasks = []
+        compare = []
+        for pkg in packages:
+            apks = resolved.get(pkg, [])
+            if len(apks) == 0:
+                results[pkg] = {'version': None, 'path': None, 'files': 0, 'size': 0, 'pulled': 0, 'bytes': 0, 'skipped': 0, 'errors': ['Package not found']}
+                continue
+            p = index.get(pkg)
+            version = (p or {}).get('version') or 'unknown'
+            path = os.path.join(PATH_APKS, _safe(pkg), _safe(version))
+            os.makedirs(path, exist_ok=True)
+            manifest = self._load(path)
+            results[pkg] = {'version': version, 'path': path, 'files': len(apks), 'size': sum(a['size'] for a in apks), 'pulled': 0, 'bytes': 0, 'skipped': 0, 'errors': [], 'manifest': manifest}
+            for apk in apks:
+                name = os.path.basename(apk['path'])
+                local = os.path.join(path, name)
+                entry = manifest.get(name)
+                task = {'package': pkg, 'name': name, 'apk': apk, 'local': local}
+                if entry is None or not os.path.exists(local) or os.path.getsize(local) != apk['size'] or entry['size'] != apk['size']:
+                    tasks.append(task)
+                elif entry['mtime'] == apk['mtime']:
+                    results[pkg]['skipped'] += 1
+                else:
+                    compare.append(task)
+
+        if len(compare) > 0:
+            checksums = self._checksums([t['apk']['path'] for t in compare])
+            for task in compare:
+                entry = results[task['package']]['manifest'][task['name']]
+                if checksums.get(task['apk']['path']) == entry['sha256']:
+                    entry['mtime'] = task['apk']['mtime']
+                    results[task['package']]['skipped'] += 1
+                else:
+                    tasks.append(task)
+
+        # largest first: the pool stays busy until the end
+        tasks.sort(key=lambda t: t['apk']['size'], reverse=True)
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(tasks) or 1))) as executor:
+            for r in executor.map(self._pull, tasks):
+                result = results[r['package']]
+                if r['error'] is not None:
+                    result['errors'].append(f"{r['name']}: {r['error']}")
+                    continue
+                result['pulled'] += 1
+                result['bytes'] += r['apk']['size']
+                result['manifest'][r['name']] = {'path': r['apk']['path'], 'size': r['apk']['size'], 'mtime': r['apk']['mtime'], 'sha256': r['sha256']}
+
+        for result in results.values():
+            manifest = result.pop('manifest', None)
+            if manifest is not None:
+                self._save(result['path'], manifest)
+        return results
+
+    def _load(self, path):
+        try:
+            with open(os.path.join(path, 'manifest.json'), mode='r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, path, manifest):
+        tmp = os.path.join(path, f"manifest.json.{os.getpid()}")
+        with open(tmp, mode='w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, os.path.join(path, 'manifest.json'))
@@ -0,0 +1,234 @@
+"""
+Project: PiracyTools
+File: lib_artifact.py
+Author: hyugogirubato
+Date: 2026.10.18
+"""
+
+import hashlib
+import json
+import lzma
+import os
+import shutil
+import time
+import uuid
+
+""" Layout
+tmp/artifacts/objects/<sha256[:2]>/<sha256>  decompressed content, never modified once renamed in place
+tmp/artifacts/index.json                      {"<name>/<version>/<abi>": {"sha256", "size", "time", "access", "source"}}
+tmp/artifacts/.lock                           held by writers and, briefly, by get() to record the access time
+
+Objects are written to a temporary file and renamed once hashed, so readers never see a partial file and read them
+without lock. Objects are created with mode 0o644, binaries are stored with mode=0o755.
+"""
+
+PATH_ARTIFACTS = os.path.join('tmp', 'artifacts')
+MAX_SIZE = 1024 * 1024 * 1024
+MAX_AGE = 90 * 24 * 60 * 60
+CHUNK_SIZE = 1024 * 1024
+LOCK_TIMEOUT = 60
+
+
+class ArtifactError(Exception):
+    pass
+
+
+def sha256sum(path):
+    h = hashlib.sha256()
+    with open(path, mode='rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class _Lock:
+
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        start = time.time()
+        while True:
+            try:
+                os.close(os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return self
+            except FileExistsError:
+                try:
+                    # a writer killed while holding the lock must not block the store forever
+                    if time.time() - os.path.getmtime(self.path) > LOCK_TIMEOUT:
+                        os.remove(self.path)
+                        continue
+                except OSError:
+                    continue
+                if time.time() - start > LOCK_TIMEOUT:
+                    raise ArtifactError(f'Artifact store locked: {self.path}')
+                time.sleep(0.05)
+
+    def __exit__(self, *args):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class ArtifactStore:
+
+    def __init__(self, path=PATH_ARTIFACTS, max_size=MAX_SIZE, max_age=MAX_AGE):
+        self.path = path
+        self.max_size = max_size
+        self.max_age = max_age
+        self.objects = os.path.join(path, 'objects')
+        self.index = os.path.join(path, 'index.json')
+        os.makedirs(self.objects, exist_ok=True)
+
+    def _lock(self):
+        return _Lock(os.path.join(self.path, '.lock'))
+
+    def _load(self):
+        try:
+            with open(self.index, mode='r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, index):
+        tmp = f"{self.index}.{uuid.uuid4().hex}"
+        with open(tmp, mode='w') as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp, self.index)
+
+    def _object(self, sha256):
+        return os.path.join(self.objects, sha256[:2], sha256)
+
+    def get_object(self, sha256):
+        path = self._object(sha256)
+        return path if os.path.exists(path) else None
+
+    @staticmethod
+    def key(name, version, abi):
+        return f"{name}/{version}/{abi}"
+
+    def entries(self):
+        return self._load()
+
+    def get(self, name, version, abi, verify=False):
+        key = self.key(name, version, abi)
+        entry = self._load().get(key)
+        if entry is None:
+            return None
+        path = self._object(entry['sha256'])
+        try:
+            if os.path.getsize(path) != entry['size']:
+                return None
+        except OSError:
+            return None
+        if verify and sha256sum(path) != entry['sha256']:
+            return None
+        with self._lock():
+            index = self._load()
+            if key in index:
+                index[key]['access'] = time.time()
+                self._save(index)
+        return path
+
+    def write_object(self, chunks, mode=0o644):
+        # content-addressed write without index entry, returns (sha256, size, created)
+        tmp = os.path.join(self.objects, f".{uuid.uuid4().hex}.tmp")
+        h = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp, mode='wb') as f:
+                for chunk in chunks:
+                    h.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            sha256 = h.hexdigest()
+            path = self._object(sha256)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            created = not os.path.exists(path)
+            if not created:
+                os.remove(tmp)
+                os.utime(path)
+            else:
+                os.chmod(tmp, mode)
+                os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return sha256, size, created
+
+    def _add(self, name, version, abi, sha256, size, source):
+        with self._lock():
+            index = self._load()
+            index[self.key(name, version, abi)] = {'sha256': sha256, 'size': size, 'time': time.time(), 'access': time.time(), 'source': source}
+            self._save(index)
+        self.evict()
+        return self._object(sha256)
+
+    def put_chunks(self, name, version, abi, chunks, source=None, sha256=None, mode=0o644):
+        # chunks is an iterable of decompressed bytes, sha256 is the expected digest when known
+        digest, size, created = self.write_object(chunks, mode=mode)
+        if sha256 is not None and digest != sha256:
+            raise ArtifactError(f'Checksum mismatch for {self.key(name, version, abi)}: {digest} != {sha256}')
+        return self._add(name, version, abi, digest, size, source)
+
+    def put(self, name, version, abi, input, compressed=True, sha256=None, mode=0o644):
+        def chunks():
+            with (lzma.open(input, mode='rb') if compressed else open(input, mode='rb')) as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    yield chunk
+
+        try:
+            return self.put_chunks(name, version, abi, chunks(), source=os.path.basename(input), sha256=sha256, mode=mode)
+        except lzma.LZMAError as e:
+            raise ArtifactError(f'Invalid archive {input}: {e}')
+
+    def put_file(self, name, version, abi, input, source=None, sha256=None, mode=0o644):
+        # moves an already decompressed file into the store, avoiding a copy when on the same filesystem
+        digest = sha256sum(input)
+        if sha256 is not None and digest != sha256:
+            raise ArtifactError(f'Checksum mismatch for {self.key(name, version, abi)}: {digest} != {sha256}')
+        path = self._object(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            os.chmod(input, mode)
+            os.replace(input, path)
+        except OSError:
+            with open(input, mode='rb') as f:
+                return self.put_chunks(name, version, abi, iter(lambda: f.read(CHUNK_SIZE), b''), source=source, sha256=sha256, mode=mode)
+        return self._add(name, version, abi, digest, os.path.getsize(path), source)
+
+    def evict(self):
+        # drop entries not used for max_age, then the least recently used ones above max_size
+        removed = []
+        with self._lock():
+            index = self._load()
+            now = time.time()
+            for key in [k for k, e in index.items() if now - e['access'] > self.max_age]:
+                removed.append(key)
+                del index[key]
+            total = sum(e['size'] for e in {e['sha256']: e for e in index.values()}.values())
+            for key, entry in sorted(index.items(), key=lambda i: i[1]['access']):
+                if total <= self.max_size:
+                    break
+                removed.append(key)
+                del index[key]
+                if entry['sha256'] not in [e['sha256'] for e in index.values()]:
+                    total -= entry['size']
+            if len(removed) > 0:
+                self._save(index)
+            used = set(e['sha256'] for e in index.values())
+            for folder in os.listdir(self.objects):
+                folder = os.path.join(self.objects, folder)
+                for file in os.listdir(folder) if os.path.isdir(folder) else []:
+                    # recent objects may belong to a writer waiting for the lock to index them
+                    if not file.startswith('.') and file not in used and now - os.path.getmtime(os.path.join(folder, file)) > LOCK_TIMEOUT:
+                        os.remove(os.path.join(folder, file))
+        return removed
+
+    def clear(self):
+        with self._lock():
+            self._save({})
+            shutil.rmtree(self.objects, ignore_errors=True)
+            os.makedirs(self.objects, exist_ok=True)
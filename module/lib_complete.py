@@ -0,0 +1,285 @@
+"""
+Project: PiracyTools
+File: lib_complete.py
+Author: hyugogirubato
+Date: 2026.10.18
+"""
+
+import glob
+import importlib
+import os
+import posixpath
+import queue
+import re
+import threading
+import time
+import uuid
+from module import lib_packages, lib_shell, lib_trace
+
+""" Completion
+Tab completion of the shell (readline), served from memory: a completion never waits for the device longer than WAIT.
+Remote directories and packages are listed by a background thread on its own adb shell (the shell of the user is
+never locked): one round trip lists a directory and its children (up to MAX_CHILDREN), so the next level is already
+known when a completion enters it. The current directory is listed after every command, entries older than TTL are served
+while they are listed again.
+Shell commands changing files (MUTATING or a redirection) drop the cached directories they name and the current one.
+
+Completed: shell commands (/system/bin), ptools modules and commands, packages, remote paths and local files
+for $SCRIPT|$FILE|$SPEC arguments.
+"""
+
+BUILTINS = ['clear', 'exit', 'su', 'ptools', 'logcat']
+MODULES = {'adv': 'module.lib_adv', 'frida': 'module.lib_frida', 'fanout': 'module.lib_fanout', 'trace': 'module.lib_trace'}
+LOCAL_ARGS = ['$SCRIPT', '$FILE', '$SPEC']
+LOGCAT_OPTIONS = ['--pid=', '--uid=', '--package=', '--tag=', '--level=', '--grep=', '--output=', '--quiet']
+MUTATING = ['rm', 'rmdir', 'mkdir', 'mv', 'cp', 'touch', 'ln', 'tar', 'unzip', 'gzip', 'gunzip', 'chmod', 'chown', 'dd', 'install', 'pm', 'run-as']
+PATH_COMMANDS = '/system/bin'
+MAX_CHILDREN = 64
+TTL = 30.0
+WAIT = 0.3
+_ANSI = re.compile(r'(\x1b\[[0-9;]*m)')
+
+
+class DirectoryCache:
+
+    def __init__(self, device, root=False):
+        self.device = device
+        self.root = root
+        self._dirs = {}  # path: {'time', 'entries': {name: is directory}}
+        self._pending = set()
+        self._lock = threading.Condition()
+        self._queue = queue.Queue()
+        self._shells = {}
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def _shell(self, root=None):
+        root = self.root if root is None else root
+        if root not in self._shells:
+            self._shells[root] = lib_shell.Shell(self.device['name'], root=root)
+        return self._shells[root]
+
+    def _list(self, path):
+        # {path: entries} for path and its sub directories, in one round trip
+        marker = f"__PTOOLS_{uuid.uuid4().hex}__"
+        cmd = (
+            f"cd -- {lib_shell.quote(path)} 2>/dev/null || exit 1; n=0; for d in . */; do "
+            f"[ -d \"$d\" ] || continue; n=$((n + 1)); [ $n -gt {MAX_CHILDREN + 1} ] && break; "
+            f"echo \"{marker} $d\"; ls -1Ap \"$d\" 2>/dev/null; done"
+        )
+        r = self._shell().execute(cmd, cwd='/')
+        result = {path: {}}
+        if r['code'] != 0:
+            return result
+        current = None
+        for line in r['output'].split('\n'):
+            if line.startswith(f"{marker} "):
+                name = line[len(marker) + 1:].rstrip('/')
+                current = path if name == '.' else posixpath.join(path, name)
+                result[current] = {}
+            elif current is not None and line not in ['', './', '../']:
+                result[current][line.rstrip('/')] = line.endswith('/')
+        return result
+
+    def _worker(self):
+        with lib_trace.scope('completion', thread=True):
+            self._work()
+
+    def _work(self):
+        while True:
+            kind, value = self._queue.get()
+            if kind is None:
+                break
+            try:
+                if kind == 'packages':
+                    lib_packages.get_index(self.device).refresh(shell=self._shell(root=False))
+                    continue
+                if self.fresh(value):
+                    continue
+                root = self.root
+                listed = self._list(value)
+                with self._lock:
+                    # listings made with another user are dropped
+                    if root == self.root:
+                        now = time.time()
+                        for path, entries in listed.items():
+                            self._dirs[path] = {'time': now, 'entries': entries}
+            except (lib_shell.ShellError, OSError):
+                pass
+            finally:
+                with self._lock:
+                    self._pending.discard((kind, value))
+                    self._lock.notify_all()
+
+    def _submit(self, kind, value=None):
+        with self._lock:
+            if (kind, value) in self._pending:
+                return
+            self._pending.add((kind, value))
+        self._queue.put((kind, value))
+
+    def fresh(self, path):
+        with self._lock:
+            return path in self._dirs and time.time() - self._dirs[path]['time'] < TTL
+
+    def prefetch(self, path):
+        if not self.fresh(path):
+            self._submit('path', path)
+
+    def refresh_packages(self):
+        self._submit('packages')
+
+    def entries(self, path, wait=WAIT):
+        # {name: is directory} or None when the directory could not be listed in time
+        self.prefetch(path)
+        deadline = time.time() + wait
+        with self._lock:
+            while path not in self._dirs and ('path', path) in self._pending and time.time() < deadline:
+                self._lock.wait(deadline - time.time())
+            return self._dirs[path]['entries'] if path in self._dirs else None
+
+    def invalidate(self, path, recursive=False):
+        # drops path (and every directory below it when recursive)
+        with self._lock:
+            for key in [k for k in self._dirs if k == path or (recursive and k.startswith(path.rstrip('/') + '/'))]:
+                self._dirs.pop(key)
+
+    def set_root(self, root):
+        with self._lock:
+            if root != self.root:
+                self.root = root
+                self._dirs = {}
+
+    def close(self):
+        self._queue.put((None, None))
+        self._thread.join(timeout=1)
+        for shell in self._shells.values():
+            shell.close()
+        self._shells = {}
+
+
+class Completer:
+
+    def __init__(self, device, readline=None):
+        self.device = device
+        self.readline = readline
+        self.cwd = '/'
+        self.cache = None
+        self._matches = []
+        if readline is not None:
+            self.cache = DirectoryCache(device)
+            self.cache.prefetch(self.cwd)
+            self.cache.prefetch(PATH_COMMANDS)
+            self.cache.refresh_packages()
+
+    def update(self, cwd, root=False, cmd=None):
+        # called after every command of the shell
+        if self.cache is None:
+            return
+        self.cache.set_root(root)
+        if cmd is not None:
+            words = cmd.strip().split()
+            if len(words) > 0 and (words[0] in MUTATING or '>' in cmd):
+                self.cache.invalidate(self.cwd)
+                for word in words[1:]:
+                    if not word.startswith('-') and not word.startswith('>'):
+                        path = posixpath.normpath(posixpath.join(self.cwd, word))
+                        self.cache.invalidate(path, recursive=True)
+                        self.cache.invalidate(posixpath.dirname(path))
+                if words[0] in ['pm', 'install']:
+                    self.cache.refresh_packages()
+        self.cwd = cwd
+        self.cache.prefetch(cwd)
+
+    def _remote(self, text):
+        directory, slash, prefix = text.rpartition('/')
+        path = posixpath.normpath(posixpath.join(self.cwd, directory + slash)) if slash else self.cwd
+        entries = self.cache.entries(path) or {}
+        matches = []
+        for name in sorted(entries):
+            if name.startswith(prefix) and (prefix.startswith('.') or not name.startswith('.')):
+                matches.append(directory + slash + name + ('/' if entries[name] else ''))
+                if entries[name]:
+                    self.cache.prefetch(posixpath.join(path, name))
+        return matches
+
+    def _local(self, text):
+        return sorted(p + ('/' if os.path.isdir(p) else '') for p in glob.glob(glob.escape(text) + '*'))
+
+    def _packages(self, text):
+        self.cache.refresh_packages()
+        return sorted(set(p['pkg'] for p in lib_packages.get_index(self.device).prefix(text, refresh=False) if p['pkg'].startswith(text)))
+
+    def _ptools(self, words, text):
+        if len(words) == 1:
+            return [m for m in list(MODULES) + ['help'] if m.startswith(text)]
+        if words[1] not in MODULES:
+            return []
+        if words[1] == 'fanout' and len(words) >= 3 and words[2] != 'help':
+            # fanout $SELECTOR $MODULE $COMMAND completes as $MODULE $COMMAND
+            return self._ptools(['ptools'] + words[3:], text) if len(words) >= 4 else [m for m in ['adv', 'frida'] if m.startswith(text)]
+        helps = importlib.import_module(MODULES[words[1]]).HELPS + [{'command': 'help'}]
+        position = len(words) - 2
+        matches = set()
+        for h in helps:
+            pattern = [p.strip('[]') for p in h['command'].split(' ')]
+            if position >= len(pattern) or any(not pattern[i].startswith('$') and words[i + 2] not in pattern[i].split('|') for i in range(position)):
+                continue
+            for alternative in pattern[position].split('|'):
+                if alternative == '$PACKAGE':
+                    matches.update(self._packages(text))
+                elif alternative in LOCAL_ARGS:
+                    matches.update(self._local(text))
+                elif not alternative.startswith('$') and alternative.startswith(text):
+                    matches.add(alternative)
+        return sorted(matches)
+
+    def _candidates(self, line, begidx, text):
+        words = line[:begidx].split()
+        if len(words) == 0:
+            commands = set(BUILTINS) | set((self.cache.entries(PATH_COMMANDS) or {}).keys())
+            return sorted(c for c in commands if c.startswith(text))
+        if words[0] == 'ptools':
+            return self._ptools(words, text)
+        if words[0] == 'logcat':
+            if text.startswith('--package='):
+                return ['--package=' + p for p in self._packages(text[10:])]
+            if text.startswith('-'):
+                return [o for o in LOGCAT_OPTIONS if o.startswith(text)]
+            return []
+        return self._remote(text)
+
+    def complete(self, text, state):
+        # readline completer
+        if state == 0:
+            try:
+                self._matches = self._candidates(self.readline.get_line_buffer(), self.readline.get_begidx(), text)
+            except Exception:
+                self._matches = []
+        return self._matches[state] if state < len(self._matches) else None
+
+    def prompt(self, text):
+        # colors are zero width for readline
+        return _ANSI.sub('\x01\\1\x02', text) if self.readline is not None else text
+
+    def close(self):
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+
+
+def install(device):
+    # Completer of the shell, completion is disabled when readline is not available (Windows)
+    try:
+        import readline
+    except ImportError:
+        return Completer(device)
+    readline.set_completer_delims(' \t\n')
+    if 'libedit' in (readline.__doc__ or ''):
+        readline.parse_and_bind('bind ^I rl_complete')
+    else:
+        readline.parse_and_bind('tab: complete')
+    completer = Completer(device, readline=readline)
+    readline.set_completer(completer.complete)
+    return completer
+
@@ -0,0 +1,163 @@
+"""
+Project: PiracyTools
+File: lib_db.py
+Author: hyugogirubato
+Date: 2026.10.18
+"""
+
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tarfile
+import time
+from module import lib_adb, lib_shell
+
+""" Databases
+The databases of a package are mirrored in tmp/databases/$SERIAL/$PACKAGE and queried locally (python sqlite3),
+the device does not need a sqlite3 binary.
+1 round trip to list the remote files (size + mtime), then the changed databases are pulled in one tar stream
+over exec: (su -c tar). A database is pulled with its -wal/-shm/-journal files whenever one of them changed,
+files are extracted to a staging directory and moved in place once the stream is complete.
+"""
+
+PATH_DATABASES = os.path.join('tmp', 'databases')
+SUFFIXES = ['-wal', '-shm', '-journal']
+CHUNK_SIZE = 1024 * 1024
+
+
+class DatabaseError(Exception):
+    pass
+
+
+def _base(name):
+    for suffix in SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def _safe(value):
+    return re.sub(r'[^A-Za-z0-9._-]', '_', value)
+
+
+class DatabaseMirror:
+
+    def __init__(self, device, package):
+        self.device = device
+        self.package = package
+        self.remote = f"/data/data/{package}/databases"
+        self.path = os.path.join(PATH_DATABASES, _safe(device['name']), _safe(package))
+        self.manifest = {}
+        try:
+            with open(os.path.join(self.path, 'manifest.json'), mode='r') as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def _save(self):
+        tmp = os.path.join(self.path, f"manifest.json.{os.getpid()}")
+        with open(tmp, mode='w') as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp, os.path.join(self.path, 'manifest.json'))
+
+    def _list(self):
+        # {name: {'size', 'mtime'}} of the regular files in the databases directory
+        q = lib_shell.quote(self.remote)
+        r = lib_shell.get_session(self.device).execute(f"[ -d {q} ] && find {q} -maxdepth 1 -type f -exec stat -c '%s %Y %n' {{}} +", root=True)
+        if r['code'] != 0:
+            raise DatabaseError('No database available')
+        files = {}
+        for line in r['output'].split('\n'):
+            items = line.strip().split(' ', 2)
+            if len(items) == 3 and items[0].isdigit() and items[1].isdigit():
+                files[os.path.basename(items[2])] = {'size': int(items[0]), 'mtime': int(items[1])}
+        return files
+
+    def _pull(self, names, staging):
+        files = ' '.join(lib_shell.quote(n) for n in sorted(names))
+        cmd = f"su -c {lib_shell.quote(f'cd {lib_shell.quote(self.remote)} && tar -cf - {files}')}"
+        try:
+            connection = lib_adb.get_client().exec_out(self.device['name'], cmd)
+        except lib_adb.AdbError as e:
+            raise DatabaseError(f'Unable to pull databases: {e.message}')
+        extracted = {}
+        try:
+            with connection.sock.makefile('rb') as stream:
+                with tarfile.open(fileobj=stream, mode='r|') as tar:
+                    for member in tar:
+                        name = os.path.basename(member.name)
+                        if not member.isfile() or name not in names:
+                            continue
+                        with tar.extractfile(member) as src, open(os.path.join(staging, name), mode='wb') as dst:
+                            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+                        extracted[name] = member.size
+        except (tarfile.TarError, OSError) as e:
+            raise DatabaseError(f'Invalid archive from device: {e}')
+        finally:
+            connection.close()
+        return extracted
+
+    def sync(self):
+        # returns {'databases', 'pulled', 'size', 'time'}, pulled being the number of transferred files
+        start = time.time()
+        remote = self._list()
+        groups = {}
+        for name in remote:
+            groups.setdefault(_base(name), []).append(name)
+        changed = []
+        for base, names in groups.items():
+            if not os.path.exists(os.path.join(self.path, base)) or any(self.manifest.get(n) != remote[n] for n in names):
+                changed.append(base)
+        # files removed on the device
+        for name in list(self.manifest):
+            if name not in remote:
+                self.manifest.pop(name)
+                if os.path.exists(os.path.join(self.path, name)):
+                    os.remove(os.path.join(self.path, name))
+
+        os.makedirs(self.path, exist_ok=True)
+        size = 0
+        pulled = 0
+        if len(changed) > 0:
+            names = set(n for base in changed for n in groups[base])
+            staging = os.path.join(self.path, '.staging')
+            shutil.rmtree(staging, ignore_errors=True)
+            os.makedirs(staging)
+            try:
+                extracted = self._pull(names, staging)
+                for base in changed:
+                    for suffix in [''] + SUFFIXES:
+                        name = base + suffix
+                        if os.path.exists(os.path.join(self.path, name)):
+                            os.remove(os.path.join(self.path, name))
+                        self.manifest.pop(name, None)
+                        if name in extracted:
+                            os.replace(os.path.join(staging, name), os.path.join(self.path, name))
+                            self.manifest[name] = remote[name]
+            finally:
+                shutil.rmtree(staging, ignore_errors=True)
+                self._save()
+            size = sum(extracted.values())
+            pulled = len(extracted)
+        else:
+            self._save()
+        return {'databases': len(groups), 'pulled': pulled, 'size': size, 'time': time.time() - start}
+
+    def databases(self):
+        # local databases: [{'file', 'size', 'date'}], size including the -wal file
+        result = []
+        for name in sorted(self.manifest):
+            if _base(name) == name and os.path.exists(os.path.join(self.path, name)):
+                result.append({
+                    'file': name,
+                    'size': self.manifest[name]['size'] + self.manifest.get(f"{name}-wal", {}).get('size', 0),
+                    'date': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self.manifest[name]['mtime']))
+                })
+        return result
+
+    def connect(self, name):
+        if name not in self.manifest or _base(name) != name:
+            raise DatabaseError(f'Database not found: {name}')
+        return sqlite3.connect(os.path.join(self.path, name))
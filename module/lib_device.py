@@ -0,0 +1,171 @@
+"""
+Project: PiracyTools
+File: lib_device.py
+Author: hyugogirubato
+Date: 2026.10.18
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from module import lib_adb
+
+""" Cache
+Read-only properties (ro.*) cannot change without a reboot, so they are cached per serial with the boot id
+they were read under. An entry is reused without any device round trip while the adb transport id is unchanged
+(the device has not been disconnected since) and the entry is younger than CACHE_TTL.
+
+Reconnect: wait_device() polls the attached devices with a bounded backoff (RECONNECT_DELAY doubled up to
+RECONNECT_MAX_DELAY, until RECONNECT_TIMEOUT), `adb connect` is retried for network serials ($HOST:$PORT).
+"""
+
+PATH_CACHE = os.path.join('tmp', 'devices.json')
+CACHE_TTL = 24 * 60 * 60
+MAX_WORKERS = 16
+PROPERTIES = {'sdk': 'ro.build.version.sdk', 'abi': 'ro.product.cpu.abi'}
+RECONNECT_TIMEOUT = 30
+RECONNECT_DELAY = 0.1
+RECONNECT_MAX_DELAY = 1
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def _load_cache():
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = {}
+        if os.path.exists(PATH_CACHE):
+            try:
+                with open(PATH_CACHE, mode='r') as f:
+                    _CACHE = json.load(f)
+            except (OSError, ValueError):
+                _CACHE = {}
+    return _CACHE
+
+
+def _save_cache():
+    os.makedirs(os.path.dirname(PATH_CACHE), exist_ok=True)
+    tmp = f"{PATH_CACHE}.{os.getpid()}"
+    with open(tmp, mode='w') as f:
+        json.dump(_CACHE, f, indent=2)
+    os.replace(tmp, PATH_CACHE)
+
+
+def _get_attached():
+    attached = []
+    for device in lib_adb.get_client().devices():
+        if device['state'] == 'device':
+            attached.append({'name': device['name'], 'transport_id': device['transport_id']})
+    return attached
+
+
+def _probe(serial):
+    # one line per value, unset properties are empty strings
+    cmd = 'echo "$(cat /proc/sys/kernel/random/boot_id 2>/dev/null)"'
+    for p in PROPERTIES.values():
+        cmd += f"; getprop {p}"
+    try:
+        r = lib_adb.get_client().shell(serial, cmd)['stdout']
+    except lib_adb.AdbError:
+        return None
+    if r == '':
+        return None
+    items = [i.strip() for i in r.split('\n')] + [''] * len(PROPERTIES)
+    entry = {'boot_id': items[0]}
+    for key, value in zip(PROPERTIES.keys(), items[1:]):
+        entry[key] = value
+    return entry
+
+
+def _get_device(attached, refresh=False):
+    with _CACHE_LOCK:
+        entry = _load_cache().get(attached['name'])
+    if not refresh and entry is not None and attached['transport_id'] is not None \
+            and entry.get('transport_id') == attached['transport_id'] and time.time() - entry['time'] < CACHE_TTL:
+        return entry
+
+    probe = _probe(attached['name'])
+    if probe is None:
+        return None
+    if entry is None or entry.get('boot_id') != probe['boot_id']:
+        entry = {}
+    entry.update(probe)
+    entry['transport_id'] = attached['transport_id']
+    entry['time'] = time.time()
+    with _CACHE_LOCK:
+        _load_cache()[attached['name']] = entry
+    return entry
+
+
+def get_devices(refresh=False):
+    attached = _get_attached()
+    if len(attached) == 0:
+        return []
+
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(attached))) as executor:
+        entries = list(executor.map(lambda a: _get_device(a, refresh=refresh), attached))
+
+    devices = []
+    for attached, entry in zip(attached, entries):
+        if entry is not None:
+            device = {'name': attached['name']}
+            for key in PROPERTIES.keys():
+                device[key] = entry[key]
+            devices.append(device)
+
+    with _CACHE_LOCK:
+        try:
+            _save_cache()
+        except OSError:
+            pass
+    return devices
+
+
+def get_device(serial):
+    # one-shot commands: a cached entry younger than CACHE_TTL is used without contacting adb
+    with _CACHE_LOCK:
+        entry = _load_cache().get(serial)
+    if entry is None or time.time() - entry['time'] >= CACHE_TTL:
+        attached = [a for a in _get_attached() if a['name'] == serial]
+        entry = _get_device(attached[0], refresh=True) if len(attached) > 0 else None
+        if entry is None:
+            return None
+        with _CACHE_LOCK:
+            try:
+                _save_cache()
+            except OSError:
+                pass
+    device = {'name': serial}
+    for key in PROPERTIES.keys():
+        device[key] = entry[key]
+    return device
+
+
+def wait_device(device, timeout=RECONNECT_TIMEOUT):
+    # after a lost transport: seconds until the device is back (network devices are reconnected), None after timeout
+    # the device identity is kept, a dropped transport does not change the properties read at selection
+    start = time.time()
+    delay = RECONNECT_DELAY
+    gone = False
+    while True:
+        try:
+            if device['name'] in [a['name'] for a in _get_attached()]:
+                if gone:
+                    # new transport: the adb client state of the old one is dropped, the device cache is kept
+                    lib_adb.get_client().forget(device['name'])
+                return time.time() - start
+            gone = True
+            if ':' in device['name']:
+                lib_adb.get_client().connect_device(device['name'])
+        except lib_adb.AdbConnectionError:
+            # adb server stopped, started again by the next get_client()
+            lib_adb.reset_client()
+        except lib_adb.AdbError:
+            pass
+        if time.time() - start + delay > timeout:
+            return None
+        time.sleep(delay)
+        delay = min(delay * 2, RECONNECT_MAX_DELAY)
@@ -0,0 +1,274 @@
+"""
+Project: PiracyTools
+File: lib_download.py
+Author: hyugogirubato
+Date: 2026.10.18
+"""
+
+import json
+import lzma
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+
+""" Download
+The raw response is written to "$OUTPUT.part" (kept on failure so the next call resumes with an HTTP Range request).
+With decompress='xz', the stream is decoded to $OUTPUT while it is downloaded: memory stays bounded by CHUNK_SIZE.
+Segmented downloads write each range at its offset in the .part file and keep their progress in "$OUTPUT.part.json".
+"""
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.110 Safari/537.36'
+CHUNK_SIZE = 1024 * 1024
+SEGMENT_MIN_SIZE = 4 * 1024 * 1024
+PROGRESS_INTERVAL = 0.5
+TIMEOUT = 30
+
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+
+class DownloadError(Exception):
+    pass
+
+
+def get_session():
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            _SESSION = requests.Session()
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16, max_retries=2)
+            _SESSION.mount('http://', adapter)
+            _SESSION.mount('https://', adapter)
+            _SESSION.headers.update({'accept': '*/*', 'user-agent': USER_AGENT})
+        return _SESSION
+
+
+class Progress:
+    # written on stderr at most every PROGRESS_INTERVAL, whatever the chunk rate
+
+    def __init__(self, total=None, enabled=True, stream=None):
+        self.total = total
+        self.enabled = enabled
+        self.stream = stream or sys.stderr
+        self.done = 0
+        self.resumed = 0  # bytes already on disk, not transferred by this run
+        self.start = time.time()
+        self._last = self.start
+        self._lock = threading.Lock()
+
+    def update(self, size):
+        with self._lock:
+            self.done += size
+            now = time.time()
+            if self.enabled and now - self._last >= PROGRESS_INTERVAL:
+                self._last = now
+                self._print(now)
+
+    def resume(self, size):
+        with self._lock:
+            self.done += size
+            self.resumed += size
+
+    def transferred(self):
+        return self.done - self.resumed
+
+    def speed(self):
+        elapsed = time.time() - self.start
+        return self.transferred() / elapsed if elapsed > 0 else 0.0
+
+    def _print(self, now, end=''):
+        speed = self.transferred() / (now - self.start) if now > self.start else 0.0
+        if self.total:
+            text = f"{self.done * 100 / self.total:5.1f}% {self.done / 1048576:8.1f}/{self.total / 1048576:.1f} MB"
+        else:
+            text = f"{self.done / 1048576:8.1f} MB"
+        self.stream.write(f"\r{text} {speed / 1048576:7.2f} MB/s{end}")
+        self.stream.flush()
+
+    def close(self):
+        if self.enabled:
+            self._print(time.time(), end='\n')
+
+
+class _XZSink:
+    # decodes the compressed stream to the output file as it arrives
+
+    def __init__(self, output):
+        self.decompressor = lzma.LZMADecompressor(format=lzma.FORMAT_XZ)
+        self.file = open(output, mode='wb')
+
+    def write(self, data):
+        if self.decompressor.eof:
+            return
+        try:
+            self.file.write(self.decompressor.decompress(data, max_length=CHUNK_SIZE))
+            while not self.decompressor.needs_input and not self.decompressor.eof:
+                self.file.write(self.decompressor.decompress(b'', max_length=CHUNK_SIZE))
+        except lzma.LZMAError as e:
+            raise DownloadError(f'Invalid xz stream: {e}')
+
+    def close(self, complete=True):
+        self.file.close()
+        if complete and not self.decompressor.eof:
+            raise DownloadError('Truncated xz stream')
+
+
+def decompress_file(input, output, format='xz'):
+    if format != 'xz':
+        raise DownloadError(f'Unsupported format: {format}')
+    sink = _XZSink(output)
+    try:
+        with open(input, mode='rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                sink.write(chunk)
+    finally:
+        sink.close()
+
+
+def _probe(url, user_agent=USER_AGENT):
+    try:
+        r = get_session().get(url, stream=True, timeout=TIMEOUT, headers={'range': 'bytes=0-0', 'user-agent': user_agent})
+    except requests.RequestException as e:
+        raise DownloadError(f'Unable to download file from: {url} ({e})')
+    try:
+        if not r.ok:
+            raise DownloadError(f'Unable to download file from: {url} ({r.status_code})')
+        if r.status_code == 206 and '/' in r.headers.get('content-range', ''):
+            total = r.headers['content-range'].split('/')[1]
+            return (int(total) if total.isdigit() else None), True, r.url
+        total = r.headers.get('content-length')
+        return (int(total) if total is not None and total.isdigit() else None), r.headers.get('accept-ranges') == 'bytes', r.url
+    finally:
+        r.close()
+
+
+def _fetch(url, file, start, end, progress, sink=None, user_agent=USER_AGENT):
+    # writes bytes [start, end] (end None: until EOF) at their offset, returns the number of bytes written
+    headers = {'user-agent': user_agent}
+    if start > 0 or end is not None:
+        headers['range'] = f"bytes={start}-{'' if end is None else end}"
+    r = get_session().get(url, stream=True, timeout=TIMEOUT, headers=headers)
+    try:
+        if not r.ok:
+            raise DownloadError(f'Unable to download file from: {url} ({r.status_code})')
+        if start > 0 and r.status_code != 206:
+            raise DownloadError('Server ignored the range request')
+        file.seek(start)
+        size = 0
+        for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+            if chunk:
+                file.write(chunk)
+                if sink is not None:
+                    sink.write(chunk)
+                size += len(chunk)
+                progress.update(len(chunk))
+        return size
+    finally:
+        r.close()
+
+
+def _segmented(url, part, total, segments, progress, user_agent=USER_AGENT):
+    state_path = f"{part}.json"
+    state = None
+    if os.path.exists(part) and os.path.exists(state_path):
+        try:
+            with open(state_path, mode='r') as f:
+                state = json.load(f)
+            if state['total'] != total:
+                state = None
+        except (OSError, ValueError, KeyError):
+            state = None
+    if state is None:
+        size = -(-total // segments)
+        state = {'total': total, 'segments': [[i, min(i + size, total) - 1, 0] for i in range(0, total, size)]}
+        with open(part, mode='wb') as f:
+            f.truncate(total)
+    progress.resume(sum(s[2] for s in state['segments']))
+    lock = threading.Lock()
+
+    def save():
+        with lock:
+            with open(state_path, mode='w') as f:
+                json.dump(state, f)
+
+    def worker(segment):
+        with open(part, mode='r+b') as f:
+            while segment[2] < segment[1] - segment[0] + 1:
+                start = segment[0] + segment[2]
+                r = get_session().get(url, stream=True, timeout=TIMEOUT, headers={'range': f"bytes={start}-{segment[1]}", 'user-agent': user_agent})
+                try:
+                    if r.status_code != 206:
+                        raise DownloadError(f'Unable to download range {start}-{segment[1]} ({r.status_code})')
+                    f.seek(start)
+                    for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                        if chunk:
+                            f.write(chunk)
+                            segment[2] += len(chunk)
+                            progress.update(len(chunk))
+                finally:
+                    r.close()
+                if segment[0] + segment[2] == start:
+                    raise DownloadError(f'Empty response for range {start}-{segment[1]}')
+        save()
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(state['segments'])) as executor:
+            for future in [executor.submit(worker, s) for s in state['segments']]:
+                future.result()
+    finally:
+        save()
+    os.remove(state_path)
+
+
+def download(url, output, decompress=None, segments=1, progress=True, user_agent=USER_AGENT):
+    # returns {'size', 'time', 'speed', 'resumed'}, size being the number of bytes downloaded by this call
+    part = f"{output}.part"
+    total, ranges, url = _probe(url, user_agent=user_agent)
+    bar = Progress(total=total, enabled=progress)
+    resumed = False
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+
+    try:
+        if segments > 1 and ranges and total is not None and total >= SEGMENT_MIN_SIZE:
+            resumed = os.path.exists(f"{part}.json")
+            _segmented(url, part, total, min(segments, total // SEGMENT_MIN_SIZE), bar, user_agent=user_agent)
+            if decompress is not None:
+                decompress_file(part, output, format=decompress)
+                os.remove(part)
+            else:
+                os.replace(part, output)
+        else:
+            start = os.path.getsize(part) if os.path.exists(part) and ranges else 0
+            if total is not None and start > total:
+                start = 0
+            resumed = start > 0
+            sink = _XZSink(output) if decompress == 'xz' else None
+            try:
+                with open(part, mode='r+b' if start > 0 else 'wb') as f:
+                    if sink is not None and start > 0:
+                        # replay the bytes already on disk through the decoder before resuming
+                        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                            sink.write(chunk)
+                    bar.resume(start)
+                    if total is None or start < total:
+                        _fetch(url, f, start, None, bar, sink=sink, user_agent=user_agent)
+                    f.truncate()
+            finally:
+                if sink is not None:
+                    sink.close(complete=False)
+            if sink is not None:
+                if not sink.decompressor.eof:
+                    raise DownloadError('Truncated xz stream')
+                os.remove(part)
+            else:
+                os.replace(part, output)
+    except requests.RequestException as e:
+        raise DownloadError(f'Unable to download file from: {url} ({e})')
+    finally:
+        bar.close()
+    elapsed = time.time() - bar.start
+    return {'size': bar.transferred(), 'time': elapsed, 'speed': bar.speed(), 'resumed': resumed}
@@ -0,0 +1,157 @@
+"""
+Project: PiracyTools
+File: lib_fanout.py
+Author: hyugogirubato
+Date: 2026.10.18
+"""
+
+import io
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import utils
+from module import lib_adv, lib_device, lib_frida, lib_shell
+
+""" Commands
+ptools fanout all frida status
+ptools fanout abi=arm64-v8a frida install server
+ptools fanout serial=SERIAL1,SERIAL2 adv pkg $NAME
+"""
+
+MAX_WORKERS = 8
+HELPS = [
+    {'command': 'all $MODULE $COMMAND', 'root': False, 'description': 'Run a command on every device'},
+    {'command': 'abi=$ABI[,...] $MODULE $COMMAND', 'root': False, 'description': 'Run a command on devices by architecture'},
+    {'command': 'serial=$NAME[,...] $MODULE $COMMAND', 'root': False, 'description': 'Run a command on devices by name'}
+]
+# interactive or blocking commands cannot run on several devices at once
+COMMANDS = {
+    'frida': ['status', 'install', 'uninstall', 'start', 'stop', 'pinning', 'run', 'capture', 'sessions', 'detach', 'help'],
+    'adv': ['pkg', 'apk', 'wifi', 'root', 'help']
+}
+# commands acting on the computer, not on the devices
+HOST_COMMANDS = [['frida', 'install', 'pip'], ['frida', 'uninstall', 'pip']]
+
+_ANSI = re.compile(r"\x1b\[[0-9;]*m")
+
+
+class _ThreadStdout:
+    # routes print() of worker threads to their own buffer, other threads keep the real stdout
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, data):
+        buffer = getattr(self.local, 'buffer', None)
+        return (self.stream if buffer is None else buffer).write(data)
+
+    def flush(self):
+        if getattr(self.local, 'buffer', None) is None:
+            self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def _match(device, target):
+    if target == 'all':
+        return True
+    if '=' not in target:
+        return False
+    key, values = target.split('=', 1)
+    if key not in ['serial', 'abi']:
+        return False
+    return device['name' if key == 'serial' else 'abi'] in values.split(',')
+
+
+class FanOut:
+
+    def __init__(self, root=False):
+        self.root = root
+
+    def _run(self, device, cmd, stdout):
+        stdout.local.buffer = io.StringIO()
+        result = {'device': device, 'status': 'ok', 'time': 0.0, 'output': ''}
+        start = time.time()
+        errors = utils.getErrors()
+        try:
+            root = self.root and lib_shell.get_session(device).check_root()
+            if self.root and not root:
+                utils.printError('Root access unavailable', exit=False)
+            elif cmd[1] == 'frida':
+                lib_frida.Frida(device, root=root).args(cmd)
+            else:
+                lib_adv.ADV(device, root=root).args(cmd)
+        except SystemExit as e:
+            result['status'] = 'failed'
+        except Exception as e:
+            result['status'] = 'error'
+            print(f"{type(e).__name__}: {e}")
+        finally:
+            result['time'] = time.time() - start
+            result['output'] = _ANSI.sub('', stdout.local.buffer.getvalue()).strip()
+            stdout.local.buffer = None
+        if result['status'] == 'ok' and utils.getErrors() > errors:
+            result['status'] = 'failed'
+        return result
+
+    def _print(self, results):
+        for result in results:
+            if result['output'] != '':
+                utils.printInfo(f"Output of {result['device']['name']}:")
+                print(result['output'])
+        print('{0:<20} {1:<14} {2:<8} {3:>9}  {4:<50}'.format('Name', 'Architecture', 'Status', 'Time', 'Result'))
+        for result in results:
+            lines = [l for l in result['output'].split('\n') if l != '']
+            errors = [l for l in lines if l.startswith('[ERROR]')]
+            summary = errors[0] if len(errors) > 0 else (lines[-1] if len(lines) > 0 else '')
+            print('{0:<20} {1:<14} {2:<8} {3:>8.2f}s  {4:<50}'.format(
+                result['device']['name'],
+                result['device']['abi'],
+                result['status'],
+                result['time'],
+                summary[:50]
+            ))
+        failed = len([r for r in results if r['status'] != 'ok'])
+        if failed == 0:
+            utils.printSuccess(f"Command completed on {len(results)} device(s)")
+        else:
+            utils.printError(f"Command failed on {failed}/{len(results)} device(s)", exit=False)
+
+    def args(self, cmd):
+        if len(cmd) == 3 and cmd[2] == 'help':
+            print('Available commands:')
+            print('{0:<36} {1:<14} {2:<40}'.format('Command', 'Permission', 'Description'))
+            for h in HELPS:
+                print('{0:<36} {1:<14} {2:<40}'.format(
+                    h['command'],
+                    'root' if h['root'] else 'shell',
+                    h['description']
+                ))
+        elif len(cmd) >= 5 and cmd[3] in COMMANDS:
+            if cmd[4] not in COMMANDS[cmd[3]]:
+                utils.printError(f"Command not available in fan-out mode: {cmd[3]} {cmd[4]}", exit=False)
+                return
+            if cmd[3:6] in HOST_COMMANDS:
+                utils.printError(f"Command runs on the computer, not in fan-out mode: ptools {' '.join(cmd[3:])}", exit=False)
+                return
+            devices = [d for d in lib_device.get_devices() if _match(d, cmd[2])]
+            if len(devices) == 0:
+                utils.printWarning('No device matches')
+                return
+
+            utils.printInfo(f"Running on {len(devices)} device(s): {' '.join(cmd[3:])}")
+            sub_cmd = ['ptools'] + cmd[3:]
+            stdout = _ThreadStdout(sys.stdout)
+            sys.stdout = stdout
+            try:
+                with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(devices))) as executor:
+                    results = list(executor.map(lambda d: self._run(d, sub_cmd, stdout), devices))
+            finally:
+                sys.stdout = stdout.stream
+            self._print(results)
+        else:
+            print(f"sh: {' '.join(cmd)}: Invalid command")
@@ -5,10 +5,13 @@ Author: hyugogirubato
 Date: 2022.12.18
 """
 
+import importlib
 import os
-import subprocess
+import sys
+import threading
 import time
 import utils
+from module import lib_artifact, lib_hooks, lib_instrument, lib_process, lib_push, lib_shell, lib_sink, lib_supervisor
 
 """ Commands
 ptools frida status
@@ -20,10 +23,20 @@ ptools frida start
 ptools frida stop
 ptools frida pinning $PACKAGE $VERSION
 ptools frida run $SCRIPT $PACKAGE
+ptools frida capture $SCRIPT $PACKAGE
+ptools frida attach $SCRIPT $PID|$NAME|$PACKAGE
+ptools frida sessions
+ptools frida detach $ID
 ptools frida create
+ptools frida create $SPEC
+ptools frida cache
+ptools frida cache clear
+ptools frida cache seed $VERSION $ABI
+ptools frida cache import $FILE $VERSION $ABI
 """
 
 PATH_SCRIPTS = os.path.join('module', 'frida_scripts')
+PATH_CAPTURES = os.path.join('tmp', 'captures')
 HELPS = [
     {'command': 'status', 'root': False, 'description': 'Show frida status'},
     {'command': 'install server|pip', 'root': True, 'description': 'Install frida server|pip'},
@@ -31,8 +44,62 @@ HELPS = [
     {'command': 'start|stop', 'root': True, 'description': 'Start|Stop frida service'},
     {'command': 'pinning $PACKAGE $VERSION', 'root': True, 'description': 'Bypass SSL pinning for an application'},
     {'command': 'run $SCRIPT $PACKAGE', 'root': True, 'description': 'Run a frida personal script'},
-    {'command': 'create', 'root': False, 'description': 'Native and classic function interception script creation'}
+    {'command': 'capture $SCRIPT $PACKAGE', 'root': True, 'description': 'Run a frida script, messages saved to files'},
+    {'command': 'attach $SCRIPT $PID|$NAME|$PACKAGE', 'root': True, 'description': 'Load a frida script in a running process'},
+    {'command': 'sessions', 'root': False, 'description': 'List background frida sessions'},
+    {'command': 'detach $ID|all', 'root': False, 'description': 'Detach a background frida session'},
+    {'command': 'create', 'root': False, 'description': 'Native and classic function interception script creation'},
+    {'command': 'create $SPEC', 'root': False, 'description': 'Single agent creation from a JSON hook list'},
+    {'command': 'cache [clear]', 'root': False, 'description': 'List|Clear frida server cache'},
+    {'command': 'cache seed $VERSION $ABI', 'root': False, 'description': 'Download frida server to cache (offline use)'},
+    {'command': 'cache import $FILE $VERSION $ABI', 'root': False, 'description': 'Add a frida server archive to cache'}
 ]
+# subcommands reading the device state before running (start, stop, install and uninstall invalidate it)
+CHECKS = ['status', 'start', 'stop', 'install', 'uninstall', 'pinning', 'run', 'capture', 'attach']
+# install|uninstall targets acting on the computer only, pip is checked without reading the device state
+HOST_TARGETS = ['pip']
+SNAPSHOT_TTL = 5
+# device abi (ro.product.cpu.abi) -> frida release architecture
+ARCHS = {'arm64-v8a': 'arm64', 'armeabi-v7a': 'arm', 'armeabi': 'arm', 'x86': 'x86', 'x86_64': 'x86_64'}
+
+_SNAPSHOTS = {}
+_SNAPSHOTS_LOCK = threading.Lock()
+_DOWNLOADS = {}
+_DOWNLOADS_LOCK = threading.Lock()
+
+
+def _getArch(abi):
+    return ARCHS.get(abi, abi.split('-')[0] if '-' in abi else abi)
+
+
+def _getServer(version, arch, store=None):
+    store = lib_artifact.ArtifactStore() if store is None else store
+    output = store.get('frida-server', version, arch)
+    if output is None:
+        with _DOWNLOADS_LOCK:
+            lock = _DOWNLOADS.setdefault((version, arch), threading.Lock())
+        # same abi devices (fanout) share one download to tmp/$FILE(.part), the others find it in the store
+        with lock:
+            output = store.get('frida-server', version, arch)
+            if output is None:
+                url = f"https://github.com/frida/frida/releases/download/{version}/frida-server-{version}-android-{arch}.xz"
+                file = f"frida-server-{version}-{arch}"
+                # decoded while downloading, then moved into the store
+                utils.downloadFile('tmp', file, url, decompress='xz')
+                output = store.put_file('frida-server', version, arch, os.path.join('tmp', file), source=url, mode=0o755)
+    with open(output, mode='rb') as f:
+        if f.read(4) != b'\x7fELF':
+            raise lib_artifact.ArtifactError(f'Invalid frida server binary: {output}')
+    return output
+
+
+def _getVersion(package):
+    # in-process lookup of the installed distribution, no pip subprocess
+    import importlib.metadata
+    try:
+        return importlib.metadata.version(package)
+    except importlib.metadata.PackageNotFoundError:
+        return None
 
 
 class Frida:
@@ -40,57 +107,96 @@ class Frida:
     def __init__(self, device, root=False):
         self.root = root
         self.device = device
+        self.session = lib_shell.get_session(device)
+        self.table = lib_process.get_table(device)
         self.releases = 'https://github.com/frida/frida/releases'
 
+    def _getSnapshot(self, refresh=False):
+        # frida processes (process table) + server presence, read in a single round trip and shared by all Frida instances
+        with _SNAPSHOTS_LOCK:
+            snapshot = _SNAPSHOTS.get(self.device['name'])
+        if refresh or snapshot is None or time.time() - snapshot['time'] > SNAPSHOT_TTL:
+            probes = self.table.refresh(probes={'server': "[ -f '/data/local/tmp/frida-server' ]"})
+            snapshot = {'server': probes['server']['code'] == 0, 'time': time.time()}
+            with _SNAPSHOTS_LOCK:
+                _SNAPSHOTS[self.device['name']] = snapshot
+        return dict(snapshot, pid=self.table.match('frida'))
+
+    def _invalidate(self):
+        with _SNAPSHOTS_LOCK:
+            _SNAPSHOTS.pop(self.device['name'], None)
+        self.table.invalidate()
+
     def _getStatus(self):
-        pid = []
-        r = subprocess.getoutput(f"adb -s {self.device['name']} shell \"ps -A | grep frida\"").strip()
-        if r != '':
-            for r in r.split('\n'):
-                p = ['NONE'] * 3
-                items = r.split(' ')
-                p[0] = items[0]
-                p[2] = items[-1]
-                for item in items[1:-1]:
-                    if item != '':
-                        p[1] = item
-                        break
-                pid.append({'user': p[0], 'pid': p[1], 'name': p[2]})
-        return pid
+        return self._getSnapshot()['pid']
+
+    def _ready(self, pid):
+        # the server must be running and answering before a script is loaded (slow devices, right after start)
+        if len(pid) == 0:
+            utils.printError('Frida is not running', exit=False)
+        elif not lib_supervisor.get_supervisor(self.device).ensure():
+            utils.printError('Frida is not responding', exit=False)
+        else:
+            return True
+        return False
 
     def _getFrida(self, mode=None):
         result = True
         if mode is None or mode == 'server':
-            result = 'frida-server' in subprocess.getoutput(f"adb -s {self.device['name']} shell \"cd '/data/local/tmp/'; ls -la\"").strip()
+            result = self._getSnapshot()['server']
         if mode is None or mode == 'pip':
-            tmp = subprocess.getoutput("pip list").strip()
-            tmp = 'frida-tools' in tmp and 'python-xz' in tmp
+            tmp = _getVersion('frida-tools') is not None and _getVersion('frida') is not None
             result = result or tmp if mode is None else tmp
         return result
 
-    def args(self, cmd):
-        pid = self._getStatus()
-        tmp_server = self._getFrida(mode='server')
-        tmp_pip = self._getFrida(mode='pip')
+    def _spawn(self, scripts, packages, capture=False):
+        # packages are spawned concurrently, sessions stay in background until detached
+        jobs = []
+        for p in packages:
+            sink = lib_sink.MessageSink(os.path.join(PATH_CAPTURES, f"{int(time.time())}_{self.device['name']}_{p}")) if capture else None
+            jobs.append((self.device['name'], p, scripts, sink))
+        for job, r in lib_instrument.get_manager().spawn_many(jobs):
+            if isinstance(r, lib_instrument.InstrumentError):
+                if job[3] is not None:
+                    job[3].close()
+                utils.printError(r, exit=False)
+            else:
+                utils.printSuccess(f"Session {r} started: {job[1]}")
+                if job[3] is not None:
+                    utils.printInfo(f"Capture saved at: {job[3].path}")
 
-        if not cmd[2] in ['install', 'uninstall'] and (not tmp_server or not tmp_pip):
+    def args(self, cmd):
+        if cmd[2] in ['install', 'uninstall'] and len(cmd) == 4 and cmd[3] in HOST_TARGETS:
+            pid = []
+            tmp_server = True
+            tmp_pip = self._getFrida(mode='pip')
+        elif cmd[2] in CHECKS:
+            pid = self._getStatus()
+            tmp_server = self._getFrida(mode='server')
+            tmp_pip = self._getFrida(mode='pip')
+        else:
+            pid = []
+            tmp_server = tmp_pip = True
+        if not cmd[2] in ['install', 'uninstall', 'cache'] and (not tmp_server or not tmp_pip):
             if not tmp_server:
                 utils.printError('Frida (server) is not installed', exit=False)
             if not tmp_pip:
                 utils.printError('Frida (pip) is not installed', exit=False)
-        elif cmd[2] in ['start', 'stop', 'install', 'uninstall', 'pinning', 'run']:  # require root auth
+        elif cmd[2] in ['start', 'stop', 'install', 'uninstall', 'pinning', 'run', 'capture', 'attach']:  # require root auth
             if self.root:
                 if len(cmd) == 3 and cmd[2] == 'stop':
                     if len(pid) == 0:
                         utils.printWarning('Frida is not running')
                     else:
-                        for p in pid:
-                            subprocess.getoutput(f"adb -s {self.device['name']} shell su -c \\\"kill -9 {p['pid']}\\\"")
+                        # not restarted by the supervisor
+                        supervisor = lib_supervisor.get_supervisor(self.device, create=False)
+                        if supervisor is not None:
+                            supervisor.unwatch()
+                        self.table.kill([p['pid'] for p in pid], root=True)
+                        self._invalidate()
                         utils.printSuccess('Frida stopped') if len(self._getStatus()) == 0 else utils.printError('Frida failed to stop', exit=False)
                 elif (len(cmd) == 4 or len(cmd) == 5) and cmd[2] == 'pinning':
-                    if len(pid) == 0:
-                        utils.printError('Frida is not running', exit=False)
-                    else:
+                    if self._ready(pid):
                         version = None
                         if len(cmd) == 5:
                             if not cmd[4] in ['1', '2']:
@@ -100,62 +206,75 @@ class Frida:
                         else:
                             version = '1'
                         if not version is None:
-                            utils.printSuccess('Bypass SSL pining started')
-                            os.system(f"frida -D \"{self.device['name']}\" -l \"{os.path.join(PATH_SCRIPTS, f'pinning_v{version}.js')}\" -f \"{cmd[3]}\"")
-                            utils.printSuccess('Bypass SSL pining stopped')
-                elif len(cmd) == 5 and cmd[2] == 'run':
-                    if os.path.exists(cmd[3]):
-                        os.system(f"frida -D \"{self.device['name']}\" -l \"{cmd[3]}\" -f \"{cmd[4]}\"")
-                    else:
-                        utils.printError('Frida script not found', exit=False)
+                            self._spawn([os.path.join(PATH_SCRIPTS, f'pinning_v{version}.js')], cmd[3].split(','))
+                elif len(cmd) == 5 and cmd[2] in ['run', 'capture']:
+                    if self._ready(pid):
+                        if all(os.path.exists(s) for s in cmd[3].split(',')):
+                            self._spawn(cmd[3].split(','), cmd[4].split(','), capture=cmd[2] == 'capture')
+                        else:
+                            utils.printError('Frida script not found', exit=False)
+                elif len(cmd) == 5 and cmd[2] == 'attach':
+                    if self._ready(pid):
+                        target = self.table.resolve(cmd[4])
+                        if not all(os.path.exists(s) for s in cmd[3].split(',')):
+                            utils.printError('Frida script not found', exit=False)
+                        elif target is None:
+                            utils.printError(f'Process not found: {cmd[4]}', exit=False)
+                        else:
+                            try:
+                                id = lib_instrument.get_manager().attach(self.device['name'], target, cmd[3].split(','))
+                                utils.printSuccess(f"Session {id} attached: {cmd[4]} ({target})")
+                            except lib_instrument.InstrumentError as e:
+                                utils.printError(e, exit=False)
                 elif cmd[2] in ['start', 'install', 'uninstall']:
                     if len(pid) == 0:
                         if len(cmd) == 3 and cmd[2] == 'start':
-                            subprocess.getoutput(f"adb -s {self.device['name']} shell su -c \\\"setsid ./data/local/tmp/frida-server &>/dev/null &\\\"")
-                            utils.printError('Frida failed to start', exit=False) if len(self._getStatus()) == 0 else utils.printSuccess('Frida started')
+                            ready = lib_supervisor.get_supervisor(self.device).start()
+                            self._invalidate()
+                            if ready is not None:
+                                utils.printSuccess(f"Frida started (ready in {ready:.2f}s)")
+                            elif len(self._getStatus()) == 0:
+                                utils.printError('Frida failed to start', exit=False)
+                            else:
+                                utils.printError(f"Frida started but not responding after {lib_supervisor.READY_TIMEOUT}s", exit=False)
                         elif len(cmd) == 4 and cmd[2] == 'install':
                             if cmd[3] == 'pip':
-                                if not self._getFrida(mode='pip'):
-                                    os.system("pip install frida-tools")
-                                    os.system("pip install python-xz")
+                                if not tmp_pip:
+                                    os.system(f'"{sys.executable}" -m pip install frida-tools')
+                                    importlib.invalidate_caches()
                                     utils.printSuccess('Frida (pip) is installed') if self._getFrida(mode='pip') else utils.printError('Frida (pip) is not installed', exit=False)
                                 else:
                                     utils.printWarning('Frida (pip) is already installed')
                             elif cmd[3] == 'server':
-                                if not self._getFrida(mode='server'):
-                                    if not self._getFrida(mode='pip'):
-                                        utils.printWarning('Frida (pip) must be installed')
-                                    else:
-                                        output = os.path.join('tmp', 'frida-server')
-                                        arch = self.device['abi'].split('-')[0] if '-' in self.device['abi'] else self.device['abi']
-                                        version = subprocess.getoutput("frida --version").strip()
-                                        url = f"https://github.com/frida/frida/releases/download/{version}/frida-server-{version}-android-{arch}.xz"
-                                        file = f"frida-server-{version}-{arch}.xz"
-                                        if not os.path.exists(os.path.join('tmp', file)):
-                                            utils.downloadFile('tmp', file, url)
-                                        utils.extactFile(os.path.join('tmp', file), output, clear=False)
-                                        if not os.path.exists(output):
-                                            utils.printError('The required file does not exist', exit=True)
-
-                                        os.system(f"adb -s {self.device['name']} push \"{output}\" \"/data/local/tmp/frida-server\"")
-                                        subprocess.getoutput(f"adb -s {self.device['name']} shell su -c \\\"chmod 755 '/data/local/tmp/frida-server'\\\"")
-                                    utils.printSuccess('Frida (server) is installed') if self._getFrida(mode='server') else utils.printError('Frida (server) is not installed', exit=False)
+                                if not tmp_pip:
+                                    utils.printWarning('Frida (pip) must be installed')
                                 else:
-                                    utils.printWarning('Frida (server) is already installed')
+                                    version = _getVersion('frida')
+                                    try:
+                                        output = _getServer(version, _getArch(self.device['abi']))
+                                        r = lib_push.push(self.device, output, '/data/local/tmp/frida-server', mode=0o755, root=True)
+                                        self._invalidate()
+                                    except (lib_artifact.ArtifactError, lib_push.PushError) as e:
+                                        utils.printError(e, exit=False)
+                                    else:
+                                        if r['status'] == 'skipped':
+                                            utils.printWarning(f'Frida (server) {version} is already installed')
+                                        else:
+                                            utils.printSuccess(f"Frida (server) {version} is installed ({r['size'] / 1048576:.1f} MB in {r['time']:.1f}s)")
                             else:
                                 utils.printError('Frida module invalid', exit=False)
                         elif len(cmd) == 4 and cmd[2] == 'uninstall':
                             if cmd[3] == 'pip':
-                                if self._getFrida(mode='pip'):
-                                    os.system("pip uninstall frida-tools")
-                                    os.system("pip uninstall python-xz")
+                                if tmp_pip:
+                                    os.system(f'"{sys.executable}" -m pip uninstall frida-tools')
+                                    importlib.invalidate_caches()
                                     utils.printSuccess('Frida (pip) is uninstalled') if not self._getFrida(mode='pip') else utils.printError('Frida (pip) is not uninstalled', exit=False)
                                 else:
                                     utils.printWarning('Frida (pip) is not installed')
                             elif cmd[3] == 'server':
-                                if self._getFrida(mode='server'):
-                                    subprocess.getoutput(f"adb -s {self.device['name']} shell su -c \\\"rm '/data/local/tmp/frida-server'\\\"")
-                                    subprocess.getoutput(f"adb -s {self.device['name']} shell su -c \\\"rm -r '/data/local/tmp/re.frida.server'\\\"")
+                                if tmp_server:
+                                    self.session.run("rm '/data/local/tmp/frida-server'; rm -r '/data/local/tmp/re.frida.server'", root=True)
+                                    self._invalidate()
                                     utils.printSuccess('Frida (server) is uninstalled') if not self._getFrida(mode='server') else utils.printError('Frida (server) is not uninstalled', exit=False)
                                 else:
                                     utils.printWarning('Frida (server) is not installed')
@@ -175,19 +294,32 @@ class Frida:
                     utils.printInfo('Frida process running:')
                     print('{0:<10} {1:<10} {2:<30}'.format('User', 'PID', 'Name'))
                     for p in pid:
-                        print('{0:<10} {1:<10} {2:<30}'.format(p['user'], p['pid'], p['name']))
+                        print('{0:<10} {1:<10} {2:<30}'.format(p['user'] or 'NONE', p['pid'], p['name']))
+                    supervisor = lib_supervisor.get_supervisor(self.device, create=False)
+                    if supervisor is not None and supervisor.started is not None:
+                        status = supervisor.status()
+                        print('')
+                        utils.printInfo('Frida supervisor:')
+                        print('{0:<10} {1:<10} {2:<10} {3:<10} {4:<20}'.format('Port', 'Ready', 'Restarts', 'Watched', 'Last check'))
+                        print('{0:<10} {1:<10} {2:<10} {3:<10} {4:<20}'.format(
+                            status['port'] or '',
+                            'no' if status['ready'] is None else f"{status['ready']:.2f}s",
+                            status['restarts'],
+                            'yes' if status['watched'] else 'no',
+                            '' if status['checked'] is None else f"{int(time.time() - status['checked'])}s ago ({'ok' if status['healthy'] else 'failed'})"
+                        ))
             elif len(cmd) == 3 and cmd[2] == 'create':
                 is_native = utils.getInput('Native library?', default='no', type='boolean')
                 if is_native:
-                    content = utils.getFileContent(os.path.join(PATH_SCRIPTS, 'native_function.js')).decode('utf-8')
                     nv_lib_name = utils.getInput('Library name?', default='Crypto', type='str')
                     nv_lib_module = utils.getInput('Module name?', default='Hash', type='str')
                     nv_lib_count = utils.getInput('Arguments count?', default=2, type='int')
-                    content = content.replace('{NATIVE_LIBRARY_NAME}', nv_lib_name)
-                    content = content.replace('{NATIVE_MODULE_NAME}', nv_lib_module)
-                    content = content.replace('{NATIVE_ARGS_COUNT}', str(nv_lib_count))
+                    content = lib_hooks.get_template('native_function.js').render(
+                        NATIVE_LIBRARY_NAME=nv_lib_name,
+                        NATIVE_MODULE_NAME=nv_lib_module,
+                        NATIVE_ARGS_COUNT=nv_lib_count
+                    )
                 else:
-                    content = utils.getFileContent(os.path.join(PATH_SCRIPTS, 'function.js')).decode('utf-8')
                     fc_class_name = utils.getInput('Class name?', default='MainActivity', type='str')
                     fc_name = utils.getInput('Function name?', default='Display', type='str')
                     fc_args_count = utils.getInput('Arguments count?', default=2, type='int')
@@ -195,41 +327,100 @@ class Frida:
                     fc_types = []
                     for i in range(fc_args_count):
                         fc_type = utils.getInput(f"Argument {i} type?", default='java.lang.String', type='str')
-                        if fc_type.lower() in ['str', 'string']:
-                            fc_type = '"java.lang.String"'
-                        elif fc_type.lower() in ['integer']:
-                            fc_type = '"java.lang.Integer"'
-                        elif fc_type.lower() in ['bool', 'boolean']:
-                            fc_type = '"java.lang.Boolean"'
-                        elif fc_type.lower() in ['byte']:
-                            fc_type = '"java.lang.Byte"'
-                        elif fc_type.lower() in ['double']:
-                            fc_type = '"java.lang.Double"'
-                        elif fc_type.lower() in ['float']:
-                            fc_type = '"java.lang.Float"'
-                        elif fc_type.lower() in ['long']:
-                            fc_type = '"long"'
-                        else:
-                            fc_type = f'"{fc_type}"'
-                        fc_types.append(fc_type)
+                        fc_types.append(f'"{lib_hooks.java_type(fc_type)}"')
                         fc_args.append(f"arg{i}")
-
-                    content = content.replace('{FUNCTION_CLASS_NAME}', fc_class_name)
-                    content = content.replace('{FUNCTION_NAME}', fc_name)
-                    content = content.replace('{FUNCTION_ARGS_TYPE}', ', '.join(fc_types))
-                    content = content.replace('{FUNCTION_ARGS}', ', '.join(fc_args))
                     result = []
                     for i in range(fc_args_count):
                         result.append(f"                    console.log(`  --> arg{i}:  $" + "{" + f"arg{i}" + "}`);")
-                    content = content.replace('{FUNCTION_CONSOLE_ARGS}', '\n'.join(result))
+                    content = lib_hooks.get_template('function.js').render(
+                        FUNCTION_CLASS_NAME=fc_class_name,
+                        FUNCTION_NAME=fc_name,
+                        FUNCTION_ARGS_TYPE=', '.join(fc_types),
+                        FUNCTION_ARGS=', '.join(fc_args),
+                        FUNCTION_CONSOLE_ARGS='\n'.join(result)
+                    )
                 file = f"{int(time.time())}_frida_{'native_function' if is_native else 'function'}.js"
                 utils.saveFile('tmp', file, content.encode('utf-8'))
                 utils.printInfo(f"File saved at: {os.path.join('tmp', file)}")
+            elif len(cmd) == 4 and cmd[2] == 'create':
+                try:
+                    hooks = lib_hooks.load_spec(cmd[3])
+                    content = lib_hooks.render_agent(hooks)
+                except lib_hooks.HookError as e:
+                    utils.printError(e, exit=False)
+                else:
+                    file = f"{int(time.time())}_frida_agent.js"
+                    utils.saveFile('tmp', file, content.encode('utf-8'))
+                    utils.printSuccess(f"Agent created: {len(hooks['java'])} java, {len(hooks['native'])} native hooks ({hooks['duplicates']} duplicates removed)")
+                    utils.printInfo(f"File saved at: {os.path.join('tmp', file)}")
+            elif len(cmd) == 3 and cmd[2] == 'sessions':
+                sessions = [s for s in lib_instrument.get_manager().get_sessions() if s['device'] == self.device['name']]
+                if len(sessions) == 0:
+                    utils.printWarning('No frida session')
+                else:
+                    print('{0:<6} {1:<10} {2:<40} {3:<10} {4:<20} {5:<40}'.format('ID', 'PID', 'Target', 'Uptime', 'Status', 'Capture'))
+                    for s in sessions:
+                        capture = ''
+                        if s['sink'] is not None:
+                            stats = s['sink'].stats()
+                            capture = f"{stats['received']} msg, {stats['rate']:.0f}/s, {stats['dropped']} dropped, {stats['lag'] * 1000:.0f} ms lag"
+                        print('{0:<6} {1:<10} {2:<40} {3:<10} {4:<20} {5:<40}'.format(
+                            s['id'],
+                            s['pid'],
+                            s['target'],
+                            f"{int(time.time() - s['started'])}s",
+                            s['status'],
+                            capture
+                        ))
+            elif len(cmd) == 4 and cmd[2] == 'detach':
+                manager = lib_instrument.get_manager()
+                ids = [s['id'] for s in manager.get_sessions() if s['device'] == self.device['name']] if cmd[3] == 'all' else [int(cmd[3])] if cmd[3].isdigit() else []
+                for id in ids:
+                    utils.printSuccess(f"Session {id} detached") if manager.detach(id) else utils.printError(f"Session not found: {id}", exit=False)
+                if len(ids) == 0:
+                    utils.printWarning('No frida session') if cmd[3] == 'all' else utils.printError(f"Session not found: {cmd[3]}", exit=False)
+            elif len(cmd) in [3, 4] and cmd[2] == 'cache':
+                store = lib_artifact.ArtifactStore()
+                if len(cmd) == 4 and cmd[3] == 'clear':
+                    store.clear()
+                    utils.printSuccess('Frida (server) cache cleared')
+                elif len(cmd) == 3:
+                    entries = store.entries()
+                    if len(entries) == 0:
+                        utils.printWarning('Frida (server) cache is empty')
+                    else:
+                        utils.printInfo('Frida (server) cache:')
+                        print('{0:<34} {1:<10} {2:<20} {3:<64}'.format('Artifact', 'Size', 'Last use', 'SHA256'))
+                        for key, entry in sorted(entries.items()):
+                            print('{0:<34} {1:<10} {2:<20} {3:<64}'.format(
+                                key,
+                                entry['size'],
+                                time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(entry['access'])),
+                                entry['sha256']
+                            ))
+                else:
+                    print(f"sh: {' '.join(cmd)}: Invalid command")
+            elif len(cmd) == 6 and cmd[2] == 'cache' and cmd[3] == 'seed':
+                store = lib_artifact.ArtifactStore()
+                for abi in cmd[5].split(','):
+                    try:
+                        utils.printSuccess(f"Frida (server) cached: {_getServer(cmd[4], _getArch(abi), store=store)}")
+                    except lib_artifact.ArtifactError as e:
+                        utils.printError(e, exit=False)
+            elif len(cmd) == 7 and cmd[2] == 'cache' and cmd[3] == 'import':
+                if os.path.exists(cmd[4]):
+                    try:
+                        output = lib_artifact.ArtifactStore().put('frida-server', cmd[5], _getArch(cmd[6]), cmd[4], compressed=cmd[4].endswith('.xz'), mode=0o755)
+                        utils.printSuccess(f"Frida (server) cached: {output}")
+                    except lib_artifact.ArtifactError as e:
+                        utils.printError(e, exit=False)
+                else:
+                    utils.printError('Input file not found', exit=False)
             elif len(cmd) == 3 and cmd[2] == 'help':
                 print('Available commands:')
-                print('{0:<26} {1:<14} {2:<40}'.format('Command', 'Permission', 'Description'))
+                print('{0:<34} {1:<14} {2:<40}'.format('Command', 'Permission', 'Description'))
                 for h in HELPS:
-                    print('{0:<26} {1:<14} {2:<40}'.format(
+                    print('{0:<34} {1:<14} {2:<40}'.format(
                         h['command'],
                         'root' if h['root'] else 'shell',
                         h['description']
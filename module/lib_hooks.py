@@ -0,0 +1,137 @@
+"""
+Project: PiracyTools
+File: lib_hooks.py
+Author: hyugogirubato
+Date: 2026.10.18
+"""
+
+import json
+import os
+import re
+import threading
+
+""" Spec
+{
+    "output": "console",
+    "java": [{"class": "MainActivity", "function": "Display", "args": ["String", "int"]}],
+    "native": [{"library": "Crypto", "module": "Hash", "args": 2}]
+}
+Java "args" is optional (all overloads are hooked without it), native "args" defaults to 2.
+"output": "send" batches the hook events to the host (ptools frida capture, byte[] arguments as binary).
+"output": "trace" keeps counters, latency histograms (log2 microseconds) and sampled arguments in the agent,
+sent every "interval" ms: host traffic grows with the number of hooks, not with the number of calls.
+Options: "trace": {"interval": 1000, "every": 1, "reservoir": 8}, arguments of every Nth call are sampled
+(reservoir sampling, at most "reservoir" per hook and interval, 0 to disable).
+Hooks are deduplicated and rendered into a single agent (agent.js): one script to load whatever the number of hooks.
+Templates are parsed once per process into literal/placeholder parts.
+"""
+
+PATH_SCRIPTS = os.path.join('module', 'frida_scripts')
+# short names accepted in specs and by the interactive create -> java type
+TYPES = {
+    'str': 'java.lang.String',
+    'string': 'java.lang.String',
+    'integer': 'java.lang.Integer',
+    'bool': 'java.lang.Boolean',
+    'boolean': 'java.lang.Boolean',
+    'byte': 'java.lang.Byte',
+    'double': 'java.lang.Double',
+    'float': 'java.lang.Float',
+    'long': 'long'
+}
+NATIVE_ARGS = 2
+OUTPUTS = ['console', 'send', 'trace']
+TRACE = {'interval': 1000, 'every': 1, 'reservoir': 8}
+
+_TEMPLATES = {}
+_TEMPLATES_LOCK = threading.Lock()
+
+
+class HookError(Exception):
+    pass
+
+
+class Template:
+
+    def __init__(self, content):
+        # even indexes are literals, odd indexes are placeholder names ({NAME})
+        self.parts = re.split(r'\{([A-Z][A-Z0-9_]*)\}', content)
+        self.names = set(self.parts[1::2])
+
+    def render(self, **values):
+        missing = self.names - set(values)
+        if len(missing) > 0:
+            raise HookError(f"Missing template values: {', '.join(sorted(missing))}")
+        return ''.join(str(values[p]) if i % 2 else p for i, p in enumerate(self.parts))
+
+
+def get_template(name):
+    with _TEMPLATES_LOCK:
+        if name not in _TEMPLATES:
+            with open(os.path.join(PATH_SCRIPTS, name), mode='r', encoding='utf-8') as f:
+                _TEMPLATES[name] = Template(f.read())
+        return _TEMPLATES[name]
+
+
+def java_type(value):
+    return TYPES.get(value.lower(), value)
+
+
+def _java(hook):
+    if not isinstance(hook.get('class'), str) or not isinstance(hook.get('function'), str):
+        raise HookError(f'Invalid java hook (class and function required): {hook}')
+    args = hook.get('args')
+    if args is not None:
+        if not isinstance(args, list):
+            raise HookError(f'Invalid java hook args (list of types expected): {hook}')
+        args = [java_type(str(a)) for a in args]
+    return {'class': hook['class'], 'function': hook['function'], 'args': args}
+
+
+def _native(hook):
+    if not isinstance(hook.get('library'), str) or not isinstance(hook.get('module'), str):
+        raise HookError(f'Invalid native hook (library and module required): {hook}')
+    args = hook.get('args', NATIVE_ARGS)
+    if not isinstance(args, int) or args < 0:
+        raise HookError(f'Invalid native hook args (count expected): {hook}')
+    return {'library': hook['library'], 'module': hook['module'], 'args': args}
+
+
+def load_spec(path):
+    # returns {'output', 'trace', 'java': [...], 'native': [...], 'duplicates'}, duplicates removed (first occurrence kept)
+    try:
+        with open(path, mode='r', encoding='utf-8') as f:
+            spec = json.load(f)
+    except OSError as e:
+        raise HookError(f'Unable to read spec: {e}')
+    except ValueError as e:
+        raise HookError(f'Invalid spec: {e}')
+    if not isinstance(spec, dict):
+        raise HookError('Invalid spec: object with "java" and/or "native" lists expected')
+
+    if spec.get('output', 'console') not in OUTPUTS:
+        raise HookError(f"Invalid spec: \"output\" must be one of {', '.join(OUTPUTS)}")
+    trace = spec.get('trace', {})
+    if not isinstance(trace, dict) or any(k not in TRACE or not isinstance(v, int) or v < 0 for k, v in trace.items()):
+        raise HookError(f"Invalid spec: \"trace\" options are {', '.join(f'{k} (int)' for k in TRACE)}")
+    trace = {**TRACE, **trace}
+    if trace['interval'] == 0 or trace['every'] == 0:
+        raise HookError('Invalid spec: trace interval and every must be positive')
+    hooks = {'output': spec.get('output', 'console'), 'trace': trace, 'java': [], 'native': []}
+    for kind, normalize in [('java', _java), ('native', _native)]:
+        items = spec.get(kind, [])
+        if not isinstance(items, list):
+            raise HookError(f'Invalid spec: "{kind}" must be a list')
+        seen = set()
+        for item in items:
+            hook = normalize(item if isinstance(item, dict) else {})
+            key = json.dumps(hook, sort_keys=True)
+            if key not in seen:
+                seen.add(key)
+                hooks[kind].append(hook)
+    hooks['duplicates'] = sum(len(spec.get(k, [])) for k in ['java', 'native']) - len(hooks['java']) - len(hooks['native'])
+    return hooks
+
+
+def render_agent(hooks):
+    return get_template('agent.js').render(HOOKS=json.dumps({'output': hooks['output'], 'trace': hooks['trace'], 'java': hooks['java'], 'native': hooks['native']}, indent=4))
@@ -0,0 +1,291 @@
+"""
+Project: PiracyTools
+File: lib_instrument.py
+Author: hyugogirubato
+Date: 2026.10.18
+"""
+
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import utils
+
+""" Sessions
+Frida sessions are opened with the frida Python bindings (imported on first use) and kept in the background of the REPL.
+Scripts are compiled once per content hash and frida version (memory + tmp/scripts) and loaded from bytecode,
+so the same script attached to many processes or devices is only compiled once.
+"""
+
+PATH_COMPILED = os.path.join('tmp', 'scripts')
+MAX_WORKERS = 8
+TIMEOUT = 5
+# detach reasons of a lost transport, the process may still be running
+RESUMABLE = ['connection-terminated', 'device-lost']
+# frida errors have no common base class
+ERRORS = [
+    'ServerNotRunningError', 'ExecutableNotFoundError', 'ExecutableNotSupportedError', 'ProcessNotFoundError', 'ProcessNotRespondingError',
+    'InvalidArgumentError', 'InvalidOperationError', 'PermissionDeniedError', 'AddressInUseError', 'TimedOutError', 'NotSupportedError',
+    'ProtocolError', 'TransportError'
+]
+
+_MANAGER = None
+_MANAGER_LOCK = threading.Lock()
+
+
+class InstrumentError(Exception):
+    pass
+
+
+def _frida():
+    try:
+        import frida
+    except ImportError:
+        raise InstrumentError('Frida (pip) is not installed')
+    return frida
+
+
+def _errors(frida):
+    return tuple(getattr(frida, e) for e in ERRORS if hasattr(frida, e))
+
+
+class ScriptCache:
+
+    def __init__(self, path=PATH_COMPILED):
+        self.path = path
+        self._compiled = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _file(self, key):
+        return os.path.join(self.path, f"{key}.qjs")
+
+    def load(self, session, source, name=None):
+        # returns a loaded script, compiling the source only if its hash was never seen by this frida version
+        frida = _frida()
+        key = f"{hashlib.sha256(source.encode('utf-8')).hexdigest()}-{frida.__version__}"
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            # concurrent loads of the same source wait for a single compilation
+            data = self._compiled.get(key)
+            if data is None and os.path.exists(self._file(key)):
+                with open(self._file(key), mode='rb') as f:
+                    data = f.read()
+            if data is None and hasattr(session, 'compile_script'):
+                try:
+                    data = session.compile_script(source, name=name)
+                    os.makedirs(self.path, exist_ok=True)
+                    tmp = f"{self._file(key)}.{os.getpid()}"
+                    with open(tmp, mode='wb') as f:
+                        f.write(data)
+                    os.replace(tmp, self._file(key))
+                except (frida.InvalidArgumentError, frida.NotSupportedError, OSError):
+                    data = None
+            if data is not None:
+                self._compiled[key] = data
+        if data is not None:
+            script = session.create_script_from_bytes(data)
+        else:
+            script = session.create_script(source, name=name)
+        return script
+
+
+class SessionManager:
+
+    def __init__(self):
+        self.scripts = ScriptCache()
+        self.sessions = {}
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def _device(self, serial):
+        frida = _frida()
+        try:
+            if serial == 'local':
+                return frida.get_local_device()
+            return frida.get_device(serial, timeout=TIMEOUT)
+        except (frida.InvalidArgumentError, frida.TimedOutError) as e:
+            raise InstrumentError(f'Frida device unavailable: {serial} ({e})')
+
+    def _register(self, serial, target, pid, session, scripts, paths, sink=None, id=None):
+        # with a sink (lib_sink.MessageSink), messages and logs are captured to files instead of printed
+        with self._lock:
+            if id is None:
+                self._count += 1
+                id = self._count
+            self.sessions[id] = {
+                'id': id, 'device': serial, 'target': target, 'pid': pid, 'session': session, 'scripts': scripts, 'paths': paths,
+                'sink': sink, 'started': time.time(), 'status': 'attached', 'reason': None
+            }
+
+        def on_detached(reason, *args):
+            with self._lock:
+                if id in self.sessions and self.sessions[id]['session'] is session:
+                    self.sessions[id]['status'] = f"detached ({reason})"
+                    self.sessions[id]['reason'] = str(reason)
+            utils.printWarning(f"Session {id} ({target}) detached: {reason}")
+
+        def on_log(level, text):
+            print(f"[{id}:{target}] {text}")
+
+        def on_default(message, data):
+            payload = message.get('payload')
+            if message.get('type') == 'error':
+                utils.printError(f"[{id}:{target}] {message.get('description')}", exit=False)
+            elif isinstance(payload, dict) and isinstance(payload.get('trace'), list):
+                # agent trace summary (lib_hooks "output": "trace"), one line per hook
+                for t in payload['trace']:
+                    print(f"[{id}:{target}] {t['hook']}: {t['count']} calls, avg {t['time'] / max(t['count'], 1):.0f} us, max {t['max']} us")
+            else:
+                print(f"[{id}:{target}] {message.get('payload')}")
+
+        session.on('detached', on_detached)
+        for script in scripts:
+            script.set_log_handler(on_log if sink is None else sink.log)
+            script.on('message', on_default if sink is None else sink.handle)
+        return id
+
+    def _load(self, session, scripts):
+        loaded = []
+        for path in scripts:
+            with open(path, mode='r', encoding='utf-8') as f:
+                script = self.scripts.load(session, f.read(), name=os.path.splitext(os.path.basename(path))[0])
+            loaded.append(script)
+        return loaded
+
+    def _discard(self, id, session):
+        # failed spawn or attach: the session is dropped without closing the caller's sink
+        with self._lock:
+            self.sessions.pop(id, None)
+        if session is not None:
+            try:
+                session.detach()
+            except _errors(_frida()):
+                pass
+
+    def spawn(self, serial, package, scripts, sink=None):
+        # spawns the package suspended, loads every script, then resumes it; returns the session id
+        frida = _frida()
+        device = self._device(serial)
+        pid = session = id = None
+        try:
+            pid = device.spawn([package])
+            session = device.attach(pid)
+            loaded = self._load(session, scripts)
+            id = self._register(serial, package, pid, session, loaded, scripts, sink=sink)
+            for script in loaded:
+                script.load()
+            device.resume(pid)
+        except _errors(frida) + (OSError,) as e:
+            self._discard(id, session)
+            if pid is not None:
+                # never leave the application suspended
+                try:
+                    device.kill(pid)
+                except _errors(frida):
+                    pass
+            raise InstrumentError(f'Unable to spawn {package}: {e}')
+        return id
+
+    def attach(self, serial, target, scripts, sink=None):
+        # target is a pid or a process name
+        frida = _frida()
+        device = self._device(serial)
+        session = id = None
+        try:
+            pid = int(target) if str(target).isdigit() else device.get_process(target).pid
+            session = device.attach(pid)
+            loaded = self._load(session, scripts)
+            id = self._register(serial, str(target), pid, session, loaded, scripts, sink=sink)
+            for script in loaded:
+                script.load()
+        except _errors(frida) + (OSError,) as e:
+            self._discard(id, session)
+            raise InstrumentError(f'Unable to attach {target}: {e}')
+        return id
+
+    def spawn_many(self, jobs):
+        # jobs: [(serial, package, scripts[, sink])], spawned concurrently; returns [(job, id or error)]
+        def run(job):
+            try:
+                return job, self.spawn(*job)
+            except InstrumentError as e:
+                return job, e
+
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, max(1, len(jobs)))) as executor:
+            return list(executor.map(run, jobs))
+
+    def resume(self, serial):
+        # re-attaches the sessions detached by a lost transport (same id, scripts and sink); returns [(id, error or None)]
+        with self._lock:
+            entries = [dict(s) for s in self.sessions.values() if s['device'] == serial and s['reason'] in RESUMABLE]
+        if len(entries) == 0:
+            return []
+        frida = _frida()
+        results = []
+        for entry in entries:
+            try:
+                device = self._device(serial)
+                try:
+                    pid = entry['pid']
+                    session = device.attach(pid)
+                except frida.ProcessNotFoundError:
+                    # restarted while the device was away: main process of the package
+                    apps = [a for a in device.enumerate_applications() if a.identifier == entry['target'] and a.pid != 0]
+                    if len(apps) == 0:
+                        raise InstrumentError(f"Unable to resume {entry['target']}: process not running")
+                    pid = apps[0].pid
+                    session = device.attach(pid)
+                loaded = self._load(session, entry['paths'])
+                self._register(serial, entry['target'], pid, session, loaded, entry['paths'], sink=entry['sink'], id=entry['id'])
+                for script in loaded:
+                    script.load()
+                results.append((entry['id'], None))
+            except InstrumentError as e:
+                results.append((entry['id'], e))
+            except _errors(frida) + (OSError,) as e:
+                results.append((entry['id'], InstrumentError(f"Unable to resume {entry['target']}: {e}")))
+        return results
+
+    def get_sessions(self):
+        with self._lock:
+            return [dict(s) for s in self.sessions.values()]
+
+    def detach(self, id):
+        with self._lock:
+            entry = self.sessions.pop(id, None)
+        if entry is None:
+            return False
+        frida = _frida()
+        for script in entry['scripts']:
+            try:
+                script.unload()
+            except frida.InvalidOperationError:
+                pass
+        try:
+            entry['session'].detach()
+        except frida.InvalidOperationError:
+            pass
+        if entry['sink'] is not None:
+            entry['sink'].close()
+        return True
+
+    def close(self):
+        for id in list(self.sessions.keys()):
+            self.detach(id)
+
+
+def get_manager():
+    global _MANAGER
+    with _MANAGER_LOCK:
+        if _MANAGER is None:
+            _MANAGER = SessionManager()
+        return _MANAGER
+
+
+def close_manager():
+    with _MANAGER_LOCK:
+        if _MANAGER is not None:
+            _MANAGER.close()
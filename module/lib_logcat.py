@@ -0,0 +1,355 @@
+"""
+Project: PiracyTools
+File: lib_logcat.py
+Author: hyugogirubato
+Date: 2026.10.18
+"""
+
+import os
+import queue
+import re
+import socket
+import struct
+import sys
+import threading
+import time
+import utils
+from module import lib_adb, lib_device, lib_packages, lib_process, lib_shell
+
+""" Logcat
+`logcat -B` (binary entries) is streamed over exec: and parsed on the host, filters are applied before formatting.
+https://android.googlesource.com/platform/system/logging/+/refs/heads/main/liblog/include/log/log_read.h
+
+entry: len (u16), hdr_size (u16, 0 on v1), pid (i32), tid (u32), sec (u32), nsec (u32), [lid (u32)], [uid (u32)]
+text payload: priority (u8) + tag + '\\0' + message + '\\0', binary payload for events/stats/security buffers
+
+The reader thread blocks when the queue is full (the socket is no longer read and adb flow control slows the device
+reader down): entries are never dropped by the host.
+When the stream ends because the device is gone (wireless adb, USB hub), the reader waits for it and starts logcat
+again from the last entry received (-T), entries already shown are skipped.
+
+Host options (other arguments are passed to logcat, -v is ignored):
+--pid=$PID[,..] --uid=$UID[,..] --package=$PACKAGE[,..] --tag=$TAG[,..] --level=V|D|I|W|E|F --grep=$REGEX
+--output=$FILE (rotated by size) --quiet (file only)
+"""
+
+PATH_LOGCAT = os.path.join('tmp', 'logcat')
+CHUNK_SIZE = 256 * 1024
+QUEUE_SIZE = 64
+ROTATE_SIZE = 64 * 1024 * 1024
+ROTATE_COUNT = 8
+STOP_TIMEOUT = 2
+HEADER = struct.Struct('<HHiIII')
+PRIORITIES = {0: '?', 1: '?', 2: 'V', 3: 'D', 4: 'I', 5: 'W', 6: 'E', 7: 'F', 8: 'S'}
+# log ids with binary payloads
+BINARY_LOGS = [2, 5, 6]
+# uid = user id * PER_USER_RANGE + app id
+PER_USER_RANGE = 100000
+
+
+class LogcatError(Exception):
+    pass
+
+
+def _safe(value):
+    return re.sub(r'[^A-Za-z0-9._-]', '_', value)
+
+
+def parse(buffer, offset=0):
+    # returns (entries, offset of the first incomplete entry)
+    entries = []
+    size = len(buffer)
+    while size - offset >= HEADER.size:
+        length, hdr_size, pid, tid, sec, nsec = HEADER.unpack_from(buffer, offset)
+        hdr_size = hdr_size or HEADER.size
+        if size - offset < hdr_size + length:
+            break
+        lid = struct.unpack_from('<I', buffer, offset + 20)[0] if hdr_size >= 24 else 0
+        uid = struct.unpack_from('<I', buffer, offset + 24)[0] if hdr_size >= 28 else None
+        payload = bytes(buffer[offset + hdr_size:offset + hdr_size + length])
+        offset += hdr_size + length
+        if lid in BINARY_LOGS:
+            tag = str(struct.unpack_from('<I', payload)[0]) if len(payload) >= 4 else ''
+            entries.append({'pid': pid, 'tid': tid, 'sec': sec, 'nsec': nsec, 'lid': lid, 'uid': uid, 'priority': 4, 'tag': tag, 'message': payload[4:].hex()})
+            continue
+        end = payload.find(b'\0', 1)
+        end = len(payload) if end == -1 else end
+        entries.append({
+            'pid': pid,
+            'tid': tid,
+            'sec': sec,
+            'nsec': nsec,
+            'lid': lid,
+            'uid': uid,
+            'priority': payload[0] if len(payload) > 0 else 0,
+            'tag': payload[1:end].decode('utf-8', errors='replace'),
+            'message': payload[end + 1:].rstrip(b'\0').decode('utf-8', errors='replace')
+        })
+    return entries, offset
+
+
+def format_entry(entry):
+    # same layout as `logcat -v threadtime`, one line per message line
+    prefix = '{0}.{1:03d} {2:>5} {3:>5} {4} {5}: '.format(
+        time.strftime('%m-%d %H:%M:%S', time.localtime(entry['sec'])),
+        entry['nsec'] // 1000000,
+        entry['pid'],
+        entry['tid'],
+        PRIORITIES.get(entry['priority'], '?'),
+        entry['tag']
+    )
+    return ''.join(prefix + line + '\n' for line in entry['message'].split('\n'))
+
+
+class Filter:
+
+    def __init__(self, pids=None, uids=None, tags=None, level=None, pattern=None):
+        self.pids = set(pids) if pids else None
+        self.uids = set(u % PER_USER_RANGE for u in uids) if uids else None
+        self.tags = set(tags) if tags else None
+        self.level = level or 0
+        self.pattern = re.compile(pattern) if pattern else None
+
+    def match(self, entry):
+        if entry['priority'] < self.level:
+            return False
+        if self.tags is not None and entry['tag'] not in self.tags:
+            return False
+        if self.pids is not None or self.uids is not None:
+            # entries without uid (log format < v4) only match by pid
+            if not ((self.pids is not None and entry['pid'] in self.pids) or (self.uids is not None and entry['uid'] is not None and entry['uid'] % PER_USER_RANGE in self.uids)):
+                return False
+        if self.pattern is not None and not self.pattern.search(entry['message']):
+            return False
+        return True
+
+
+class RotatingFile:
+
+    def __init__(self, path, max_size=ROTATE_SIZE, count=ROTATE_COUNT):
+        self.path = path
+        self.max_size = max_size
+        self.count = count
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.file = open(path, mode='a', encoding='utf-8')
+
+    def write(self, text):
+        self.file.write(text)
+        if self.file.tell() >= self.max_size:
+            self.file.close()
+            for i in range(self.count - 1, 0, -1):
+                if os.path.exists(f"{self.path}.{i}"):
+                    os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+            self.file = open(self.path, mode='a', encoding='utf-8')
+
+    def close(self):
+        self.file.close()
+
+
+class LogcatReader:
+
+    def __init__(self, device, args=None, filter=None, output=None, quiet=False):
+        self.device = device
+        self.args = args or []
+        self.filter = filter or Filter()
+        self.output = RotatingFile(output) if output else None
+        self.quiet = quiet
+        self.counters = {'entries': 0, 'matched': 0, 'bytes': 0, 'reconnects': 0}
+        self.start = None
+        self.last = None  # (sec, nsec) of the last entry received
+        self._after = None
+        self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._connection = None
+        self._thread = None
+
+    def _reader(self, connection):
+        buffer = bytearray()
+        try:
+            while not self._stop.is_set():
+                chunk = connection.sock.recv(CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.counters['bytes'] += len(chunk)
+                buffer += chunk
+                entries, offset = parse(buffer)
+                del buffer[:offset]
+                if len(entries) > 0:
+                    # blocking put: backpressure instead of loss
+                    while not self._stop.is_set():
+                        try:
+                            self._queue.put(entries, timeout=0.2)
+                            break
+                        except queue.Full:
+                            pass
+        except OSError:
+            pass
+        finally:
+            while True:
+                try:
+                    self._queue.put(None, timeout=0.2)
+                    break
+                except queue.Full:
+                    if self._stop.is_set():
+                        break
+
+    def open(self, args=None):
+        cmd = ' '.join(['logcat', '-B'] + [lib_shell.quote(a) for a in self.args + (args or [])])
+        try:
+            self._connection = lib_adb.get_client().exec_out(self.device['name'], cmd, timeout=None)
+        except lib_adb.AdbError as e:
+            raise LogcatError(f'Unable to start logcat: {e.message}')
+        self.start = self.start or time.time()
+        self._thread = threading.Thread(target=self._reader, args=(self._connection,), daemon=True)
+        self._thread.start()
+
+    def _close(self):
+        # shutdown wakes the reader thread blocked in recv(), close alone does not; stop() may run from two threads
+        with self._lock:
+            connection, self._connection = self._connection, None
+            thread, self._thread = self._thread, None
+        if connection is not None:
+            try:
+                connection.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            connection.close()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=STOP_TIMEOUT)
+
+    def _resume(self):
+        # True when logcat runs again after a lost transport, False when the stream ended on the device (-d, -t)
+        if self._stop.is_set() or lib_device.wait_device(self.device, timeout=0) is not None:
+            return False
+        utils.printWarning(f"Logcat: {self.device['name']} disconnected, waiting for it")
+        if lib_device.wait_device(self.device) is None:
+            utils.printError(f"Logcat: {self.device['name']} not reconnected", exit=False)
+            return False
+        self._close()
+        self._after = self.last
+        try:
+            self.open(args=[] if self.last is None else ['-T', f"{self.last[0]}.{self.last[1] // 1000000:03d}"])
+        except LogcatError as e:
+            utils.printError(e, exit=False)
+            return False
+        self.counters['reconnects'] += 1
+        utils.printSuccess(f"Logcat: {self.device['name']} reconnected")
+        return True
+
+    def run(self):
+        # consumes until the stream ends, stop() or KeyboardInterrupt
+        if self._thread is None:
+            self.open()
+        try:
+            while True:
+                entries = self._queue.get()
+                if entries is None:
+                    if self._resume():
+                        continue
+                    break
+                if self._after is not None:
+                    # -T starts at the millisecond of the last entry received
+                    entries = [e for e in entries if (e['sec'], e['nsec']) > self._after]
+                if len(entries) == 0:
+                    continue
+                self.last = max(self.last or (0, 0), max((e['sec'], e['nsec']) for e in entries))
+                self.counters['entries'] += len(entries)
+                lines = [format_entry(e) for e in entries if self.filter.match(e)]
+                if len(lines) == 0:
+                    continue
+                self.counters['matched'] += len(lines)
+                text = ''.join(lines)
+                output = self.output
+                if output is not None:
+                    output.write(text)
+                if not self.quiet:
+                    sys.stdout.write(text)
+                    sys.stdout.flush()
+        finally:
+            self.stop()
+        return self.stats()
+
+    def stats(self):
+        elapsed = time.time() - self.start if self.start else 0
+        return dict(self.counters, time=elapsed, rate=self.counters['entries'] / elapsed if elapsed > 0 else 0.0)
+
+    def stop(self):
+        self._stop.set()
+        self._close()
+        with self._lock:
+            output, self.output = self.output, None
+        if output is not None:
+            output.close()
+
+
+def _parse_args(device, args):
+    # host options -> (logcat args, Filter, output, quiet)
+    options = {}
+    logcat = []
+    skip = False
+    for arg in args:
+        if skip:
+            skip = False
+        elif arg == '-v':
+            skip = True
+        elif arg.startswith('-v'):
+            pass
+        elif arg == '--quiet':
+            options['quiet'] = True
+        elif arg.startswith('--') and '=' in arg and arg[2:].split('=', 1)[0] in ['pid', 'uid', 'package', 'tag', 'level', 'grep', 'output']:
+            key, value = arg[2:].split('=', 1)
+            options[key] = value
+        elif arg != '':
+            logcat.append(arg)
+
+    pids = [int(p) for p in options.get('pid', '').split(',') if p.isdigit()]
+    uids = [int(u) for u in options.get('uid', '').split(',') if u.isdigit()]
+    for pkg in [p for p in options.get('package', '').split(',') if p != '']:
+        p = lib_packages.get_index(device).get(pkg)
+        if p is None:
+            raise LogcatError(f'Package not found: {pkg}')
+        if p['uid'] is not None:
+            uids.append(p['uid'])
+        # current processes, for entries without uid
+        pids += [x['pid'] for x in lib_process.get_table(device).by_package(pkg)]
+        if p['uid'] is None and len(pids) == 0:
+            raise LogcatError(f'Package not running: {pkg}')
+
+    level = None
+    if 'level' in options:
+        levels = {v: k for k, v in PRIORITIES.items() if v != '?'}
+        if options['level'].upper() not in levels:
+            raise LogcatError(f"Invalid level: {options['level']}")
+        level = levels[options['level'].upper()]
+    try:
+        filter = Filter(pids=pids, uids=uids, tags=[t for t in options.get('tag', '').split(',') if t != ''], level=level, pattern=options.get('grep'))
+    except re.error as e:
+        raise LogcatError(f'Invalid pattern: {e}')
+    output = options.get('output')
+    if options.get('quiet') and output is None:
+        output = os.path.join(PATH_LOGCAT, f"{int(time.time())}_{_safe(device['name'])}.log")
+    return logcat, filter, output, options.get('quiet', False)
+
+
+def run(device, args):
+    # REPL entry point: logcat [args] [host options], stopped with ctrl+c
+    try:
+        logcat, filter, output, quiet = _parse_args(device, args)
+        reader = LogcatReader(device, args=logcat, filter=filter, output=output, quiet=quiet)
+        reader.open()
+    except LogcatError as e:
+        utils.printError(e, exit=False)
+        return None
+    if output is not None:
+        utils.printInfo(f"Logcat saved at: {output}")
+    try:
+        reader.run()
+    except KeyboardInterrupt:
+        # stopped by the finally of reader.run()
+        print('')
+    stats = reader.stats()
+    if quiet or output is not None:
+        utils.printInfo(f"Logcat: {stats['matched']}/{stats['entries']} entries in {stats['time']:.1f}s ({stats['rate']:.0f}/s)")
+    return stats
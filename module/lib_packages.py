@@ -0,0 +1,160 @@
+"""
+Project: PiracyTools
+File: lib_packages.py
+Author: hyugogirubato
+Date: 2026.10.18
+"""
+
+import bisect
+import json
+import os
+import re
+import threading
+import time
+from module import lib_shell
+
+""" Index
+The package list is read once with `pm list packages -f -U --show-versioncode` and kept per device (memory + tmp/packages).
+It is only listed again when the stamp changes: boot id + mtime of /data/app, which changes on every install,
+update or removal of an app. Checking the stamp is a single `stat`, skipped for CHECK_INTERVAL after the last check.
+
+Lookups: dict by package, sorted keys (bisect) for prefixes, trigram sets for substrings.
+"""
+
+PATH_PACKAGES = os.path.join('tmp', 'packages')
+CHECK_INTERVAL = 2.0
+STAMP = 'echo "$(cat /proc/sys/kernel/random/boot_id):$(stat -c %Y /data/app 2>/dev/null)"'
+LIST = 'pm list packages -f -U --show-versioncode 2>/dev/null || pm list packages -f --show-versioncode 2>/dev/null || pm list packages -f 2>/dev/null'
+
+_INDEXES = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def _parse(line):
+    m = re.match(r"^package:(/.*\.apk)=(\S+?)((?: \S+)*)\r?$", line.strip())
+    if not m:
+        return None
+    version = re.search(r" versionCode:(\d+)", m.group(3))
+    uid = re.search(r" uid:(\d+)", m.group(3))
+    path = m.group(1)
+    items = path.split('/')
+    mode = items[1].strip() if len(items) > 1 else ''
+    name = os.path.basename(os.path.dirname(path)) if items[-1] == 'base.apk' else items[-1][:-4]
+    if name.startswith(m.group(2) + '-'):
+        # /data/app/[~~random==/]$PACKAGE-random==/base.apk
+        name = m.group(2)
+    if mode == '' or name == '':
+        return None
+    return {'mode': mode, 'name': name, 'pkg': m.group(2), 'path': path, 'version': version.group(1) if version else None, 'uid': int(uid.group(1)) if uid else None}
+
+
+def _trigrams(value):
+    return set(value[i:i + 3] for i in range(len(value) - 2))
+
+
+class PackageIndex:
+
+    def __init__(self, device):
+        self.device = device
+        self.stamp = None
+        self.checked = 0
+        self._lock = threading.Lock()
+        self._set([])
+        self._load()
+
+    def _file(self):
+        return os.path.join(PATH_PACKAGES, f"{re.sub(r'[^A-Za-z0-9._-]', '_', self.device['name'])}.json")
+
+    def _load(self):
+        try:
+            with open(self._file(), mode='r') as f:
+                data = json.load(f)
+            self.stamp = data['stamp']
+            self._set(data['packages'])
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _save(self):
+        os.makedirs(PATH_PACKAGES, exist_ok=True)
+        tmp = f"{self._file()}.{os.getpid()}"
+        with open(tmp, mode='w') as f:
+            json.dump({'stamp': self.stamp, 'packages': self._packages}, f)
+        os.replace(tmp, self._file())
+
+    def _set(self, packages):
+        self._packages = packages
+        self._by_pkg = {p['pkg']: p for p in packages}
+        self._keys = sorted(set([(p['pkg'], i) for i, p in enumerate(packages)] + [(p['name'], i) for i, p in enumerate(packages)]))
+        self._grams = {}
+        for i, p in enumerate(packages):
+            for gram in _trigrams(p['pkg']) | _trigrams(p['name']):
+                self._grams.setdefault(gram, set()).add(i)
+
+    def refresh(self, force=False, shell=None):
+        # shell: lib_shell.Shell used instead of the session of the user (background refresh)
+        with self._lock:
+            if not force and time.time() - self.checked < CHECK_INTERVAL:
+                return False
+            session = lib_shell.get_session(self.device) if shell is None else shell
+            stamp = session.run(STAMP).strip()
+            self.checked = time.time()
+            if not force and stamp == self.stamp and len(self._packages) > 0:
+                return False
+            packages = []
+            for line in session.run(LIST).split('\n'):
+                p = _parse(line)
+                if p is not None:
+                    packages.append(p)
+            self.stamp = stamp
+            self._set(packages)
+            try:
+                self._save()
+            except OSError:
+                pass
+            return True
+
+    def invalidate(self):
+        with self._lock:
+            self.checked = 0
+            self.stamp = None
+
+    def packages(self):
+        self.refresh()
+        return list(self._packages)
+
+    def get(self, pkg):
+        self.refresh()
+        return self._by_pkg.get(pkg)
+
+    def prefix(self, text, refresh=True):
+        # packages whose package or apk name starts with text, refresh=False only reads the local index
+        if refresh:
+            self.refresh()
+        result = set()
+        for key, i in self._keys[bisect.bisect_left(self._keys, (text, -1)):]:
+            if not key.startswith(text):
+                break
+            result.add(i)
+        return [self._packages[i] for i in sorted(result)]
+
+    def search(self, text):
+        # packages whose package or apk name contains text
+        self.refresh()
+        if len(text) < 3:
+            candidates = range(len(self._packages))
+        else:
+            candidates = None
+            for gram in _trigrams(text):
+                ids = self._grams.get(gram, set())
+                candidates = ids if candidates is None else candidates & ids
+                if len(candidates) == 0:
+                    break
+            candidates = sorted(candidates)
+        return [self._packages[i] for i in candidates if text in self._packages[i]['name'] or text in self._packages[i]['pkg']]
+
+
+def get_index(device):
+    with _INDEXES_LOCK:
+        if device['name'] not in _INDEXES:
+            _INDEXES[device['name']] = PackageIndex(device)
+        return _INDEXES[device['name']]
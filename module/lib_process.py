@@ -0,0 +1,139 @@
+"""
+Project: PiracyTools
+File: lib_process.py
+Author: hyugogirubato
+Date: 2026.10.18
+"""
+
+import re
+import threading
+import time
+from module import lib_shell
+
+""" Processes
+One `ps` round trip gives the process table of a device: [{'pid', 'uid', 'user', 'name', 'package'}], indexed by pid,
+name and package, and shared by every command for SNAPSHOT_TTL seconds (invalidated after a kill).
+toybox ps (Android 8+) is read with fixed columns, the older `ps` output by its header (uid from the user name).
+package: application processes (uid >= FIRST_APPLICATION_UID) are named $PACKAGE[:$PROCESS].
+"""
+
+PS = 'ps -A -o PID,UID,USER,NAME 2>/dev/null || ps -A 2>/dev/null || ps'
+SNAPSHOT_TTL = 5
+FIRST_APPLICATION_UID = 10000
+PER_USER_RANGE = 100000
+# android_filesystem_config.h
+USERS = {'root': 0, 'system': 1000, 'radio': 1001, 'bluetooth': 1002, 'media': 1013, 'wifi': 1010, 'nfc': 1027, 'shell': 2000}
+
+_TABLES = {}
+_TABLES_LOCK = threading.Lock()
+
+
+def _uid(user):
+    # u0_a123 -> 10123, u10_a5 -> 1010005, u0_i7 -> 99007
+    m = re.match(r'^u(\d+)_([ai])(\d+)$', user or '')
+    if m:
+        return int(m.group(1)) * PER_USER_RANGE + (10000 if m.group(2) == 'a' else 99000) + int(m.group(3))
+    return USERS.get(user)
+
+
+def parse(output):
+    processes = []
+    lines = [l for l in output.split('\n') if l.strip() != '']
+    if len(lines) == 0:
+        return processes
+    header = lines[0].split()
+    fixed = header == ['PID', 'UID', 'USER', 'NAME']
+    for line in lines[1:]:
+        if fixed:
+            items = line.split(None, 3)
+            if len(items) != 4 or not items[0].isdigit():
+                continue
+            pid, uid, user, name = int(items[0]), int(items[1]) if items[1].isdigit() else _uid(items[2]), items[2], items[3].strip()
+        else:
+            items = line.split()
+            if 'PID' not in header or len(items) < len(header) or not items[header.index('PID')].isdigit():
+                continue
+            user = items[header.index('USER')] if 'USER' in header else None
+            pid, uid, name = int(items[header.index('PID')]), _uid(user), items[-1]
+        package = None
+        if uid is not None and uid % PER_USER_RANGE >= FIRST_APPLICATION_UID and '/' not in name:
+            package = name.split(':', 1)[0]
+        processes.append({'pid': pid, 'uid': uid, 'user': user, 'name': name, 'package': package})
+    return processes
+
+
+class ProcessTable:
+
+    def __init__(self, device):
+        self.device = device
+        self.time = 0
+        self._lock = threading.Lock()
+        self._set([])
+
+    def _set(self, processes):
+        self._processes = processes
+        self._by_pid = {p['pid']: p for p in processes}
+        self._by_name = {}
+        self._by_package = {}
+        for p in processes:
+            self._by_name.setdefault(p['name'], []).append(p)
+            if p['package'] is not None:
+                self._by_package.setdefault(p['package'], []).append(p)
+
+    def refresh(self, probes=None):
+        # new snapshot; probes ({name: command}) run in the same round trip, their results are returned
+        with self._lock:
+            r = lib_shell.get_session(self.device).batch(dict({'ps': PS}, **(probes or {})))
+            self._set(parse(r.pop('ps')['stdout']))
+            self.time = time.time()
+            return r
+
+    def snapshot(self):
+        with self._lock:
+            fresh = time.time() - self.time < SNAPSHOT_TTL
+        if not fresh:
+            self.refresh()
+        return self
+
+    def invalidate(self):
+        with self._lock:
+            self.time = 0
+
+    def processes(self):
+        return list(self.snapshot()._processes)
+
+    def get(self, pid):
+        return self.snapshot()._by_pid.get(int(pid))
+
+    def find(self, name):
+        return list(self.snapshot()._by_name.get(name, []))
+
+    def match(self, text):
+        # processes whose name contains text
+        return [p for p in self.snapshot()._processes if text in p['name']]
+
+    def by_package(self, package):
+        # processes of an application, main process first
+        return sorted(self.snapshot()._by_package.get(package, []), key=lambda p: (p['name'] != package, p['pid']))
+
+    def resolve(self, target):
+        # pid of a pid, process name or package (main process), None when not running
+        if str(target).isdigit():
+            return int(target) if self.get(target) is not None else None
+        processes = self.find(target) or self.by_package(target)
+        return processes[0]['pid'] if len(processes) > 0 else None
+
+    def kill(self, pids, signal=9, root=False):
+        # every pid in one call, returns the exit code
+        if len(pids) == 0:
+            return 0
+        r = lib_shell.get_session(self.device).execute(f"kill -{signal} {' '.join(str(int(p)) for p in pids)}", root=root)
+        self.invalidate()
+        return r['code']
+
+
+def get_table(device):
+    with _TABLES_LOCK:
+        if device['name'] not in _TABLES:
+            _TABLES[device['name']] = ProcessTable(device)
+        return _TABLES[device['name']]
@@ -0,0 +1,79 @@
+"""
+Project: PiracyTools
+File: lib_push.py
+Author: hyugogirubato
+Date: 2026.10.18
+"""
+
+import hashlib
+import os
+import threading
+import time
+from module import lib_adb, lib_shell
+
+""" Push
+1 round trip when the device already has the file: chmod + remote hash, compared with the local hash.
+Otherwise: sync push (mode applied by the transfer) + 1 round trip to chmod and verify the remote hash.
+toybox provides sha256sum since Android 7, md5sum is used as a fallback on older builds.
+"""
+
+CHUNK_SIZE = 1024 * 1024
+ALGORITHMS = {64: 'sha256', 32: 'md5'}
+
+_HASHES = {}
+_HASHES_LOCK = threading.Lock()
+
+
+class PushError(Exception):
+    pass
+
+
+def digest(path, algorithm='sha256'):
+    # cached per (path, size, mtime), a file pushed to many devices is hashed once
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime, algorithm)
+    with _HASHES_LOCK:
+        if key in _HASHES:
+            return _HASHES[key]
+    h = hashlib.new(algorithm)
+    with open(path, mode='rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            h.update(chunk)
+    with _HASHES_LOCK:
+        _HASHES[key] = h.hexdigest()
+    return _HASHES[key]
+
+
+def _remote_digest(session, remote, mode, root):
+    q = lib_shell.quote(remote)
+    r = session.run(f"chmod {mode:o} {q} 2>/dev/null; (sha256sum {q} || md5sum {q}) 2>/dev/null", root=root).strip()
+    value = r.split(' ')[0] if r != '' else ''
+    if len(value) not in ALGORITHMS:
+        return None, None
+    return ALGORITHMS[len(value)], value.lower()
+
+
+def push(device, local, remote, mode=0o755, root=False, force=False, callback=None):
+    # returns {'status': 'skipped'|'pushed', 'size', 'time'}
+    if not os.path.exists(local):
+        raise PushError(f'Input file not found: {local}')
+    start = time.time()
+    session = lib_shell.get_session(device)
+
+    algorithm, value = _remote_digest(session, remote, mode, root)
+    if not force and value is not None and value == digest(local, algorithm):
+        return {'status': 'skipped', 'size': 0, 'time': time.time() - start}
+
+    try:
+        size = lib_adb.get_client().push(device['name'], local, remote, mode=mode, callback=callback)
+    except lib_adb.AdbError as e:
+        raise PushError(f'Unable to push file: {e.message}')
+
+    algorithm, value = _remote_digest(session, remote, mode, root)
+    if value is None:
+        # no hash tool on the device, fall back to the size reported by the sync service
+        if lib_adb.get_client().stat(device['name'], remote)['size'] != os.path.getsize(local):
+            raise PushError(f'Verification failed after push: {remote}')
+    elif value != digest(local, algorithm):
+        raise PushError(f'Verification failed after push: {remote}')
+    return {'status': 'pushed', 'size': size, 'time': time.time() - start}
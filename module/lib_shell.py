@@ -0,0 +1,238 @@
+"""
+Project: PiracyTools
+File: lib_shell.py
+Author: hyugogirubato
+Date: 2026.10.18
+"""
+
+import queue
+import subprocess
+import threading
+import time
+import uuid
+from module import lib_adb, lib_trace
+
+""" Protocol
+Each device keeps one long-lived shell (and optionally a second one running `su`) opened on the adb server
+through lib_adb, or an `adb shell` process when the server cannot be reached.
+A request is written on stdin as a single line:
+    (cd -- '$CWD' 2>/dev/null; trap 'printf "\n$MARKER %d %s\n" "$?" "$PWD"' EXIT; eval '$COMMAND' </dev/null 2>&1)
+and the response is every byte read on stdout up to the marker line, which carries the exit code and the cwd.
+The subshell keeps the session alive when the command itself calls `exit`.
+
+Session.batch packs several probes in one request, each framed by nonce lines:
+    $NONCE:$I:out\n $STDOUT \n$NONCE:$I:err\n $STDERR \n$NONCE:$I:code:$CODE\n
+stderr goes through a temporary file so both streams come back whole and separated.
+"""
+
+_SESSIONS = {}
+_SESSIONS_LOCK = threading.Lock()
+
+
+class ShellError(Exception):
+    pass
+
+
+def quote(value):
+    return "'" + str(value).replace("'", "'\\''") + "'"
+
+
+class _ProcessStream:
+    # fallback transport when the adb server cannot be reached through lib_adb
+
+    def __init__(self, args):
+        start = time.time()
+        self.process = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        lib_trace.record(args[2], 'process', ' '.join(args), start)
+
+    def write(self, data):
+        self.process.stdin.write(data)
+        self.process.stdin.flush()
+
+    def read(self):
+        return self.process.stdout.read1(65536)
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        if self.process.poll() is None:
+            self.process.kill()
+
+
+class Shell:
+
+    def __init__(self, serial, root=False):
+        self.serial = serial
+        self.root = root
+        self._lock = threading.Lock()
+        self._stream = None
+        self._lines = None
+
+    def _reader(self, stream, lines):
+        buffer = b''
+        try:
+            while True:
+                chunk = stream.read()
+                if not chunk:
+                    break
+                buffer += chunk
+                while b'\n' in buffer:
+                    line, buffer = buffer.split(b'\n', 1)
+                    lines.put(line + b'\n')
+        except (OSError, ValueError, lib_adb.AdbError):
+            pass
+        if buffer:
+            lines.put(buffer)
+        lines.put(None)
+
+    def _connect(self):
+        try:
+            client = lib_adb.get_client()
+        except lib_adb.AdbConnectionError:
+            args = ['adb', '-s', self.serial, 'shell']
+            if self.root:
+                args.append('su')
+            return _ProcessStream(args)
+        try:
+            return client.open_shell(self.serial, 'su' if self.root else '')
+        except lib_adb.AdbError as e:
+            raise ShellError(e.message)
+
+    def _open(self):
+        start = time.time()
+        self._stream = self._connect()
+        lib_trace.record(self.serial, 'open', 'su' if self.root else 'sh', start, root=self.root)
+        self._lines = queue.Queue()
+        threading.Thread(target=self._reader, args=(self._stream, self._lines), daemon=True).start()
+        if self.root and '(root)' not in self._request('id', '/', None)['output']:
+            self.close()
+            raise ShellError('Root access unavailable')
+
+    def _request(self, cmd, cwd, timeout, label=None):
+        start = time.time()
+        marker = f"__PTOOLS_{uuid.uuid4().hex}__"
+        trap = f'printf "\\n{marker} %d %s\\n" "$?" "$PWD"'
+        script = f"(cd -- {quote(cwd)} 2>/dev/null; trap {quote(trap)} EXIT; eval {quote(cmd)} </dev/null 2>&1)\n"
+        try:
+            self._stream.write(script.encode('utf-8'))
+        except OSError:
+            raise ShellError('error: closed')
+
+        output = []
+        size = 0
+        while True:
+            try:
+                line = self._lines.get(timeout=timeout)
+            except queue.Empty:
+                raise ShellError(f'Command timed out: {cmd}')
+            if line is None:
+                raise ShellError('error: closed')
+            text = line.decode('utf-8', errors='replace').rstrip('\r\n')
+            if text.startswith(marker):
+                items = text[len(marker) + 1:].split(' ', 1)
+                output = ''.join(output)
+                code = int(items[0]) if items[0].lstrip('-').isdigit() else -1
+                lib_trace.record(self.serial, 'shell', label or cmd, start, code=code, size=size, root=self.root)
+                return {
+                    'output': output[:-1] if output.endswith('\n') else output,
+                    'code': code,
+                    'cwd': items[1] if len(items) == 2 and items[1] != '' else cwd
+                }
+            size += len(line)
+            output.append(text + '\n')
+
+    def execute(self, cmd, cwd='/', timeout=None, label=None):
+        # label: name of the request for lib_trace, cmd by default
+        with self._lock:
+            try:
+                if self._stream is None:
+                    self._open()
+                return self._request(cmd, cwd, timeout, label=label)
+            except BaseException:
+                # the remote state is unknown (interrupted, timed out or closed), start over on next request
+                self.close()
+                raise
+
+    def run(self, cmd, cwd='/', timeout=None, label=None):
+        return self.execute(cmd, cwd=cwd, timeout=timeout, label=label)['output']
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+
+class Session:
+
+    def __init__(self, device):
+        self.device = device
+        self._shells = {}
+        self._lock = threading.Lock()
+
+    def shell(self, root=False):
+        with self._lock:
+            if root not in self._shells:
+                self._shells[root] = Shell(self.device['name'], root=root)
+            return self._shells[root]
+
+    def execute(self, cmd, root=False, cwd='/', timeout=None, label=None):
+        return self.shell(root=root).execute(cmd, cwd=cwd, timeout=timeout, label=label)
+
+    def run(self, cmd, root=False, cwd='/', timeout=None, label=None):
+        return self.execute(cmd, root=root, cwd=cwd, timeout=timeout, label=label)['output']
+
+    def batch(self, probes, root=False, cwd='/', timeout=None):
+        # runs {name: command} in one round trip, returns {name: {'stdout', 'stderr', 'code'}}
+        nonce = f"__PTOOLS_{uuid.uuid4().hex}__"
+        tmp = f"${{TMPDIR:-/data/local/tmp}}/.{nonce}"
+        script = []
+        for i, cmd in enumerate(probes.values()):
+            script.append(
+                f"printf '%s\\n' '{nonce}:{i}:out'; (eval {quote(cmd)}) </dev/null 2>\"{tmp}\"; c=$?; "
+                f"printf '\\n%s\\n' '{nonce}:{i}:err'; cat \"{tmp}\" 2>/dev/null; printf '\\n{nonce}:{i}:code:%d\\n' $c"
+            )
+        script.append(f"rm -f \"{tmp}\"")
+        output = self.run('\n'.join(script), root=root, cwd=cwd, timeout=timeout, label=f"batch: {' | '.join(probes.values())}")
+
+        results = {}
+        for i, name in enumerate(probes.keys()):
+            start = output.find(f"{nonce}:{i}:out\n")
+            middle = output.find(f"\n{nonce}:{i}:err\n", start)
+            end = output.find(f"\n{nonce}:{i}:code:", middle)
+            if start < 0 or middle < 0 or end < 0:
+                raise ShellError(f'Incomplete batch response for probe: {name}')
+            code = output[end + len(f"\n{nonce}:{i}:code:"):].split('\n', 1)[0]
+            results[name] = {
+                'stdout': output[start + len(f"{nonce}:{i}:out\n"):middle],
+                'stderr': output[middle + len(f"\n{nonce}:{i}:err\n"):end],
+                'code': int(code) if code.lstrip('-').isdigit() else -1
+            }
+        return results
+
+    def check_root(self):
+        try:
+            return '(root)' in self.run('id', root=True)
+        except ShellError:
+            return False
+
+    def close(self):
+        with self._lock:
+            for shell in self._shells.values():
+                shell.close()
+            self._shells = {}
+
+
+def get_session(device):
+    with _SESSIONS_LOCK:
+        if device['name'] not in _SESSIONS:
+            _SESSIONS[device['name']] = Session(device)
+        return _SESSIONS[device['name']]
+
+
+def close_sessions():
+    with _SESSIONS_LOCK:
+        for session in _SESSIONS.values():
+            session.close()
+        _SESSIONS.clear()
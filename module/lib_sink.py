@@ -0,0 +1,164 @@
+"""
+Project: PiracyTools
+File: lib_sink.py
+Author: hyugogirubato
+Date: 2026.10.18
+"""
+
+import collections
+import json
+import os
+import threading
+import time
+
+""" Sink
+Frida messages are appended to a bounded ring buffer by the message handler (never blocks the frida thread,
+so the instrumented app is never stalled by the host): when it is full the oldest records are dropped and counted.
+A writer thread drains the buffer to "$PATH/events.ndjson", binary payloads go to "$PATH/events.bin"
+and the record keeps their [offset, size]. Both files rotate together (events.1.ndjson, events.1.bin, ...).
+
+Agents can batch: send({'batch': [event, ...]}, buffer), each event with 'data': [offset, size] in buffer.
+An event whose 'data' is not a valid [offset, size] of the buffer is counted as dropped.
+Counters are updated under the buffer lock (frida thread, writer thread) and read by stats().
+"""
+
+MAX_RECORDS = 100000
+ROTATE_SIZE = 64 * 1024 * 1024
+ROTATE_COUNT = 8
+FLUSH_INTERVAL = 0.2
+
+
+def _valid_range(value, data):
+    # [offset, size] within the binary buffer of the message
+    if data is None or not isinstance(value, list) or len(value) != 2:
+        return False
+    if any(not isinstance(v, int) or isinstance(v, bool) or v < 0 for v in value):
+        return False
+    return value[0] + value[1] <= len(data)
+
+
+class MessageSink:
+
+    def __init__(self, path, max_records=MAX_RECORDS, rotate_size=ROTATE_SIZE, rotate_count=ROTATE_COUNT):
+        self.path = path
+        self.max_records = max_records
+        self.rotate_size = rotate_size
+        self.rotate_count = rotate_count
+        self.counters = {'received': 0, 'written': 0, 'dropped': 0, 'bytes': 0, 'rotations': 0, 'lag': 0.0, 'max_lag': 0.0}
+        self.start = time.time()
+        self._buffer = collections.deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        os.makedirs(path, exist_ok=True)
+        self._open()
+        self._thread = threading.Thread(target=self._writer, daemon=True)
+        self._thread.start()
+
+    def _file(self, index, ext):
+        return os.path.join(self.path, f"events.{ext}" if index == 0 else f"events.{index}.{ext}")
+
+    def _open(self):
+        self._events = open(self._file(0, 'ndjson'), mode='ab')
+        self._data = open(self._file(0, 'bin'), mode='ab')
+
+    def _rotate(self):
+        self._events.close()
+        self._data.close()
+        for ext in ['ndjson', 'bin']:
+            if os.path.exists(self._file(self.rotate_count, ext)):
+                os.remove(self._file(self.rotate_count, ext))
+            for i in range(self.rotate_count - 1, -1, -1):
+                if os.path.exists(self._file(i, ext)):
+                    os.replace(self._file(i, ext), self._file(i + 1, ext))
+        self._open()
+        with self._cond:
+            self.counters['rotations'] += 1
+
+    def _push(self, records, invalid=0):
+        # invalid: malformed events received with the records, counted as dropped
+        with self._cond:
+            for record in records:
+                if len(self._buffer) >= self.max_records:
+                    self._buffer.popleft()
+                    self.counters['dropped'] += 1
+                self._buffer.append(record)
+            self.counters['received'] += len(records) + invalid
+            self.counters['dropped'] += invalid
+            self._cond.notify()
+
+    def handle(self, message, data):
+        # frida message handler: record = (receive time, message, bytes or None)
+        now = time.time()
+        payload = message.get('payload') if message.get('type') == 'send' else None
+        if isinstance(payload, dict) and isinstance(payload.get('batch'), list):
+            records = []
+            invalid = 0
+            for event in payload['batch']:
+                chunk = None
+                if isinstance(event, dict) and 'data' in event:
+                    if not _valid_range(event['data'], data):
+                        invalid += 1
+                        continue
+                    offset, size = event['data']
+                    chunk = data[offset:offset + size]
+                    # the record 'data' is rewritten with the offset in the .bin file
+                    event = {k: v for k, v in event.items() if k != 'data'}
+                records.append((now, {'type': 'send', 'payload': event}, chunk))
+            self._push(records, invalid=invalid)
+        else:
+            self._push([(now, message, data)])
+
+    def log(self, level, text):
+        self._push([(time.time(), {'type': 'log', 'level': level, 'payload': text}, None)])
+
+    def _write(self, records):
+        now = time.time()
+        lines = []
+        lag = max_lag = 0.0
+        for received, message, chunk in records:
+            record = {'time': received, **message}
+            if chunk is not None:
+                record['data'] = [self._data.tell(), len(chunk)]
+                self._data.write(chunk)
+            lines.append(json.dumps(record, separators=(',', ':'), default=str).encode('utf-8') + b'\n')
+            lag = now - received
+            max_lag = max(max_lag, lag)
+        output = b''.join(lines)
+        self._events.write(output)
+        with self._cond:
+            self.counters['lag'] = lag
+            self.counters['max_lag'] = max(self.counters['max_lag'], max_lag)
+            self.counters['written'] += len(records)
+            self.counters['bytes'] += len(output)
+        if self._events.tell() >= self.rotate_size or self._data.tell() >= self.rotate_size:
+            self._rotate()
+
+    def _writer(self):
+        while True:
+            with self._cond:
+                if len(self._buffer) == 0 and not self._closed:
+                    self._cond.wait(FLUSH_INTERVAL)
+                records = list(self._buffer)
+                self._buffer.clear()
+                closed = self._closed
+            if len(records) > 0:
+                self._write(records)
+            self._events.flush()
+            self._data.flush()
+            if closed and len(records) == 0:
+                break
+
+    def stats(self):
+        elapsed = time.time() - self.start
+        with self._cond:
+            stats = dict(self.counters, pending=len(self._buffer))
+        stats['rate'] = stats['received'] / elapsed if elapsed > 0 else 0.0
+        return stats
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self._events.close()
+        self._data.close()
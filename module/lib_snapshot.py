@@ -0,0 +1,145 @@
+"""
+Project: PiracyTools
+File: lib_snapshot.py
+Author: hyugogirubato
+Date: 2026.10.18
+"""
+
+import hashlib
+import json
+import os
+import re
+import tarfile
+import time
+from module import lib_adb, lib_artifact, lib_shell
+
+""" Snapshots
+The sandbox (/data/data/$PACKAGE) is streamed as a tar over a single root exec: and each file is hashed while it is read.
+Contents go to a content-addressed store (tmp/snapshots/objects, lib_artifact layout, never evicted): a file that
+did not change between snapshots is stored once.
+Manifests: tmp/snapshots/manifests/$SERIAL/$PACKAGE/$NAME.json {path: {type, size, mode, mtime, sha256|target}},
+diffs only compare manifests, file contents are never read again.
+"""
+
+PATH_SNAPSHOTS = os.path.join('tmp', 'snapshots')
+CHUNK_SIZE = 1024 * 1024
+# files up to this size are hashed in memory and only written when their object is missing
+MEMORY_SIZE = 1024 * 1024
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _safe(value):
+    return re.sub(r'[^A-Za-z0-9._-]', '_', value)
+
+
+class SnapshotStore:
+
+    def __init__(self, device, package):
+        self.device = device
+        self.package = package
+        self.objects = lib_artifact.ArtifactStore(path=PATH_SNAPSHOTS)
+        self.path = os.path.join(PATH_SNAPSHOTS, 'manifests', _safe(device['name']), _safe(package))
+
+    def _store(self, tar, member, stats):
+        with tar.extractfile(member) as f:
+            if member.size <= MEMORY_SIZE:
+                data = f.read()
+                sha256 = hashlib.sha256(data).hexdigest()
+                if self.objects.get_object(sha256) is None:
+                    self.objects.write_object([data])
+                    stats['stored'] += len(data)
+                return sha256
+            sha256, size, created = self.objects.write_object(iter(lambda: f.read(CHUNK_SIZE), b''))
+            if created:
+                stats['stored'] += size
+            return sha256
+
+    def create(self, name=None):
+        # returns {'name', 'files', 'size', 'stored', 'time'}, stored being the size of the new objects
+        start = time.time()
+        name = name or time.strftime('%Y%m%d-%H%M%S')
+        if os.path.exists(os.path.join(self.path, f"{_safe(name)}.json")):
+            raise SnapshotError(f'Snapshot already exists: {name}')
+        cmd = f"su -c {lib_shell.quote(f'cd /data/data && tar -cf - {lib_shell.quote(self.package)}')}"
+        try:
+            connection = lib_adb.get_client().exec_out(self.device['name'], cmd)
+        except lib_adb.AdbError as e:
+            raise SnapshotError(f'Unable to read the sandbox: {e.message}')
+
+        files = {}
+        stats = {'size': 0, 'stored': 0}
+        try:
+            with connection.sock.makefile('rb') as stream:
+                with tarfile.open(fileobj=stream, mode='r|') as tar:
+                    for member in tar:
+                        path = member.name.split('/', 1)[1] if '/' in member.name else ''
+                        if path == '':
+                            continue
+                        entry = {'size': member.size, 'mode': member.mode, 'mtime': int(member.mtime)}
+                        if member.isfile():
+                            entry['type'] = 'file'
+                            entry['sha256'] = self._store(tar, member, stats)
+                            stats['size'] += member.size
+                        elif member.isdir():
+                            entry['type'] = 'dir'
+                        elif member.issym() or member.islnk():
+                            entry['type'] = 'link'
+                            entry['target'] = member.linkname
+                        else:
+                            continue
+                        files[path] = entry
+        except (tarfile.TarError, OSError) as e:
+            raise SnapshotError(f'Invalid archive from device: {e}')
+        finally:
+            connection.close()
+        if len(files) == 0:
+            raise SnapshotError(f'Sandbox not found: /data/data/{self.package}')
+
+        os.makedirs(self.path, exist_ok=True)
+        output = os.path.join(self.path, f"{_safe(name)}.json")
+        with open(f"{output}.{os.getpid()}", mode='w') as f:
+            json.dump({'name': name, 'package': self.package, 'time': start, 'files': files}, f)
+        os.replace(f"{output}.{os.getpid()}", output)
+        return {'name': name, 'files': len(files), 'size': stats['size'], 'stored': stats['stored'], 'time': time.time() - start}
+
+    def snapshots(self):
+        # [{'name', 'time', 'files'}] oldest first
+        result = []
+        for file in os.listdir(self.path) if os.path.isdir(self.path) else []:
+            if file.endswith('.json'):
+                data = self.load(file[:-5])
+                result.append({'name': data['name'], 'time': data['time'], 'files': len(data['files'])})
+        return sorted(result, key=lambda s: s['time'])
+
+    def load(self, name):
+        try:
+            with open(os.path.join(self.path, f"{_safe(name)}.json"), mode='r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            raise SnapshotError(f'Snapshot not found: {name}')
+
+    def diff(self, old, new):
+        # [(status, path, old entry, new entry)], status: added | removed | modified | metadata
+        a = self.load(old)['files']
+        b = self.load(new)['files']
+        changes = []
+        for path in sorted(set(a) | set(b)):
+            if path not in b:
+                changes.append(('removed', path, a[path], None))
+            elif path not in a:
+                changes.append(('added', path, None, b[path]))
+            elif a[path]['type'] != b[path]['type'] or a[path].get('sha256') != b[path].get('sha256') or a[path].get('target') != b[path].get('target'):
+                changes.append(('modified', path, a[path], b[path]))
+            elif a[path]['type'] != 'dir' and (a[path]['mode'] != b[path]['mode'] or a[path]['mtime'] != b[path]['mtime']):
+                changes.append(('metadata', path, a[path], b[path]))
+        return changes
+
+    def get_file(self, name, path):
+        # local path of a file content in a snapshot
+        entry = self.load(name)['files'].get(path)
+        if entry is None or entry['type'] != 'file':
+            raise SnapshotError(f'File not found in {name}: {path}')
+        return self.objects.get_object(entry['sha256'])
@@ -0,0 +1,198 @@
+"""
+Project: PiracyTools
+File: lib_supervisor.py
+Author: hyugogirubato
+Date: 2026.10.18
+"""
+
+import socket
+import threading
+import time
+import utils
+from module import lib_adb, lib_device, lib_shell, lib_trace
+
+""" Supervisor
+The frida server is ready when its control port (CONTROL_PORT, websocket since frida 15) answers a request, probed
+through an adb forward (tcp:0 -> tcp:27042, set once per device): adb accepts the local connection in every case and
+closes it without data when nothing listens on the device.
+start: launches the server then probes with a bounded backoff (PROBE_DELAY doubled up to PROBE_MAX_DELAY, until
+READY_TIMEOUT), the time to ready is kept. While the server is supervised, a background check probes it every
+HEALTH_INTERVAL seconds and restarts it after HEALTH_FAILURES failed probes (at most MAX_RESTARTS times in a row),
+failed probes while the device is disconnected are not counted (the forward is set again once it is back).
+stop: the supervision ends before the server is killed, a restart in progress is waited for.
+"""
+
+SERVER = '/data/local/tmp/frida-server'
+CONTROL_PORT = 27042
+PROBE_TIMEOUT = 1
+PROBE_DELAY = 0.05
+PROBE_MAX_DELAY = 1
+READY_TIMEOUT = 10
+HEALTH_INTERVAL = 5
+HEALTH_FAILURES = 2
+MAX_RESTARTS = 3
+
+_SUPERVISORS = {}
+_SUPERVISORS_LOCK = threading.Lock()
+
+
+class Supervisor:
+
+    def __init__(self, device):
+        self.device = device
+        self.session = lib_shell.get_session(device)
+        self.port = None
+        self.started = None
+        self.ready = None  # seconds from start to the first answer
+        self.restarts = 0
+        self.checked = None
+        self.healthy = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _forward(self):
+        if self.port is None:
+            self.port = lib_adb.get_client().forward(self.device['name'], 'tcp:0', f"tcp:{CONTROL_PORT}")
+        return self.port
+
+    def probe(self):
+        # True when the server answers on its control port
+        start = time.time()
+        code = 1
+        try:
+            with socket.create_connection((lib_adb.DEFAULT_HOST, self._forward()), timeout=PROBE_TIMEOUT) as sock:
+                sock.sendall(b'GET / HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n')
+                code = 0 if len(sock.recv(64)) > 0 else 1
+        except lib_adb.AdbError:
+            self.port = None
+        except OSError:
+            pass
+        lib_trace.record(self.device['name'], 'probe', f"tcp:{CONTROL_PORT}", start, code=code)
+        self.checked = time.time()
+        self.healthy = code == 0
+        return self.healthy
+
+    def wait_ready(self, timeout=READY_TIMEOUT):
+        # seconds waited until the server answers, None after timeout
+        start = time.time()
+        delay = PROBE_DELAY
+        while True:
+            if self.probe():
+                return time.time() - start
+            if time.time() - start + delay > timeout:
+                return None
+            time.sleep(delay)
+            delay = min(delay * 2, PROBE_MAX_DELAY)
+
+    def ensure(self, timeout=READY_TIMEOUT):
+        # a probe within HEALTH_INTERVAL is trusted, otherwise waits for the server
+        if self.healthy and time.time() - self.checked < HEALTH_INTERVAL:
+            return True
+        return self.wait_ready(timeout=timeout) is not None
+
+    def start(self, timeout=READY_TIMEOUT):
+        # launches the server and waits until it answers; returns the time to ready or None, supervised if ready
+        with self._lock:
+            self.started = time.time()
+            self.session.run(f"setsid {SERVER} >/dev/null 2>&1 &", root=True)
+            wait = self.wait_ready(timeout=timeout)
+            self.ready = None if wait is None else time.time() - self.started
+        if self.ready is not None:
+            self.watch()
+        return self.ready
+
+    def watch(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._health, name=f"frida-supervisor-{self.device['name']}", daemon=True)
+            self._thread.start()
+
+    def unwatch(self):
+        self._stop.set()
+        # a restart in progress ends before returning (at most READY_TIMEOUT), none starts after
+        with self._lock:
+            pass
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=PROBE_TIMEOUT * 2)
+        self._thread = None
+
+    def _health(self):
+        failures = 0
+        restarts = 0
+        with lib_trace.scope('frida supervisor', thread=True):
+            while not self._stop.wait(HEALTH_INTERVAL):
+                try:
+                    if self.probe():
+                        failures = restarts = 0
+                        continue
+                    if lib_device.wait_device(self.device, timeout=0) is None:
+                        # transport lost, forwards are removed with it
+                        self.reset()
+                        continue
+                    failures += 1
+                    if failures < HEALTH_FAILURES or self._stop.is_set():
+                        continue
+                    if restarts >= MAX_RESTARTS:
+                        utils.printError(f"Frida server not responding on {self.device['name']}, supervision stopped", exit=False)
+                        return
+                    restarts += 1
+                    self.restarts += 1
+                    utils.printWarning(f"Frida server not responding on {self.device['name']}, restarting ({restarts}/{MAX_RESTARTS})")
+                    with self._lock:
+                        if self._stop.is_set():
+                            return
+                        self.started = time.time()
+                        self.session.run(f"setsid {SERVER} >/dev/null 2>&1 &", root=True)
+                        wait = self.wait_ready()
+                    if self._stop.is_set():
+                        return
+                    if wait is not None:
+                        self.ready = time.time() - self.started
+                        failures = 0
+                        utils.printSuccess(f"Frida server restarted on {self.device['name']} (ready in {self.ready:.2f}s)")
+                except (lib_adb.AdbError, lib_shell.ShellError):
+                    failures += 1
+
+    def reset(self):
+        # after a lost transport: the forward is set again by the next probe
+        self.port = None
+        self.healthy = None
+
+    def status(self):
+        return {
+            'port': self.port,
+            'started': self.started,
+            'ready': self.ready,
+            'restarts': self.restarts,
+            'checked': self.checked,
+            'healthy': self.healthy,
+            'watched': self._thread is not None and self._thread.is_alive()
+        }
+
+    def close(self):
+        self.unwatch()
+        if self.port is not None:
+            try:
+                lib_adb.get_client().remove_forward(self.device['name'], f"tcp:{self.port}")
+            except lib_adb.AdbError:
+                pass
+            self.port = None
+
+
+def get_supervisor(device, create=True):
+    with _SUPERVISORS_LOCK:
+        if device['name'] not in _SUPERVISORS and create:
+            _SUPERVISORS[device['name']] = Supervisor(device)
+        return _SUPERVISORS.get(device['name'])
+
+
+def close_supervisors():
+    with _SUPERVISORS_LOCK:
+        supervisors = list(_SUPERVISORS.values())
+        _SUPERVISORS.clear()
+    for supervisor in supervisors:
+        supervisor.close()
@@ -0,0 +1,228 @@
+"""
+Project: PiracyTools
+File: lib_trace.py
+Author: hyugogirubato
+Date: 2026.10.18
+"""
+
+import collections
+import contextlib
+import json
+import os
+import threading
+import time
+import utils
+
+""" Commands
+ptools trace [summary]
+ptools trace top [$COUNT]
+ptools trace export [$FILE]
+ptools trace clear
+"""
+
+""" Trace
+Every device operation goes through lib_adb (host services, exec:, sync:) or lib_shell (requests of the long-lived
+shells), both call record(): {serial, kind, command, source, root, start, time, code, bytes, thread}.
+source is the command of the shell that issued the operation (`adv pkg`, `frida status`, `shell`, ...), set with
+scope() for the current thread and inherited by the threads without their own scope (fan-out workers).
+Events are kept in memory (MAX_EVENTS) and appended to tmp/trace/events.jsonl when the shell stops, so one-shot
+commands are visible to the next `ptools trace`.
+
+Export: Chrome trace-event JSON (chrome://tracing, https://ui.perfetto.dev), one process per device, one row per thread.
+"""
+
+HELPS = [
+    {'command': 'summary', 'root': False, 'description': 'Time spent per command and device operation (default)'},
+    {'command': 'top [$COUNT]', 'root': False, 'description': 'Slowest device operations (20 by default)'},
+    {'command': 'export [$FILE]', 'root': False, 'description': 'Save the operations as Chrome trace JSON'},
+    {'command': 'clear', 'root': False, 'description': 'Delete recorded operations'}
+]
+PATH_TRACE = os.path.join('tmp', 'trace')
+MAX_EVENTS = 100000
+ROTATE_SIZE = 32 * 1024 * 1024
+TOP = 20
+
+_EVENTS = collections.deque(maxlen=MAX_EVENTS)
+_LOCK = threading.Lock()
+_SAVED = [0]  # events of _EVENTS already written to disk
+_SCOPE = [None]
+_LOCAL = threading.local()
+
+
+def _source():
+    return getattr(_LOCAL, 'scope', None) or _SCOPE[0] or 'other'
+
+
+@contextlib.contextmanager
+def scope(source, thread=False):
+    # operations issued in the block are attributed to source, thread=True limits it to the current thread
+    if thread:
+        previous = getattr(_LOCAL, 'scope', None)
+        _LOCAL.scope = source
+    else:
+        previous = _SCOPE[0]
+        _SCOPE[0] = source
+    try:
+        yield
+    finally:
+        if thread:
+            _LOCAL.scope = previous
+        else:
+            _SCOPE[0] = previous
+
+
+def record(serial, kind, command, start, code=None, size=None, root=False):
+    # start: time.time() when the operation began, the duration is measured here
+    event = {
+        'serial': serial,
+        'kind': kind,
+        'command': command,
+        'source': _source(),
+        'root': root,
+        'start': start,
+        'time': time.time() - start,
+        'code': code,
+        'bytes': size,
+        'thread': threading.current_thread().name
+    }
+    with _LOCK:
+        if len(_EVENTS) == _EVENTS.maxlen and _SAVED[0] > 0:
+            _SAVED[0] -= 1
+        _EVENTS.append(event)
+
+
+def save():
+    # appends the events not written yet to tmp/trace/events.jsonl
+    with _LOCK:
+        events = list(_EVENTS)[_SAVED[0]:]
+        _SAVED[0] = len(_EVENTS)
+    if len(events) == 0:
+        return
+    os.makedirs(PATH_TRACE, exist_ok=True)
+    path = os.path.join(PATH_TRACE, 'events.jsonl')
+    if os.path.exists(path) and os.path.getsize(path) > ROTATE_SIZE:
+        os.replace(path, f"{path}.1")
+    with open(path, mode='a') as f:
+        f.write(''.join(json.dumps(e) + '\n' for e in events))
+
+
+def get_events():
+    # saved events then the ones of this process not written yet
+    result = []
+    for file in ['events.jsonl.1', 'events.jsonl']:
+        try:
+            with open(os.path.join(PATH_TRACE, file), mode='r') as f:
+                for line in f:
+                    try:
+                        result.append(json.loads(line))
+                    except ValueError:
+                        pass
+        except OSError:
+            pass
+    with _LOCK:
+        result += list(_EVENTS)[_SAVED[0]:]
+    return result[-MAX_EVENTS:]
+
+
+def clear():
+    with _LOCK:
+        _EVENTS.clear()
+        _SAVED[0] = 0
+    for file in ['events.jsonl.1', 'events.jsonl']:
+        utils.deleteFile(os.path.join(PATH_TRACE, file))
+
+
+def summary(events, key):
+    # [{key, 'count', 'time', 'max', 'bytes', 'errors', 'root'}] by total time
+    groups = {}
+    for e in events:
+        name = key(e) if callable(key) else e[key]
+        g = groups.setdefault(name, {'key': name, 'count': 0, 'time': 0.0, 'max': 0.0, 'bytes': 0, 'errors': 0, 'root': 0})
+        g['count'] += 1
+        g['time'] += e['time']
+        g['max'] = max(g['max'], e['time'])
+        g['bytes'] += e['bytes'] or 0
+        g['errors'] += 1 if e['code'] not in [None, 0] else 0
+        g['root'] += 1 if e['root'] else 0
+    return sorted(groups.values(), key=lambda g: g['time'], reverse=True)
+
+
+def export_chrome(path, events):
+    # complete events (ph X) in microseconds, pid: device, tid: thread
+    pids = {}
+    trace = []
+    for e in events:
+        if e['serial'] not in pids:
+            pids[e['serial']] = len(pids) + 1
+            trace.append({'name': 'process_name', 'ph': 'M', 'pid': pids[e['serial']], 'args': {'name': e['serial'] or 'host'}})
+        trace.append({
+            'name': e['command'][:120],
+            'cat': e['kind'],
+            'ph': 'X',
+            'ts': int(e['start'] * 1000000),
+            'dur': max(int(e['time'] * 1000000), 1),
+            'pid': pids[e['serial']],
+            'tid': e['thread'],
+            'args': {'source': e['source'], 'root': e['root'], 'code': e['code'], 'bytes': e['bytes']}
+        })
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, mode='w') as f:
+        json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f)
+    return len(trace)
+
+
+def _short(value, size):
+    value = ' '.join(value.split())
+    return value if len(value) <= size else value[:size - 3] + '...'
+
+
+class Trace:
+
+    def args(self, cmd):
+        if len(cmd) == 2 or (len(cmd) == 3 and cmd[2] == 'summary'):
+            events = get_events()
+            if len(events) == 0:
+                utils.printWarning('No operation recorded')
+                return
+            utils.printInfo(f"Commands ({len(events)} device operations):")
+            print('{0:<34} {1:>8} {2:>11} {3:>10} {4:>12} {5:>7}'.format('Command', 'Calls', 'Time (ms)', 'Max (ms)', 'Bytes', 'Errors'))
+            for g in summary(events, 'source'):
+                print('{0:<34} {1:>8} {2:>11.1f} {3:>10.1f} {4:>12} {5:>7}'.format(_short(g['key'], 34), g['count'], g['time'] * 1000, g['max'] * 1000, g['bytes'], g['errors']))
+            print('')
+            utils.printInfo('Operations by total time:')
+            print('{0:<20} {1:<8} {2:<5} {3:>8} {4:>11} {5:>10}  {6:<50}'.format('Device', 'Kind', 'su', 'Calls', 'Time (ms)', 'Max (ms)', 'Command'))
+            for g in summary(events, lambda e: (e['serial'] or 'host', e['kind'], e['command']))[:TOP]:
+                print('{0:<20} {1:<8} {2:<5} {3:>8} {4:>11.1f} {5:>10.1f}  {6:<50}'.format(
+                    g['key'][0], g['key'][1], 'yes' if g['root'] > 0 else 'no', g['count'], g['time'] * 1000, g['max'] * 1000, _short(g['key'][2], 50)))
+        elif len(cmd) in [3, 4] and cmd[2] == 'top':
+            count = int(cmd[3]) if len(cmd) == 4 and cmd[3].isdigit() else TOP
+            events = sorted(get_events(), key=lambda e: e['time'], reverse=True)[:count]
+            if len(events) == 0:
+                utils.printWarning('No operation recorded')
+                return
+            print('{0:<20} {1:<20} {2:<8} {3:<5} {4:>10} {5:>6} {6:>10}  {7:<40}'.format('Device', 'Source', 'Kind', 'su', 'Time (ms)', 'Code', 'Bytes', 'Command'))
+            for e in events:
+                print('{0:<20} {1:<20} {2:<8} {3:<5} {4:>10.1f} {5:>6} {6:>10}  {7:<40}'.format(
+                    e['serial'] or 'host', _short(e['source'], 20), e['kind'], 'yes' if e['root'] else 'no', e['time'] * 1000,
+                    '' if e['code'] is None else e['code'], '' if e['bytes'] is None else e['bytes'], _short(e['command'], 60)))
+        elif len(cmd) in [3, 4] and cmd[2] == 'export':
+            path = cmd[3] if len(cmd) == 4 else os.path.join(PATH_TRACE, f"{int(time.time())}_trace.json")
+            try:
+                count = export_chrome(path, get_events())
+                utils.printSuccess(f"Trace saved at: {path} ({count} events)")
+            except OSError as e:
+                utils.printError(f"Unable to save the trace: {e}", exit=False)
+        elif len(cmd) == 3 and cmd[2] == 'clear':
+            clear()
+            utils.printSuccess('Trace cleared')
+        elif len(cmd) == 3 and cmd[2] == 'help':
+            print('Available commands:')
+            print('{0:<26} {1:<14} {2:<40}'.format('Command', 'Permission', 'Description'))
+            for h in HELPS:
+                print('{0:<26} {1:<14} {2:<40}'.format(
+                    h['command'],
+                    'root' if h['root'] else 'shell',
+                    h['description']
+                ))
+        else:
+            print(f"sh: {' '.join(cmd)}: Invalid command")
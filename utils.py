@@ -7,14 +7,13 @@ Date: 2022.05.10
 import os.path
 import shutil
 import sys
+import threading
 
-# External library
-from colorama import init
-from termcolor import colored
-import requests
-from clint.textui import progress
+# External libraries are imported on first use: one-shot commands (main.py -s $SERIAL ...) only pay for what they run
+if os.name == 'nt':
+    from colorama import init
 
-init()
+    init()
 _USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.110 Safari/537.36'
 
 
@@ -47,12 +46,30 @@ def saveFile(path, file, content):
         f.write(content)
 
 
+ERRORS = 0
+_LOCAL = threading.local()
+
+
+def colored(text, color):
+    from termcolor import colored as _colored
+    return _colored(text, color)
+
+
 def printError(value, exit=False):
+    # ERRORS sets the exit code of one-shot commands
+    global ERRORS
+    ERRORS += 1
+    _LOCAL.errors = getErrors() + 1
     print(f"{colored('[ERROR]', 'red')} {value}")
     if exit:
         sys.exit(1)
 
 
+def getErrors():
+    # errors printed by the current thread (fan-out workers)
+    return getattr(_LOCAL, 'errors', 0)
+
+
 def printInfo(value):
     print(f"{colored('[INFO]', 'cyan')} {value}")
 
@@ -65,28 +82,22 @@ def printSuccess(value):
     print(f"{colored('[SUCCESS]', 'green')} {value}")
 
 
-def downloadFile(path: str, file: str, url: str, user_agent=_USER_AGENT):
+def downloadFile(path: str, file: str, url: str, user_agent=_USER_AGENT, decompress=None, segments=1):
+    from module import lib_download
     output = os.path.join(path, file)
     deleteFile(output)
     printInfo(f'Download file: {output}')
     try:
-        r = requests.get(url, stream=True, headers={'accept': '*/*', 'user-agent': user_agent})
-    except Exception as e:
+        r = lib_download.download(url, output, decompress=decompress, segments=segments, user_agent=user_agent)
+    except lib_download.DownloadError as e:
         printWarning(f'Save file to "{output}" following link: {url}')
-        printError('Unable to download file', exit=True)
-
-    if not r.ok:
-        printError(f'Unable to download file from: {url}', exit=True)
-    makePath(path)
-    with open(os.path.join(path, file), 'wb') as f:
-        total_length = int(r.headers.get('content-length'))
-        for chunk in progress.bar(r.iter_content(chunk_size=1024), expected_size=(total_length / 1024) + 1):
-            if chunk:
-                f.write(chunk)
-                f.flush()
+        printError(f'Unable to download file: {e}', exit=True)
+    printInfo(f"Downloaded {r['size'] / 1048576:.1f} MB in {r['time']:.1f}s ({r['speed'] / 1048576:.2f} MB/s){' (resumed)' if r['resumed'] else ''}")
+    return r
 
 
 def getContent(url: str, user_agent=_USER_AGENT):
+    import requests
     r = requests.get(url, headers={'accept': '*/*', 'user-agent': user_agent})
     if not r.ok:
         printError(f'Unable to load file: {url}', exit=True)
@@ -94,14 +105,12 @@ def getContent(url: str, user_agent=_USER_AGENT):
 
 
 def extactFile(input, output, clear=False):
+    from module import lib_download
     if not os.path.exists(input):
         printError(f'Input file not found: {input}', exit=True)
     deleteFile(output)
     try:
-        import xz
-        with xz.open(input) as i:
-            with open(output, mode='wb') as o:
-                o.write(i.read())
+        lib_download.decompress_file(input, output)
     except Exception as e:
         printError(e, exit=True)
 